@@ -0,0 +1,384 @@
+"""Headless runner: play recordings and run schedules without the GUI.
+
+    python -m androidauto run recording.json --device emulator-5554 --device R58M123
+    python -m androidauto schedule --all-devices --duration 3600
+
+Only the controllers are used (no QApplication or widgets), so runner hosts
+start playing within a fraction of the GUI's startup time. Progress goes to
+stderr and the session log; a JSON summary of every playback is printed to
+stdout, or written to --summary. The exit code tells how the session went,
+see the EXIT_* constants.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+from PyQt5.QtCore import Qt
+
+from controllers.adb_controller import AdbController, ScreenCaptureThread
+from controllers.action_player import ActionPlayer
+from controllers.action_recorder import ActionRecorder
+from controllers.scheduler import TaskScheduler
+from utils.logger import Logger
+
+
+EXIT_OK = 0
+EXIT_FAILED = 1  # at least one playback failed or could not start
+EXIT_USAGE = 2  # bad arguments, as reported by argparse
+EXIT_NO_DEVICE = 3  # a requested device is not connected, or there is none
+EXIT_BAD_RECORDING = 4  # a recording could not be loaded
+EXIT_INTERRUPTED = 130  # stopped with Ctrl+C
+
+
+class ConsoleLog:
+    """Writes messages to stderr and the session log file"""
+
+    def __init__(self):
+        self.logger = Logger()
+        self.lock = threading.Lock()
+
+    def log(self, message):
+        with self.lock:
+            print(message, file=sys.stderr, flush=True)
+        self.logger.log(message)
+
+    def close(self):
+        self.logger.close()
+
+
+class DeviceSession:
+    """Controllers for one device, recording the outcome of each playback on it"""
+
+    def __init__(self, device_id, log, use_opencv=True, capture_interval=0.2, trace_dir=None):
+        self.device_id = device_id
+        self.log = log
+        self.adb_controller = AdbController(device_id)
+        self.opencv_processor = None
+        self.capture_thread = None
+        if use_opencv:
+            # Imported here so runs without vision do not pay for loading OpenCV matchers
+            from controllers.opencv_processor import OpenCVProcessor
+            self.opencv_processor = OpenCVProcessor(self.adb_controller)
+            self.capture_thread = ScreenCaptureThread(self.adb_controller, capture_interval)
+            self.capture_thread.update_frame.connect(self.opencv_processor.process_frame, Qt.DirectConnection)
+            self.capture_thread.error.connect(self._info, Qt.DirectConnection)
+
+        self.action_player = ActionPlayer(self.adb_controller, self.opencv_processor)
+        self.action_player.trace_dir = trace_dir
+        self.results = []
+        self.current = None
+        self.name = None  # Recording being played, for the summary
+        self.stopped = False
+        self.done = threading.Event()
+        self.done.set()
+
+        # There is no event loop, so slots run directly in the player thread
+        player = self.action_player
+        player.playback_started.connect(self._on_started, Qt.DirectConnection)
+        player.action_completed.connect(self._on_action_completed, Qt.DirectConnection)
+        player.playback_error.connect(self._on_error, Qt.DirectConnection)
+        player.playback_info.connect(self._info, Qt.DirectConnection)
+        player.playback_completed.connect(self._on_completed, Qt.DirectConnection)
+
+    def start(self):
+        if self.capture_thread is not None:
+            self.capture_thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self.action_player.stop()
+        if self.capture_thread is not None and self.capture_thread.isRunning():
+            self.capture_thread.stop()
+        if self.opencv_processor is not None:
+            self.opencv_processor.stop_vision_pool()
+
+    def play(self, actions, resolution=None, speed_factor=1.0, settle_gaps=False):
+        """Start a playback; returns whether it started"""
+        if self.stopped or self.action_player.playing:
+            return False
+        self.done.clear()
+        self.action_player.load_actions(actions, resolution)
+        if self.action_player.play(speed_factor, settle_gaps=settle_gaps):
+            return True
+
+        self.results.append(self._result(len(actions), errors=["Playback could not start"]))
+        self.done.set()
+        return False
+
+    def wait(self):
+        # Wake up regularly so Ctrl+C is handled on every platform
+        while not self.done.wait(0.5):
+            pass
+
+    def _result(self, total, errors=None):
+        return {
+            'device': self.device_id,
+            'recording': self.name,
+            'success': not errors,
+            'actions': total,
+            'played': 0,
+            'duration': 0.0,
+            'errors': errors or [],
+            'stopped': False,
+            'trace': None
+        }
+
+    def _info(self, message):
+        self.log.log(f"[{self.device_id}] {message}")
+
+    def _on_started(self):
+        self.current = self._result(len(self.action_player.actions))
+        self.current['started'] = time.time()
+        self._info(f"Playing {self.name or 'recording'} ({self.current['actions']} action(s))")
+
+    def _on_action_completed(self, index):
+        if self.current is not None:
+            self.current['played'] += 1
+
+    def _on_error(self, message):
+        self._info(message)
+        if self.current is not None:
+            self.current['errors'].append(message)
+
+    def _on_completed(self):
+        result, self.current = self.current, None
+        if result is not None:
+            result['duration'] = round(time.time() - result['started'], 3)
+            result['stopped'] = self.action_player.stop_event.is_set()
+            result['success'] = not result['errors'] and not result['stopped']
+            trace = self.action_player.trace
+            if self.action_player.trace_dir and trace is not None and trace.records:
+                result['trace'] = os.path.join(self.action_player.trace_dir, f"trace_{trace.run_id}.json")
+            self.results.append(result)
+            self._info(f"Playback {'finished' if result['success'] else 'failed'} after {result['duration']:.1f}s, "
+                       f"{result['played']}/{result['actions']} action(s) played")
+        self.done.set()
+
+
+class SessionGroupPlayer:
+    """Stands in for an ActionPlayer so one TaskScheduler plays every task on all devices"""
+
+    def __init__(self, sessions, settle_gaps=False):
+        self.sessions = sessions
+        self.settle_gaps = settle_gaps
+        self.actions = []
+        self.resolution = None
+
+    def load_actions(self, actions, source_resolution=None):
+        self.actions = actions
+        self.resolution = source_resolution
+
+    def play(self, speed_factor=1.0):
+        started = False
+        for session in self.sessions:
+            if session.action_player.playing:
+                session.log.log(f"[{session.device_id}] Skipping scheduled run, device is busy")
+            elif session.play(self.actions, self.resolution, speed_factor, self.settle_gaps):
+                started = True
+        return started
+
+
+def select_devices(args, log):
+    """Devices to use from the arguments, or None when they cannot be used"""
+    try:
+        connected = AdbController().get_devices()
+    except Exception as e:
+        log.log(f"Error listing devices: {e}")
+        return None
+
+    if args.all_devices:
+        devices = connected
+    elif args.device:
+        devices = list(dict.fromkeys(args.device))
+        missing = [device for device in devices if device not in connected]
+        if missing:
+            log.log(f"Device(s) not connected: {', '.join(missing)}")
+            return None
+    elif len(connected) == 1:
+        devices = connected
+    else:
+        log.log("Choose a device with --device or use --all-devices; connected: "
+                f"{', '.join(connected) or 'none'}")
+        return None
+
+    if not devices:
+        log.log("No device connected")
+        return None
+    return devices
+
+
+def load_recordings(paths, log):
+    """(name, actions, resolution) for each recording, or None if one cannot be loaded"""
+    recordings = []
+    for path in paths:
+        recorder = ActionRecorder()
+        if not recorder.load_actions(path) or not recorder.actions:
+            log.log(f"Could not load recording: {path}")
+            return None
+        recordings.append((os.path.basename(path), recorder.actions, recorder.resolution))
+        recorder.snapshots.clear()
+    return recordings
+
+
+def open_sessions(args, devices, log):
+    sessions = [DeviceSession(device, log, not args.no_opencv, args.capture_interval, args.trace_dir)
+                for device in devices]
+    for session in sessions:
+        session.start()
+    return sessions
+
+
+def run_recordings(args, recordings, sessions):
+    def play_all(session):
+        for _ in range(args.loop):
+            for name, actions, resolution in recordings:
+                session.name = name
+                if session.play(actions, resolution, args.speed, args.settle_gaps):
+                    session.wait()
+                if args.stop_on_failure and session.results and not session.results[-1]['success']:
+                    return
+
+    # Each device plays its queue in its own thread
+    threads = [threading.Thread(target=play_all, args=(session,), daemon=True) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(0.5)
+
+    return EXIT_OK if all(r['success'] for s in sessions for r in s.results) else EXIT_FAILED
+
+
+def load_scheduler(args, log):
+    """Scheduler over the tasks file, playing on the sessions given later; None if the file cannot be loaded"""
+    scheduler = TaskScheduler(SessionGroupPlayer([], args.settle_gaps), log)
+    if args.tasks:
+        scheduler.tasks_file = os.path.abspath(args.tasks)
+        if not os.path.exists(scheduler.tasks_file) or not scheduler.load_tasks():
+            log.log(f"Could not load scheduled tasks: {args.tasks}")
+            return None
+    return scheduler
+
+
+def run_schedule(args, scheduler, sessions, log):
+    scheduler.action_player.sessions = sessions
+    enabled = sum(1 for task in scheduler.get_tasks() if task.get('enabled', False))
+    log.log(f"Running {enabled} enabled scheduled task(s) from {scheduler.tasks_file} "
+            f"on {len(sessions)} device(s)")
+    scheduler.start()
+    try:
+        deadline = time.time() + args.duration if args.duration else None
+        while deadline is None or time.time() < deadline:
+            time.sleep(0.5)
+    finally:
+        scheduler.stop()
+
+    # Let playbacks started before the end finish
+    for session in sessions:
+        session.wait()
+
+    return EXIT_OK if all(r['success'] for s in sessions for r in s.results) else EXIT_FAILED
+
+
+def write_summary(args, summary, stdout):
+    text = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            f.write(text + "\n")
+    else:
+        stdout.write(text + "\n")
+        stdout.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="androidauto", description="Play recordings and schedules without the GUI")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--device', action='append', help="Device serial; repeat to play on several devices")
+    common.add_argument('--all-devices', action='store_true', help="Use every connected device")
+    common.add_argument('--no-opencv', action='store_true',
+                        help="Do not capture the screen; recordings with vision actions will fail")
+    common.add_argument('--capture-interval', type=float, default=0.2, help="Seconds between screen captures")
+    common.add_argument('--settle-gaps', action='store_true',
+                        help="Wait for the screen to settle instead of recorded pauses")
+    common.add_argument('--trace-dir', help="Write a playback trace of every run to this folder")
+    common.add_argument('--summary', help="Write the JSON summary to this file instead of stdout")
+
+    run = commands.add_parser('run', parents=[common], help="Play one or more recordings")
+    run.add_argument('recordings', nargs='+', help="Recording files (.json or .aarec), played in order")
+    run.add_argument('--speed', type=float, default=1.0, help="Playback speed factor")
+    run.add_argument('--loop', type=int, default=1, help="Number of times to play the recordings")
+    run.add_argument('--stop-on-failure', action='store_true', help="Stop a device's queue at its first failure")
+
+    schedule = commands.add_parser('schedule', parents=[common], help="Run the scheduled tasks")
+    schedule.add_argument('--tasks', help="Scheduled tasks file; defaults to the GUI's")
+    schedule.add_argument('--duration', type=float, default=0, help="Seconds to run for; 0 runs until Ctrl+C")
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'run' and (args.speed <= 0 or args.loop < 1):
+        parser.error("--speed must be positive and --loop at least 1")
+
+    # The controllers print errors; keep stdout for the summary
+    stdout = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return run_session(args, stdout)
+
+
+def run_session(args, stdout):
+    started = time.time()
+    log = ConsoleLog()
+    sessions = []
+    try:
+        # Recordings and tasks are checked before any device is touched
+        if args.command == 'run':
+            loaded = load_recordings(args.recordings, log)
+        else:
+            loaded = load_scheduler(args, log)
+
+        devices = select_devices(args, log) if loaded is not None else None
+        if loaded is None:
+            code = EXIT_BAD_RECORDING
+        elif devices is None:
+            code = EXIT_NO_DEVICE
+        else:
+            sessions = open_sessions(args, devices, log)
+            if args.command == 'run':
+                code = run_recordings(args, loaded, sessions)
+            else:
+                code = run_schedule(args, loaded, sessions, log)
+    except KeyboardInterrupt:
+        log.log("Interrupted, stopping playback")
+        code = EXIT_INTERRUPTED
+    finally:
+        for session in sessions:
+            session.stop()
+
+    results = [result for session in sessions for result in session.results]
+    for result in results:
+        result.pop('started', None)
+    write_summary(args, {
+        'command': args.command,
+        'exit_code': code,
+        'success': code == EXIT_OK,
+        'devices': [session.device_id for session in sessions],
+        'started': started,
+        'duration': round(time.time() - started, 3),
+        'runs': results,
+        'failed': sum(1 for result in results if not result['success'])
+    }, stdout)
+    log.close()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,10 @@ import threading
 from PyQt5.QtCore import QObject, pyqtSignal
 from controllers.action_recorder import ActionType
 from controllers.condition_checker import ConditionChecker, ConditionType
+from controllers.playback_trace import PlaybackTrace
+from controllers.resolution import scale_actions, same_resolution
+from utils.metrics import registry as metrics
+from utils.profiler import profiler
 
 class ActionPlayer(QObject):
 
@@ -12,6 +16,7 @@ class ActionPlayer(QObject):
     playback_started = pyqtSignal()
     playback_completed = pyqtSignal()
     playback_error = pyqtSignal(str)
+    playback_info = pyqtSignal(str)
     
     def __init__(self, adb_controller, opencv_processor=None):
         super().__init__()
@@ -19,16 +24,41 @@ class ActionPlayer(QObject):
         self.opencv_processor = opencv_processor
         self.condition_checker = ConditionChecker(opencv_processor) if opencv_processor else None
         self.actions = []
+        self.source_resolution = None
         self.playing = False
         self.current_index = -1
         self.play_thread = None
         self.stop_event = threading.Event()
         self.action_delay = 0
+        self.settle_gaps = False  # Replace recorded gaps with waits for a stable screen
+        self.trace_dir = None  # Write a trace of every playback here when set
+        self.trace = None
+        self.trace_notes = {}
 
-    def load_actions(self, actions):
+    def load_actions(self, actions, source_resolution=None):
         self.actions = actions
+        self.source_resolution = source_resolution
+
+    def _prepare_actions(self):
+        """Map the loaded actions onto the connected device's resolution"""
+        template_scale = 1.0
+        actions = self.actions
+
+        if self.source_resolution:
+            target = self.adb_controller.get_device_resolution()
+            if target and not same_resolution(self.source_resolution, target):
+                actions, template_scale = scale_actions(self.actions, self.source_resolution, target)
+                self.playback_info.emit(
+                    f"Adapting recording from {self.source_resolution['width']}x{self.source_resolution['height']} "
+                    f"to {target['width']}x{target['height']} (template scale {template_scale})"
+                )
+
+        if self.opencv_processor is not None:
+            self.opencv_processor.set_template_scale(template_scale)
+
+        return actions
     
-    def play(self, speed_factor=1.0, start_index=0, action_delay=0):
+    def play(self, speed_factor=1.0, start_index=0, action_delay=0, settle_gaps=False):
         if not self.actions or self.playing or start_index >= len(self.actions):
             return False
         
@@ -37,6 +67,7 @@ class ActionPlayer(QObject):
         
         # Set action delay
         self.action_delay = action_delay
+        self.settle_gaps = settle_gaps and self.opencv_processor is not None
 
         # Start playback in a separate thread
         self.play_thread = threading.Thread(
@@ -50,31 +81,83 @@ class ActionPlayer(QObject):
     def _play_thread(self, speed_factor, start_index):
         self.playing = True
         self.playback_started.emit()
+        profiler.register("Player")
+        stats_before = self._vision_stats()
         
         try:
+            actions = self._prepare_actions()
             prev_time_offset = 0
+            recorded_gaps = 0.0
+            settled_time = 0.0
+            
+            self.trace = PlaybackTrace(speed_factor, {
+                'device': getattr(self.adb_controller, 'device_id', None),
+                'actions': len(actions),
+                'start_index': start_index
+            })
+            first_offset = actions[start_index].get('time_offset', 0)
             
-            for i in range(start_index, len(self.actions)):
+            for i in range(start_index, len(actions)):
                 # Check if playback has been stopped
                 if self.stop_event.is_set():
                     break
                 
                 self.current_index = i
-                action = self.actions[i]
+                action = actions[i]
+                profiler.poll()
                 
                 # Emit signal that action is starting
                 self.action_started.emit(i, action)
                 
                 # Wait appropriate time between actions
-                if i > start_index and 'time_offset' in action:
+                action_type = action.get('type', '')
+                self.trace_notes = {}
+                trace_wait_start = self.trace.now()
+                frames_before = self.opencv_processor.frame_seq if self.opencv_processor is not None else 0
+                wait_start = time.perf_counter()
+                wait_until = action.get('wait_until')
+                if wait_until and self.opencv_processor is not None:
+                    # Optimized recording: go on as soon as the target is on screen
+                    if not self.opencv_processor.wait_for_condition(
+                            wait_until.get('condition', {}),
+                            timeout=wait_until.get('timeout', 10),
+                            stop_event=self.stop_event) and not self.stop_event.is_set():
+                        self._note(wait_until='timeout')
+                        self.playback_info.emit(f"Target of action {i} not seen, continuing after the wait timeout")
+                elif i > start_index and 'time_offset' in action:
                     current_time_offset = action['time_offset']
                     delay = (current_time_offset - prev_time_offset) / speed_factor
-                    if delay > 0:
+                    if delay > 0 and self.settle_gaps:
+                        # The recorded gap only bounds the wait for the screen to settle
+                        recorded_gaps += delay
+                        self.opencv_processor.wait_for_stable(timeout=delay, stop_event=self.stop_event)
+                        settled_time += self.opencv_processor.last_stable_stats.get('elapsed', delay)
+                    elif delay > 0:
                         time.sleep(delay)
-                    prev_time_offset = current_time_offset
+                
+                # Gaps are measured from the previous action, including the first one played
+                prev_time_offset = action.get('time_offset', prev_time_offset)
+                
+                metrics.histogram('action_wait_seconds', "Time waited before each action",
+                                  type=action_type).observe(time.perf_counter() - wait_start)
                 
                 # Execute the action
-                success = self._execute_action(action)
+                trace_start = self.trace.now()
+                adb_commands = self.adb_controller.command_count
+                adb_time = self.adb_controller.command_time
+                with metrics.timer('action_seconds', "Duration of played actions", type=action_type):
+                    success = self._execute_action(action)
+                self.trace.add(
+                    i, action_type,
+                    scheduled=(action['time_offset'] - first_offset) / speed_factor if 'time_offset' in action else None,
+                    wait_start=trace_wait_start, start=trace_start, end=self.trace.now(), success=success,
+                    adb_latency=self.adb_controller.command_time - adb_time,
+                    adb_commands=self.adb_controller.command_count - adb_commands,
+                    frames=self.opencv_processor.frame_seq - frames_before if self.opencv_processor is not None else None,
+                    **self.trace_notes
+                )
+                metrics.counter('actions_total', "Played actions", type=action_type,
+                                result='ok' if success else 'failed').inc()
                 
                 # Emit signal that action is complete
                 self.action_completed.emit(i)
@@ -83,15 +166,27 @@ class ActionPlayer(QObject):
                     self.playback_error.emit(f"Failed to execute action: {action.get('type')}")
                     break
 
-                if self.action_delay > 0 and i < len(self.actions) - 1:
+                if self.action_delay > 0 and i < len(actions) - 1:
                     time.sleep(self.action_delay / 1000.0)
 
+            if recorded_gaps > 0:
+                self.playback_info.emit(
+                    f"Waited {settled_time:.1f}s for the screen to settle instead of "
+                    f"{recorded_gaps:.1f}s of recorded gaps"
+                )
+
         except Exception as e:
             self.playback_error.emit(f"Error during playback: {str(e)}")
         
         finally:
             self.playing = False
             self.current_index = -1
+            if self.opencv_processor is not None:
+                # The processor is shared with the GUI, which matches templates unscaled
+                self.opencv_processor.set_template_scale(1.0)
+            self._report_tracker_stats(stats_before)
+            self._save_trace()
+            profiler.unregister()
             self.playback_completed.emit()
     
     def stop(self):
@@ -121,6 +216,28 @@ class ActionPlayer(QObject):
                 time.sleep(data.get('duration', 1) / 1000.0)  # Convert ms to seconds
                 return True
             
+            elif action_type == ActionType.WAIT_STABLE.value:
+                if self.opencv_processor is None:
+                    self.playback_error.emit("Waiting for a stable screen requires OpenCV processor")
+                    return False
+                
+                stable = self.opencv_processor.wait_for_stable(
+                    stable_frames=data.get('stable_frames', 3),
+                    stable_ms=data.get('stable_ms', 0),
+                    region=data.get('region'),
+                    timeout=data.get('max_wait', 10),
+                    threshold=data.get('threshold', 2.0),
+                    stop_event=self.stop_event
+                )
+                stats = self.opencv_processor.last_stable_stats
+                self._note(condition=stats.get('status'))
+                if stable:
+                    self.playback_info.emit(f"Screen stable after {stats['elapsed']:.2f}s ({stats['frames']} frame(s))")
+                elif stats.get('status') == 'timeout':
+                    # A screen that keeps animating should not abort the playback
+                    self.playback_info.emit(f"Screen still changing after {stats['elapsed']:.2f}s, continuing")
+                return True
+            
             elif action_type == ActionType.KEY.value:
                 return self.adb_controller.key_event(data.get('keycode', '')) is not None
             
@@ -140,6 +257,8 @@ class ActionPlayer(QObject):
                     return False
                 
                 template_path = data.get('template_path', '')
+                # Only a score from this action should end up in its trace
+                self.opencv_processor.last_match_score = None
                 if not os.path.exists(template_path):
                     self.playback_error.emit(f"Template file not found: {template_path}")
                     return False
@@ -147,16 +266,32 @@ class ActionPlayer(QObject):
                 # Wait for template to appear if requested
                 if data.get('wait', True):
                     max_wait = data.get('max_wait', 10)  # seconds
-                    result = self.opencv_processor.wait_for_template(
+                    match = self.opencv_processor.wait_for_template(
                         template_path, 
-                        timeout=max_wait
+                        timeout=max_wait,
+                        stop_event=self.stop_event,
+                        scale_tolerant=data.get('scale_tolerant', False),
+                        match_mode=data.get('match_mode', 'template')
                     )
+                    self._report_wait_stats(self.opencv_processor.last_wait_stats)
+                    self._note(match_score=self.opencv_processor.last_match_score)
                     
-                    if not result:
+                    if not match:
                         return False
+                else:
+                    match = self.opencv_processor.submit(
+                        'find_template',
+                        template_path=template_path,
+                        scale_tolerant=data.get('scale_tolerant', False),
+                        match_mode=data.get('match_mode', 'template')
+                    ).result()
+                    self._note(match_score=self.opencv_processor.last_match_score)
+                
+                # Feature matching locates a single occurrence, so match_all only applies to templates
+                if data.get('match_all', False) and data.get('match_mode', 'template') != 'features':
+                    return self._tap_all_matches(template_path, data)
                 
-                # Find template and tap if requested
-                match = self.opencv_processor.find_template(template_path)
+                # Tap if requested
                 if match and data.get('tap', False):
                     cx, cy = match[0] + match[2] // 2, match[1] + match[3] // 2
                     return self.adb_controller.tap(cx, cy) is not None
@@ -171,7 +306,9 @@ class ActionPlayer(QObject):
                 actions = data.get('actions', [])
                 else_actions = data.get('else_actions', [])
 
-                condition_met = self.condition_checker.check_condition(condition)
+                # Runs in a vision worker process when the pool is enabled
+                condition_met = self.opencv_processor.submit('check_condition', condition=condition).result()
+                self._note(condition='met' if condition_met else 'not met')
 
                 target_actions = actions if condition_met else else_actions
 
@@ -193,4 +330,103 @@ class ActionPlayer(QObject):
                 
         except Exception as e:
             self.playback_error.emit(f"Error executing action: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def _tap_all_matches(self, template_path, data):
+        matches = self.opencv_processor.submit(
+            'find_all_templates',
+            template_path=template_path,
+            max_matches=data.get('max_matches', 20),
+            scale_tolerant=data.get('scale_tolerant', False)
+        ).result()
+        self._note(match_score=max((m[4] for m in matches or []), default=None))
+        if not matches:
+            return False
+
+        if data.get('tap', False):
+            # Tap in reading order rather than score order
+            for x, y, w, h, _ in sorted(matches, key=lambda m: (m[1], m[0])):
+                if self.stop_event.is_set():
+                    break
+                if self.adb_controller.tap(x + w // 2, y + h // 2) is None:
+                    return False
+
+        return True
+
+    def _note(self, **fields):
+        """Add details of the current action to its trace record; the first value set wins"""
+        for key, value in fields.items():
+            if value is not None:
+                self.trace_notes.setdefault(key, value)
+
+    def _save_trace(self):
+        if self.trace is None or not self.trace.records or not self.trace_dir:
+            return
+        try:
+            path = self.trace.save(self.trace_dir)
+            self.playback_info.emit(f"Playback trace saved to {path}")
+        except Exception as e:
+            self.playback_error.emit(f"Error saving playback trace: {str(e)}")
+
+    def _report_wait_stats(self, stats):
+        if not stats:
+            return
+
+        template = os.path.basename(stats.get('template_path', ''))
+        frames = f"{stats.get('frames_checked', 0)} frame(s) checked, {stats.get('frames_skipped', 0)} unchanged skipped"
+
+        if stats.get('status') == 'found':
+            self.playback_info.emit(
+                f"Template {template} found after {stats['elapsed']:.2f}s "
+                f"(detection latency {stats['detection_latency'] * 1000:.0f} ms, {frames})"
+            )
+        elif stats.get('status') == 'cancelled':
+            self.playback_info.emit(f"Wait for template {template} cancelled after {stats['elapsed']:.2f}s")
+        else:
+            self.playback_info.emit(f"Template {template} not found within {stats['elapsed']:.2f}s ({frames})")
+
+    def _vision_stats(self):
+        """Snapshot of the processor's lifetime vision counters, to report a playback's share of them"""
+        if self.opencv_processor is None:
+            return None
+        pool = self.opencv_processor.vision_pool
+        return {
+            'tracker': self.opencv_processor.match_tracker.get_stats(),
+            'prefilter': self.opencv_processor.prefilter.get_stats(),
+            'pool': pool,
+            'pool_stats': pool.get_stats() if pool is not None else None
+        }
+
+    def _report_tracker_stats(self, before):
+        """Report the vision counters accumulated since the before snapshot"""
+        after = self._vision_stats()
+        if after is None or before is None:
+            return
+
+        def since(name, key):
+            return after[name][key] - before[name][key]
+
+        lookups = since('tracker', 'lookups')
+        if lookups > 0:
+            self.playback_info.emit(
+                f"Template lookups: {lookups}, "
+                f"{since('tracker', 'local_hits') / lookups * 100:.0f}% served by local search near the last match"
+            )
+
+        checks, rejects = since('prefilter', 'checks'), since('prefilter', 'rejects')
+        if checks > 0:
+            self.playback_info.emit(
+                f"Template pre-filter: {rejects}/{checks} checks rejected ({rejects / checks * 100:.0f}%), "
+                f"about {max(0.0, since('prefilter', 'time_saved')) * 1000:.0f} ms of matching saved"
+            )
+
+        pool = after['pool']
+        if pool is not None:
+            stats = dict(after['pool_stats'])
+            if pool is before['pool']:
+                for key in ('completed', 'frames_published', 'failed'):
+                    stats[key] -= before['pool_stats'][key]
+            self.playback_info.emit(
+                f"Vision pool: {stats['completed']} request(s) on {stats['workers']} worker(s), "
+                f"{stats['frames_published']} frame(s) shared, {stats['failed']} failed"
+            )
@@ -1,6 +1,8 @@
 import json
 import time
 from enum import Enum
+from controllers.snapshot_archive import SnapshotStore, archive_path
+from controllers.recording_file import RecordingWriter, is_recording_file, load_recording, save_recording
 
 class ActionType(Enum):
     TAP = "tap"
@@ -11,6 +13,18 @@ class ActionType(Enum):
     LONG_PRESS = "long_press"
     TEMPLATE_MATCH = "template_match"
     CONDITIONAL = "conditional"
+    WAIT_STABLE = "wait_stable"
+
+def action_target(action):
+    """Return the (x, y) point an action touches first, or None"""
+    action_type = action.get('type', '')
+    data = action.get('data', {})
+
+    if action_type in (ActionType.TAP.value, ActionType.LONG_PRESS.value):
+        return data.get('x', 0), data.get('y', 0)
+    if action_type == ActionType.SWIPE.value:
+        return data.get('x1', 0), data.get('y1', 0)
+    return None
 
 class ActionRecorder:
 
@@ -19,16 +33,78 @@ class ActionRecorder:
         self.recording = False
         self.start_time = None
         self.file_path = None
+        self.resolution = None  # Screen size and density the actions were recorded on
+        self.observer = None  # Optional frame observer, e.g. a timeline_optimizer.GapObserver
+        self.snapshots = SnapshotStore()  # Screen at each recorded action, saved next to the file
+        self.last_frame = None
+        self.writer = None  # RecordingWriter appending actions as they are recorded
+        self.journal = None  # Optional recording_journal.RecordingJournal of unsaved changes
+        # Callables notified with ('before_' + op, fields) before the action list
+        # changes and with (op, fields) after it
+        self.listeners = []
     
     def start_recording(self):
         """Start a new recording session"""
+        self._notify('before_reset')
         self.actions = []
+        self.resolution = None
         self.recording = True
         self.start_time = time.time()
+        self.last_frame = None
+        self.snapshots.clear()
+        if self.journal is not None:
+            self.journal.begin()
+        self._notify('reset')
+        if self.observer is not None:
+            self.observer.reset(self.start_time)
+    
+    def set_resolution(self, width, height, density=None):
+        """Set the screen size and density of the device being recorded"""
+        self.resolution = {'width': width, 'height': height, 'density': density}
+        if self.writer is not None:
+            self.writer.set_meta(resolution=self.resolution)
+        if self.journal is not None:
+            self.journal.set_resolution(self.resolution)
+    
+    def record_frame(self, frame):
+        """Keep a frame shown during recording for snapshots and pass it to the observer"""
+        if not self.recording:
+            return
+        self.last_frame = frame
+        if self.observer is not None:
+            self.observer.observe_frame(frame)
     
     def stop_recording(self):
         """Stop the current recording session"""
         self.recording = False
+        if self.writer is not None:
+            self.finish_incremental_save()
+    
+    def record_to(self, filename):
+        """Save the actions so far to a recording file and append each new action to it"""
+        if self.writer is not None:
+            self.finish_incremental_save()
+        try:
+            self.writer = RecordingWriter(filename, self.resolution)
+            self.writer.append_actions(self.actions)
+            self.writer.flush()
+            self.file_path = filename
+            return True
+        except Exception as e:
+            print(f"Error saving actions: {e}")
+            self.writer = None
+            return False
+    
+    def finish_incremental_save(self):
+        """Close the file being recorded to, writing its index and the snapshots"""
+        writer, self.writer = self.writer, None
+        try:
+            writer.close()
+            self._save_snapshots(writer.path)
+            if self.journal is not None:
+                self.journal.discard()
+        except Exception as e:
+            print(f"Error finishing {writer.path}: {e}")
     
     def add_action(self, action_type, data):
         """Add an action to the recording"""
@@ -42,7 +118,23 @@ class ActionRecorder:
                 'timestamp': current_time,
                 'time_offset': time_offset
             }
+            if self.observer is not None:
+                observed = self.observer.observe_action(action)
+                if observed:
+                    action['observed'] = observed
+            if self.last_frame is not None:
+                snapshot = self.snapshots.add(self.last_frame, action_target(action))
+                if snapshot:
+                    action['snapshot'] = snapshot
+            self._notify('before_append', index=len(self.actions), action=action)
             self.actions.append(action)
+            self._changed('append', index=len(self.actions) - 1, action=action)
+            if self.writer is not None:
+                try:
+                    self.writer.append_action(action)
+                    self.writer.flush()
+                except Exception as e:
+                    print(f"Error appending to {self.writer.path}: {e}")
             return len(self.actions) - 1  # Return index of added action
         return -1
     
@@ -62,6 +154,16 @@ class ActionRecorder:
         """Add a wait action"""
         return self.add_action(ActionType.WAIT, {'duration': duration})
     
+    def add_wait_stable(self, stable_frames=3, stable_ms=0, max_wait=10, region=None, threshold=2.0):
+        """Add a wait that ends as soon as the screen (or a region of it) stops changing"""
+        return self.add_action(ActionType.WAIT_STABLE, {
+            'stable_frames': stable_frames,
+            'stable_ms': stable_ms,
+            'max_wait': max_wait,
+            'region': region,
+            'threshold': threshold
+        })
+    
     def add_key_event(self, keycode):
         """Add a key event action"""
         return self.add_action(ActionType.KEY, {'keycode': keycode})
@@ -74,13 +176,15 @@ class ActionRecorder:
         """Add a long press action"""
         return self.add_action(ActionType.LONG_PRESS, {'x': x, 'y': y, 'duration': duration})
     
-    def add_template_match(self, template_path, wait=True, max_wait=10, tap=True):
+    def add_template_match(self, template_path, wait=True, max_wait=10, tap=True, match_all=False, max_matches=20):
         """Add a template matching action"""
         return self.add_action(ActionType.TEMPLATE_MATCH, {
             'template_path': template_path,
             'wait': wait,
             'max_wait': max_wait,
-            'tap': tap
+            'tap': tap,
+            'match_all': match_all,
+            'max_matches': max_matches
         })
 
     def add_conditional_action(self, condition, actions, else_actions=None):
@@ -94,49 +198,109 @@ class ActionRecorder:
     def remove_action(self, index):
         """Remove an action by index"""
         if 0 <= index < len(self.actions):
+            self._notify('before_remove', index=index)
             self.actions.pop(index)
+            self._changed('remove', index=index)
+            return True
+        return False
+    
+    def replace_action(self, index, action):
+        """Replace the action at index, e.g. after it was edited"""
+        if 0 <= index < len(self.actions):
+            self._notify('before_replace', index=index, action=action)
+            self.actions[index] = action
+            self._changed('replace', index=index, action=action)
             return True
         return False
     
+    def set_actions(self, actions):
+        """Replace the whole action list, e.g. with an optimized copy"""
+        self._notify('before_reset', actions=actions)
+        self.actions = actions
+        self._changed('reset', actions=list(actions))
+    
     def move_action(self, from_index, to_index):
         """Move an action from one position to another"""
         if 0 <= from_index < len(self.actions) and 0 <= to_index < len(self.actions):
+            self._notify('before_move', **{'from': from_index, 'to': to_index})
             action = self.actions.pop(from_index)
             self.actions.insert(to_index, action)
+            self._changed('move', **{'from': from_index, 'to': to_index})
             return True
         return False
     
     def save_actions(self, filename):
-        """Save actions to a JSON file"""
+        """Save actions to a JSON file, or a recording file for the .aarec extension"""
         try:
-            with open(filename, 'w') as f:
-                json.dump({
-                    'version': '1.0',
-                    'timestamp': time.time(),
-                    'actions': self.actions
-                }, f, indent=4)
+            if is_recording_file(filename):
+                save_recording(filename, self.actions, self.resolution)
+            else:
+                with open(filename, 'w') as f:
+                    json.dump({
+                        'version': '1.1',
+                        'timestamp': time.time(),
+                        'resolution': self.resolution,
+                        'actions': self.actions
+                    }, f, indent=4)
             self.file_path = filename
-            return True
         except Exception as e:
             print(f"Error saving actions: {e}")
             return False
+
+        self._save_snapshots(filename)
+        # Actions recorded after this save are still only in the journal
+        if not self.recording:
+            self.discard_journal()
+        return True
+    
+    def _save_snapshots(self, filename):
+        try:
+            snapshot_ids = {action['snapshot']['id'] for action in self.actions if action.get('snapshot')}
+            self.snapshots.save(archive_path(filename), snapshot_ids)
+        except Exception as e:
+            print(f"Error saving snapshots: {e}")
     
     def load_actions(self, filename):
-        """Load actions from a JSON file"""
+        """Load actions from a JSON file, or a recording file for the .aarec extension"""
+        if is_recording_file(filename):
+            try:
+                actions, meta = load_recording(filename)
+                self._notify('before_reset')
+                self.actions = actions
+                self._notify('reset')
+                self.resolution = meta.get('resolution')
+                self.file_path = filename
+                self.snapshots.open(archive_path(filename))
+                self.discard_journal()
+                return True
+            except Exception as e:
+                print(f"Error loading actions: {e}")
+                return False
+        
         try:
             with open(filename, 'r') as f:
                 data = json.load(f)
                 
                 # Check if the file has the expected format
                 if 'actions' in data:
+                    self._notify('before_reset')
                     self.actions = data['actions']
+                    self._notify('reset')
+                    self.resolution = data.get('resolution')
                     self.file_path = filename
+                    self.snapshots.open(archive_path(filename))
+                    self.discard_journal()
                     return True
                 else:
                     # Try to interpret the file as a direct array of actions
                     if isinstance(data, list):
+                        self._notify('before_reset')
                         self.actions = data
+                        self._notify('reset')
+                        self.resolution = None
                         self.file_path = filename
+                        self.snapshots.open(archive_path(filename))
+                        self.discard_journal()
                         return True
             return False
         except Exception as e:
@@ -145,9 +309,51 @@ class ActionRecorder:
     
     def clear_actions(self):
         """Clear all actions"""
+        self._notify('before_reset', actions=[])
         self.actions = []
+        self._changed('reset', actions=[])
+    
+    def recover_journal(self):
+        """Restore the unsaved actions journaled by a previous session, returning their count"""
+        recovered = self.journal.recover() if self.journal is not None else None
+        if not recovered or not recovered[0]:
+            return 0
+        self._notify('before_reset')
+        self.actions, self.resolution = recovered
+        self.file_path = None
+        self.journal.begin(self.actions, self.resolution)
+        self._notify('reset')
+        return len(self.actions)
+    
+    def _changed(self, op, **fields):
+        """Journal a change to the action list and notify the listeners; call
+        _notify('before_' + op, ...) before making it"""
+        if self.journal is not None:
+            self.journal.record(op, **fields)
+        self._notify(op, **fields)
+    
+    def _notify(self, op, **fields):
+        for listener in self.listeners:
+            try:
+                listener(op, fields)
+            except Exception as e:
+                print(f"Error notifying action listener: {e}")
+    
+    def discard_journal(self):
+        if self.journal is not None:
+            self.journal.discard()
+    
+    def get_snapshot(self, action):
+        """Return the screen image recorded with an action, or None"""
+        return self.snapshots.get_image(action.get('snapshot'))
         
     def get_action_description(self, action):
+        description = self._describe_action(action)
+        if action.get('wait_until'):
+            description += " (after target appears)"
+        return description
+    
+    def _describe_action(self, action):
         action_type = action.get('type', '')
         data = action.get('data', {})
         
@@ -160,6 +366,13 @@ class ActionRecorder:
         elif action_type == ActionType.WAIT.value:
             return f"Wait for {data.get('duration', 0)} ms"
         
+        elif action_type == ActionType.WAIT_STABLE.value:
+            criteria = f"{data.get('stable_frames', 3)} unchanged frames"
+            if data.get('stable_ms', 0) > 0:
+                criteria += f" or {data['stable_ms']} ms"
+            target = "region" if data.get('region') else "screen"
+            return f"Wait until {target} is stable ({criteria}, max {data.get('max_wait', 10)} s)"
+        
         elif action_type == ActionType.KEY.value:
             return f"Key event: {data.get('keycode', '')}"
         
@@ -171,7 +384,14 @@ class ActionRecorder:
         
         elif action_type == ActionType.TEMPLATE_MATCH.value:
             template = data.get('template_path', '').split('/')[-1]
+            if data.get('match_all', False):
+                action_str = f"Find all of template: {template}"
+                if data.get('tap', False):
+                    action_str += " and tap each"
+                return action_str
             action_str = f"Find template: {template}"
+            if data.get('match_mode', 'template') == 'features':
+                action_str += " (features)"
             if data.get('tap', False):
                 action_str += " and tap"
             return action_str
@@ -1,9 +1,23 @@
 import subprocess
 import os
+import threading
 import time
 import cv2
 import numpy as np
 from PyQt5.QtCore import QObject, pyqtSignal, QThread
+from controllers.frame_pool import FramePool
+from utils.metrics import registry as metrics
+from utils.profiler import profiler
+
+# screencap raw output starts with width, height and pixel format (RGBA_8888 = 1,
+# RGBX_8888 = 2), followed on newer Android versions by a 4 byte color space
+RAW_HEADER_SIZE = 12
+RAW_PIXEL_FORMATS = (1, 2)
+# Raw captures of the wrong size in a row before giving up on the raw format;
+# a single short read is usually a device going away mid-transfer
+RAW_FAILURE_LIMIT = 3
+# Seconds a screencap may take before the adb process is killed
+SCREENCAP_TIMEOUT = 10
 
 class AdbController(QObject):
 
@@ -13,6 +27,16 @@ class AdbController(QObject):
         self.scrcpy_process = None
         self.adb_path = self._find_adb_path()
         self.screenshot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "temp_screenshot.png")
+        
+        # Raw screenshots are read and converted into reused buffers
+        self.raw_screencap = True
+        self.raw_failures = 0
+        self.raw_pool = FramePool(max_buffers=2)
+        self.frame_pool = FramePool()
+        
+        # Running totals of adb_command calls, used to attribute input latency
+        self.command_count = 0
+        self.command_time = 0.0
     
     def _find_adb_path(self):
         try:
@@ -83,13 +107,21 @@ class AdbController(QObject):
         else:
             cmd.extend(command)
         
+        # e.g. "input tap" or "wm"
+        name = ' '.join(command[:2]) if command and command[0] == 'input' else (command[0] if command else '')
+        start = time.perf_counter()
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+            with metrics.timer('adb_command_seconds', "Duration of ADB commands", command=name):
+                result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+            self.command_count += 1
+            self.command_time += time.perf_counter() - start
             if result.returncode != 0:
+                metrics.counter('adb_command_errors_total', "Failed ADB commands", command=name).inc()
                 print(f"ADB command error: {result.stderr}")
                 return None
             return result.stdout.strip()
         except subprocess.SubprocessError as e:
+            metrics.counter('adb_command_errors_total', "Failed ADB commands", command=name).inc()
             print(f"Error executing ADB command: {e}")
             return None
     
@@ -113,14 +145,110 @@ class AdbController(QObject):
         return self.adb_command(['input', 'text', safe_text], shell=True)
     
     def take_screenshot(self):
+        if self.raw_screencap:
+            frame = self._take_raw_screenshot()
+            if frame is not None:
+                return frame
+        
+        return self._take_png_screenshot()
+    
+    def _take_raw_screenshot(self):
+        """Capture uncompressed pixels straight into pooled buffers.
+        
+        This skips the PNG encode on the device and the decode here, and in the
+        steady state allocates no frame-sized memory. Falls back to PNG for good
+        if the device reports an unknown raw format, or if RAW_FAILURE_LIMIT
+        captures in a row have the wrong size.
+        """
+        cmd = [self.adb_path]
+        if self.device_id:
+            cmd.extend(['-s', self.device_id])
+        cmd.extend(['exec-out', 'screencap'])
+        
+        try:
+            start = time.perf_counter()
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            # A hung transfer is killed, which ends the reads below
+            timer = threading.Timer(SCREENCAP_TIMEOUT, process.kill)
+            timer.start()
+            try:
+                header = process.stdout.read(RAW_HEADER_SIZE)
+                if len(header) < RAW_HEADER_SIZE:
+                    return None
+                
+                width, height, pixel_format = np.frombuffer(header, '<u4')
+                pixel_bytes = int(width) * int(height) * 4
+                if pixel_format not in RAW_PIXEL_FORMATS or pixel_bytes == 0:
+                    self.raw_screencap = False
+                    return None
+                
+                # Room for the optional color space field
+                raw = self.raw_pool.acquire((pixel_bytes + 4,))
+                view = memoryview(raw)
+                received = 0
+                while received < len(raw):
+                    count = process.stdout.readinto(view[received:])
+                    if not count:
+                        break
+                    received += count
+                del view
+            finally:
+                timer.cancel()
+                process.stdout.close()
+                process.wait()
+            transferred = time.perf_counter()
+            metrics.histogram('capture_stage_seconds', "Duration of screen capture stages",
+                              stage='transfer').observe(transferred - start)
+            
+            extra = received - pixel_bytes
+            if extra not in (0, 4):
+                self.raw_failures += 1
+                if self.raw_failures >= RAW_FAILURE_LIMIT:
+                    self.raw_screencap = False
+                return None
+            self.raw_failures = 0
+            
+            pixels = raw[extra:extra + pixel_bytes].reshape(int(height), int(width), 4)
+            frame = self.frame_pool.acquire((int(height), int(width), 3))
+            cv2.cvtColor(pixels, cv2.COLOR_RGBA2BGR, dst=frame)
+            metrics.histogram('capture_stage_seconds', stage='convert').observe(time.perf_counter() - transferred)
+            return frame
+        except Exception as e:
+            print(f"Error taking raw screenshot: {e}")
+            return None
+    
+    def get_capture_stats(self):
+        """Per-frame buffer statistics of the raw capture path"""
+        frame_stats = self.frame_pool.get_stats()
+        raw_stats = self.raw_pool.get_stats()
+        frames = frame_stats['acquisitions']
+        allocated = frame_stats['allocated_bytes'] + raw_stats['allocated_bytes']
+        reused = frame_stats['reused_bytes'] + raw_stats['reused_bytes']
+        return {
+            'frames': frames,
+            'allocated_per_frame': allocated / frames if frames else 0.0,
+            'without_reuse_per_frame': (allocated + reused) / frames if frames else 0.0
+        }
+    
+    def _take_png_screenshot(self):
         try:
             cmd = [self.adb_path]
             if self.device_id:
                 cmd.extend(['-s', self.device_id])
             cmd.extend(['shell', 'screencap', '-p'])
 
+            start = time.perf_counter()
             process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            screenshot_data, error = process.communicate()
+            try:
+                screenshot_data, error = process.communicate(timeout=SCREENCAP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                print("Screenshot capture timed out")
+                return None
+            transferred = time.perf_counter()
+            metrics.histogram('capture_stage_seconds', "Duration of screen capture stages",
+                              stage='transfer').observe(transferred - start)
 
             if process.returncode != 0 or not screenshot_data:
                 print(f"Screenshot capture error: {error.decode('utf-8', errors='ignore')}")
@@ -131,6 +259,7 @@ class AdbController(QObject):
 
             nparr = np.frombuffer(screenshot_data, np.uint8)
             image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            metrics.histogram('capture_stage_seconds', stage='decode').observe(time.perf_counter() - transferred)
             return image
         except Exception as e:
             print(f"Error taking screenshot: {e}")
@@ -148,6 +277,23 @@ class AdbController(QObject):
                 pass
         return None, None
     
+    def get_device_density(self):
+        output = self.adb_command(['wm', 'density'], shell=True)
+        if output:
+            try:
+                # An override density, if present, is listed last and wins
+                return int(output.strip().splitlines()[-1].split(': ')[1])
+            except (IndexError, ValueError):
+                pass
+        return None
+    
+    def get_device_resolution(self):
+        """Return the screen size and density as a dict, or None if unavailable"""
+        width, height = self.get_device_dimensions()
+        if not width or not height:
+            return None
+        return {'width': width, 'height': height, 'density': self.get_device_density()}
+    
     def restart_adb_server(self):
         subprocess.run([self.adb_path, 'kill-server'], check=False)
         time.sleep(1)
@@ -165,18 +311,29 @@ class ScreenCaptureThread(QThread):
         self.adb_controller = adb_controller
         self.interval = interval
         self.running = False
+        self.emitted_at = None  # perf_counter time of the last frame signal, to time its delivery
     
-    def run(self):
+    def start(self, *args):
+        # Set before the thread runs so a stop() right after start() is not lost
         self.running = True
+        super().start(*args)
+    
+    def run(self):
         failures = 0
+        profiler.register("Capture")
         
         while self.running:
+            profiler.poll()
             try:
-                frame = self.adb_controller.take_screenshot()
+                with metrics.timer('capture_stage_seconds', stage='capture'):
+                    frame = self.adb_controller.take_screenshot()
                 if frame is not None:
+                    metrics.counter('frames_captured_total', "Frames captured from the device").inc()
+                    self.emitted_at = time.perf_counter()
                     self.update_frame.emit(frame)
                     failures = 0
                 else:
+                    metrics.counter('capture_failures_total', "Failed screen captures").inc()
                     failures += 1
                     if failures >= 3:
                         self.error.emit("Failed to capture screenshot multiple times")
@@ -186,6 +343,8 @@ class ScreenCaptureThread(QThread):
                 failures += 1
             
             time.sleep(self.interval)
+        
+        profiler.unregister()
     
     def stop(self):
         self.running = False
@@ -1,7 +1,9 @@
 import numpy as np
 import cv2
 import os
+import operator
 from enum import Enum
+from controllers.glyph_ocr import parse_number
 
 
 class ConditionType(Enum):
@@ -9,6 +11,53 @@ class ConditionType(Enum):
     TEMPLATE_ABSENT = "template_absent"
     COLOR_PRESENT = "color_present"
     PIXEL_COLOR = "pixel_color"
+    TEMPLATE_COUNT = "template_count"
+    SCREEN_IS = "screen_is"
+    PIXEL_SIGNATURE = "pixel_signature"
+    TEXT_EQUALS = "text_equals"
+    NUMBER_COMPARE = "number_compare"
+
+
+NUMBER_OPERATORS = {
+    '<':  operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '>':  operator.gt
+}
+
+
+def sample_signature_points(frame, region=None, count=16, tolerance=10):
+    """Sample a grid of pixels from a frame as pixel signature points.
+
+    Returns a list of [x, y, b, g, r, tolerance] points inside region
+    (x, y, w, h), or inside the whole frame when no region is given.
+    """
+    if frame is None:
+        return []
+
+    frame_h, frame_w = frame.shape[:2]
+    x, y, w, h = region if region else (0, 0, frame_w, frame_h)
+    x, y = max(0, x), max(0, y)
+    w, h = min(w, frame_w - x), min(h, frame_h - y)
+    if w <= 0 or h <= 0:
+        return []
+
+    # Spread the points on a grid with the same aspect ratio as the region
+    cols = max(1, int(round(np.sqrt(count * w / h))))
+    rows = max(1, int(np.ceil(count / cols)))
+    xs = x + ((np.arange(cols) + 0.5) * w / cols).astype(int)
+    ys = y + ((np.arange(rows) + 0.5) * h / rows).astype(int)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    grid_x, grid_y = grid_x.ravel()[:count], grid_y.ravel()[:count]
+
+    colors = frame[grid_y, grid_x]
+    if colors.ndim == 1:
+        colors = np.repeat(colors[:, np.newaxis], 3, axis=1)
+
+    return [[int(px), int(py), int(c[0]), int(c[1]), int(c[2]), tolerance]
+            for px, py, c in zip(grid_x, grid_y, colors)]
 
 
 class ConditionChecker:
@@ -16,28 +65,48 @@ class ConditionChecker:
     def __init__(self, opencv_processor):
         self.opencv_processor = opencv_processor
 
-    def check_condition(self, condition):
+    def check_condition(self, condition, frame=None):
+        """Evaluate a condition against the given frame, or the processor's last frame"""
         if not condition or 'type' not in condition:
             return False
 
         condition_type = condition['type']
         data = condition.get('data', {})
 
+        # Evaluate against a single snapshot even if a new frame arrives meanwhile
+        if frame is None:
+            frame = self.opencv_processor.last_frame
+
         if condition_type == ConditionType.TEMPLATE_PRESENT.value:
-            return self._check_template_present(data)
+            return self._check_template_present(data, frame)
 
         elif condition_type == ConditionType.TEMPLATE_ABSENT.value:
-            return not self._check_template_present(data)
+            return not self._check_template_present(data, frame)
 
         elif condition_type == ConditionType.COLOR_PRESENT.value:
-            return self._check_color_present(data)
+            return self._check_color_present(data, frame)
 
         elif condition_type == ConditionType.PIXEL_COLOR.value:
-            return self._check_pixel_color(data)
+            return self._check_pixel_color(data, frame)
+
+        elif condition_type == ConditionType.TEMPLATE_COUNT.value:
+            return self._check_template_count(data, frame)
+
+        elif condition_type == ConditionType.SCREEN_IS.value:
+            return self._check_screen_is(data, frame)
+
+        elif condition_type == ConditionType.PIXEL_SIGNATURE.value:
+            return self._check_pixel_signature(data, frame)
+
+        elif condition_type == ConditionType.TEXT_EQUALS.value:
+            return self._check_text_equals(data, frame)
+
+        elif condition_type == ConditionType.NUMBER_COMPARE.value:
+            return self._check_number_compare(data, frame)
 
         return False
 
-    def _check_template_present(self, data):
+    def _check_template_present(self, data, frame):
         template_path = data.get('template_path', '')
         threshold = data.get('threshold', 0.8)
 
@@ -46,36 +115,106 @@ class ConditionChecker:
 
         match = self.opencv_processor.find_template(
                 template_path,
-                threshold=threshold
+                threshold=threshold,
+                scale_tolerant=data.get('scale_tolerant', False),
+                match_mode=data.get('match_mode', 'template'),
+                frame=frame
         )
 
         return match is not None
 
-    def _check_color_present(self, data):
-        color_range = data.get('color_range', None)
+    def _check_template_count(self, data, frame):
+        template_path = data.get('template_path', '')
+        threshold = data.get('threshold', 0.8)
+        min_count = data.get('min_count', 1)
+        max_count = data.get('max_count', 0)  # 0 means no upper bound
+
+        if not os.path.exists(template_path):
+            return False
+
+        # One extra match is enough to tell that the upper bound was exceeded
+        limit = max_count + 1 if max_count > 0 else max(min_count, 100)
+        matches = self.opencv_processor.find_all_templates(
+                template_path,
+                threshold=threshold,
+                max_matches=limit,
+                frame=frame,
+                scale_tolerant=data.get('scale_tolerant', False)
+        )
+
+        count = len(matches)
+        if count < min_count:
+            return False
+        return max_count <= 0 or count <= max_count
+
+    def _check_screen_is(self, data, frame):
+        label = data.get('label', '')
+        max_distance = data.get('max_distance', 48)
+
+        if not label:
+            return False
+
+        screen_label, _ = self.opencv_processor.classify_screen(max_distance, frame)
+        return screen_label == label
+
+    def _check_text_equals(self, data, frame):
+        region = data.get('region', None)
+        expected = data.get('text', '')
+
+        text = self.opencv_processor.read_text(region, frame)
+        if text is None:
+            return False
+
+        return text.replace(' ', '') == expected.replace(' ', '')
+
+    def _check_number_compare(self, data, frame):
+        region = data.get('region', None)
+        compare = NUMBER_OPERATORS.get(data.get('operator', '=='))
+        value = data.get('value', 0)
+
+        text = self.opencv_processor.read_text(region, frame)
+        if text is None or compare is None:
+            return False
+
+        number = parse_number(text)
+        if number is None:
+            return False
+
+        return compare(number, value)
+
+    def _check_color_present(self, data, frame):
+        color_ranges = data.get('color_ranges', None)
+        if color_ranges is None and data.get('color_range', None):
+            color_ranges = [data['color_range']]
         min_area = data.get('min_area', 10)
+        downsample = data.get('downsample', 1)
+        require_all = data.get('match', 'any') == 'all'
 
-        if not color_range or len(color_range) != 2:
+        if not color_ranges or any(len(color_range) != 2 for color_range in color_ranges):
             return False
 
-        color_match = self.opencv_processor.find_color(
-                color_range,
-                min_area=min_area
+        regions = self.opencv_processor.find_colors(
+                {index: color_range for index, color_range in enumerate(color_ranges)},
+                min_area=min_area,
+                downsample=downsample,
+                frame=frame
         )
 
-        return color_match is not None
+        if regions is None:
+            return False
+
+        found = [len(matches) > 0 for matches in regions.values()]
+        return all(found) if require_all else any(found)
 
-    def _check_pixel_color(self, data):
+    def _check_pixel_color(self, data, frame):
         x = data.get('x', 0)
         y = data.get('y', 0)
         color = data.get('color', [0, 0, 0])
         tolerance = data.get('tolerance', 10)
 
-        if not self.opencv_processor.last_frame is not None:
+        if frame is None:
             return False
 
-        frame = self.opencv_processor.last_frame
-
         if y >= frame.shape[0] or x >= frame.shape[1]:
             return False
 
@@ -85,4 +224,26 @@ class ConditionChecker:
             if abs(int(pixel_color[i]) - int(color[i])) > tolerance:
                 return False
 
-        return True
\ No newline at end of file
+        return True
+
+    def _check_pixel_signature(self, data, frame):
+        points = data.get('points', [])
+        min_match = data.get('min_match', 1.0)
+
+        if frame is None or not points:
+            return False
+
+        # Each point is [x, y, b, g, r, tolerance]
+        points = np.asarray(points, dtype=np.int32)
+        xs, ys = points[:, 0], points[:, 1]
+        inside = (xs >= 0) & (ys >= 0) & (xs < frame.shape[1]) & (ys < frame.shape[0])
+
+        sampled = frame[ys[inside], xs[inside]].astype(np.int32)
+        if sampled.ndim == 1:
+            sampled = sampled[:, np.newaxis]
+
+        expected = points[inside, 2:2 + sampled.shape[1]]
+        within = np.abs(sampled - expected).max(axis=1) <= points[inside, 5]
+
+        # Points outside the frame count as mismatches
+        return within.sum() >= min_match * len(points)
@@ -0,0 +1,128 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+
+class FeatureMatcher:
+    """ORB feature matching for templates that rotate, scale or are partly occluded.
+
+    Template keypoints and descriptors are computed once and persisted next to
+    the template image as <template>.orb.npz. Frame features are computed once
+    per frame and shared by every query against that frame.
+    """
+
+    def __init__(self, n_features=1500, ratio=0.75, min_inliers=10):
+        self.orb = cv2.ORB_create(nfeatures=n_features)
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+        self.ratio = ratio
+        self.min_inliers = min_inliers
+        self.template_features = {}  # template_path -> (mtime, points, descriptors, (h, w))
+        self.frame_key = None
+        self.frame_features = (None, None)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def features_path(template_path):
+        return template_path + ".orb.npz"
+
+    def load_template_features(self, template_path):
+        """Return (points, descriptors, (h, w)) for a template, computing them only when stale"""
+        if not os.path.exists(template_path):
+            return None
+
+        mtime = os.path.getmtime(template_path)
+        cached = self.template_features.get(template_path)
+        if cached and cached[0] == mtime:
+            return cached[1:]
+
+        features_file = self.features_path(template_path)
+        features = None
+        if os.path.exists(features_file) and os.path.getmtime(features_file) >= mtime:
+            try:
+                with np.load(features_file, allow_pickle=False) as data:
+                    features = (data['points'], data['descriptors'], tuple(data['shape']))
+            except Exception as e:
+                print(f"Error loading template features: {e}")
+
+        if features is None:
+            template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+            if template is None:
+                return None
+
+            with self.lock:
+                keypoints, descriptors = self.orb.detectAndCompute(template, None)
+            if descriptors is None:
+                descriptors = np.zeros((0, 32), np.uint8)
+
+            points = np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2)
+            features = (points, descriptors, template.shape[:2])
+
+            try:
+                np.savez(features_file, points=points, descriptors=descriptors,
+                         shape=np.array(template.shape[:2]))
+            except Exception as e:
+                print(f"Error saving template features: {e}")
+
+        self.template_features[template_path] = (mtime,) + features
+        return features
+
+    def get_frame_features(self, frame, frame_key):
+        """Return (points, descriptors) for a frame, computed once per frame_key"""
+        with self.lock:
+            if frame_key is not None and frame_key == self.frame_key:
+                return self.frame_features
+
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
+            keypoints, descriptors = self.orb.detectAndCompute(gray, None)
+            points = np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2)
+
+            self.frame_key = frame_key
+            self.frame_features = (points, descriptors)
+            return self.frame_features
+
+    def find(self, template_path, frame, frame_key=None):
+        """Locate a template by feature matching and homography verification.
+
+        Returns the (x, y, w, h) bounding box of the projected template, or None.
+        """
+        features = self.load_template_features(template_path)
+        if features is None:
+            return None
+
+        template_points, template_descriptors, (h, w) = features
+        if len(template_descriptors) < self.min_inliers:
+            return None
+
+        frame_points, frame_descriptors = self.get_frame_features(frame, frame_key)
+        if frame_descriptors is None or len(frame_descriptors) < 2:
+            return None
+
+        pairs = self.matcher.knnMatch(template_descriptors, frame_descriptors, k=2)
+
+        # Lowe's ratio test
+        good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < self.ratio * p[1].distance]
+        if len(good) < self.min_inliers:
+            return None
+
+        src = template_points[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+        dst = frame_points[[m.trainIdx for m in good]].reshape(-1, 1, 2)
+
+        homography, inlier_mask = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
+        if homography is None or int(inlier_mask.sum()) < self.min_inliers:
+            return None
+
+        corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+        projected = cv2.perspectiveTransform(corners, homography)
+
+        # Reject degenerate projections (folded or collapsed quads)
+        if not cv2.isContourConvex(projected.astype(np.int32)) or cv2.contourArea(projected) < 16:
+            return None
+
+        x, y, bw, bh = cv2.boundingRect(projected)
+        frame_h, frame_w = frame.shape[:2]
+        x, y = max(0, x), max(0, y)
+        bw, bh = min(bw, frame_w - x), min(bh, frame_h - y)
+        if bw <= 0 or bh <= 0:
+            return None
+        return (x, y, bw, bh)
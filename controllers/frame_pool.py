@@ -0,0 +1,74 @@
+import ctypes
+import threading
+import weakref
+import numpy as np
+
+
+class FramePool:
+    """Reusable buffers for the frames of a capture stream.
+
+    acquire() leases a buffer. The array it returns, and every view, slice or
+    memoryview taken from it, keeps the lease, and the buffer only goes back
+    to the pool once the last of them is released. Frames held by the
+    display, the vision code or a queued signal are therefore never
+    overwritten. Only buffers of the most recent shape are kept.
+    """
+
+    def __init__(self, max_buffers=6):
+        self.max_buffers = max_buffers
+        self.key = None
+        self.buffers = []  # free buffers of the current shape
+        self.leased = 0
+        self.acquisitions = 0
+        self.allocated_bytes = 0
+        self.reused_bytes = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, shape, dtype=np.uint8):
+        """Lease a buffer of the given shape, reusing a free one when possible"""
+        dtype = np.dtype(dtype)
+        key = (tuple(shape), dtype.str)
+        with self.lock:
+            self.acquisitions += 1
+            if key != self.key:
+                self.key = key
+                self.buffers = []
+
+            if self.buffers:
+                buffer = self.buffers.pop()
+                self.reused_bytes += buffer.nbytes
+            else:
+                buffer = np.empty(int(np.prod(shape)) * dtype.itemsize, np.uint8)
+                self.allocated_bytes += buffer.nbytes
+            self.leased += 1
+
+        # The lease is a separate object over the buffer's memory; arrays made
+        # from it keep it as their base, so it lives exactly as long as they do
+        lease = (ctypes.c_uint8 * buffer.nbytes).from_buffer(buffer)
+        weakref.finalize(lease, self._release, key, buffer)
+        return np.ndarray(shape, dtype, buffer=lease)
+
+    def _release(self, key, buffer):
+        with self.lock:
+            self.leased -= 1
+            if key == self.key and len(self.buffers) < self.max_buffers:
+                self.buffers.append(buffer)
+
+    def get_stats(self):
+        with self.lock:
+            acquisitions = max(1, self.acquisitions)
+            return {
+                'acquisitions': self.acquisitions,
+                'buffers': len(self.buffers),
+                'leased': self.leased,
+                'allocated_bytes': self.allocated_bytes,
+                'reused_bytes': self.reused_bytes,
+                'allocated_per_acquisition': self.allocated_bytes / acquisitions,
+                'reused_per_acquisition': self.reused_bytes / acquisitions
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.acquisitions = 0
+            self.allocated_bytes = 0
+            self.reused_bytes = 0
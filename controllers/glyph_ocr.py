@@ -0,0 +1,190 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+
+# Every glyph is resized to this (width, height) before comparison
+GLYPH_SIZE = (12, 20)
+
+# Version of the glyph vectors stored in an atlas; version 1 padded glyphs to
+# the height of the whole region instead of the text line
+ATLAS_VERSION = 2
+
+
+def binarize_text(gray):
+    """Otsu threshold with the text as foreground (white)"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return binary
+
+
+def segment_glyphs(roi):
+    """Split a text region into per-character binary crops, left to right"""
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if len(roi.shape) == 3 else roi
+    binary = binarize_text(gray)
+
+    # Light text on a dark background comes out inverted; the text should be the minority
+    if cv2.countNonZero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [cv2.boundingRect(cnt) for cnt in contours]
+
+    # Drop single-pixel specks
+    boxes = sorted(b for b in boxes if b[2] * b[3] >= 4)
+
+    # Merge boxes that overlap horizontally, e.g. the dot of an 'i' or the parts of '%'
+    merged = []
+    for x, y, w, h in boxes:
+        if merged and x < merged[-1][0] + merged[-1][2]:
+            mx, my, mw, mh = merged[-1]
+            nx, ny = min(mx, x), min(my, y)
+            merged[-1] = (nx, ny, max(mx + mw, x + w) - nx, max(my + mh, y + h) - ny)
+        else:
+            merged.append((x, y, w, h))
+
+    return [binary[y:y + h, x:x + w] for x, y, w, h in merged], merged
+
+
+def glyph_vectors(glyphs, boxes):
+    """Turn binary glyph crops into zero-mean, unit-norm vectors for correlation.
+
+    Each glyph is placed on a canvas as tall as the text line (the union of
+    the glyph boxes), at its offset within the line, so that e.g. '.' and '8'
+    are not stretched to the same shape and the padding around the region
+    does not matter.
+    """
+    top = min((y for _, y, _, _ in boxes), default=0)
+    line_height = max((y + h for _, y, _, h in boxes), default=1) - top
+
+    vectors = np.zeros((len(glyphs), GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+    for i, (glyph, (_, y, _, _)) in enumerate(zip(glyphs, boxes)):
+        h, w = glyph.shape
+        size = max(line_height, w)
+        canvas = np.zeros((size, max(w, size * GLYPH_SIZE[0] // GLYPH_SIZE[1])), np.uint8)
+        y0 = y - top
+        x0 = (canvas.shape[1] - w) // 2
+        canvas[y0:y0 + h, x0:x0 + w] = glyph
+        vectors[i] = cv2.resize(canvas, GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel()
+
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+class GlyphAtlas:
+    """Atlas of labeled glyphs used to read short strings such as counters and timers"""
+
+    def __init__(self, atlas_file=None, min_score=0.6):
+        self.atlas_file = atlas_file or os.path.abspath(os.path.join(
+                os.path.dirname(os.path.dirname(__file__)),
+                "resources",
+                "glyphs",
+                "glyph_atlas.npz"
+        ))
+        self.min_score = min_score
+        self.labels = np.zeros(0, dtype='<U1')
+        self.vectors = np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def load(self):
+        self.loaded = True
+        if not os.path.exists(self.atlas_file):
+            return True
+
+        try:
+            with np.load(self.atlas_file, allow_pickle=False) as data:
+                labels = data['labels']
+                vectors = data['vectors'].astype(np.float32)
+                version = int(data['version']) if 'version' in data else 1
+            if version < ATLAS_VERSION:
+                print(f"Glyph atlas {self.atlas_file} was taught with an older glyph layout; "
+                      "teach the glyphs again if regions read as '?'")
+            with self.lock:
+                self.labels, self.vectors = labels, vectors
+            return True
+        except Exception as e:
+            print(f"Error loading glyph atlas: {e}")
+            return False
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.atlas_file), exist_ok=True)
+            with self.lock:
+                labels, vectors = self.labels, self.vectors
+            with open(self.atlas_file, 'wb') as f:
+                np.savez_compressed(f, labels=labels, vectors=vectors, version=ATLAS_VERSION)
+            return True
+        except Exception as e:
+            print(f"Error saving glyph atlas: {e}")
+            return False
+
+    def add_crop(self, roi, text):
+        """Add the glyphs of a labeled crop to the atlas.
+
+        text must list the characters shown in the crop, without spaces.
+        Returns the number of glyphs added, or -1 if the segmentation found a
+        different number of glyphs than characters in text.
+        """
+        self._ensure_loaded()
+        text = text.replace(' ', '')
+        glyphs, boxes = segment_glyphs(roi)
+        if not text or len(glyphs) != len(text):
+            return -1
+
+        vectors = glyph_vectors(glyphs, boxes)
+        with self.lock:
+            self.labels = np.concatenate([self.labels, np.array(list(text), dtype='<U1')])
+            self.vectors = np.vstack([self.vectors, vectors])
+        return len(glyphs)
+
+    def get_characters(self):
+        self._ensure_loaded()
+        with self.lock:
+            return sorted(set(self.labels.tolist()))
+
+    def read(self, roi):
+        """Read the string in a region; unknown glyphs are returned as '?'"""
+        self._ensure_loaded()
+        with self.lock:
+            labels, atlas = self.labels, self.vectors
+
+        glyphs, boxes = segment_glyphs(roi)
+        if not glyphs or len(labels) == 0:
+            return ""
+
+        # Correlate every glyph against the whole atlas in one product
+        scores = glyph_vectors(glyphs, boxes) @ atlas.T
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(glyphs)), best]
+
+        return "".join(labels[i] if score >= self.min_score else "?"
+                       for i, score in zip(best, best_scores))
+
+
+def parse_number(text):
+    """Parse a number read from the screen, ignoring thousands separators and units.
+
+    Times like 01:30 or 1:02:03 are returned in seconds.
+    """
+    cleaned = "".join(c for c in text.replace(',', '') if c.isdigit() or c in '.-:')
+    try:
+        if ':' not in cleaned:
+            return float(cleaned)
+
+        sign = -1 if cleaned.startswith('-') else 1
+        parts = cleaned.lstrip('-').split(':')
+        if len(parts) > 3 or not all(part.isdigit() for part in parts[:-1]) \
+                or not parts[-1].replace('.', '', 1).isdigit():
+            return None
+        seconds = 0.0
+        for part in parts[:-1]:
+            seconds = seconds * 60 + int(part)
+        return sign * (seconds * 60 + float(parts[-1]))
+    except ValueError:
+        return None
@@ -0,0 +1,99 @@
+import threading
+from collections import deque
+
+
+class MatchTracker:
+    """Remembers where templates were recently found so they can be searched
+    for in a small window around those locations before scanning the whole frame"""
+
+    def __init__(self, history=3, margin=48):
+        self.history = history
+        self.margin = margin
+        self.locations = {}  # template_path -> deque of recent (x, y, w, h) matches
+        self.frame_shape = None
+        self.lookups = 0
+        self.local_hits = 0
+        self.lock = threading.Lock()
+
+    def update_frame_shape(self, shape):
+        """Forget all locations when the frame size or orientation changes"""
+        with self.lock:
+            if self.frame_shape is not None and self.frame_shape[:2] != shape[:2]:
+                self.locations.clear()
+            self.frame_shape = shape
+
+    def search_windows(self, template_path, template_shape):
+        """Return the regions (x1, y1, x2, y2) to try before a global search"""
+        with self.lock:
+            recent = list(self.locations.get(template_path, ()))
+            frame_shape = self.frame_shape
+
+        if not recent or frame_shape is None:
+            return []
+
+        frame_h, frame_w = frame_shape[:2]
+        template_h, template_w = template_shape[:2]
+
+        windows = []
+        for x, y, w, h in reversed(recent):
+            x1 = max(0, x - self.margin)
+            y1 = max(0, y - self.margin)
+            x2 = min(frame_w, x + w + self.margin)
+            y2 = min(frame_h, y + h + self.margin)
+
+            # The window has to be at least as large as the template
+            if x2 - x1 >= template_w and y2 - y1 >= template_h:
+                windows.append((x1, y1, x2, y2))
+
+        return windows
+
+    def record(self, template_path, match, local=False):
+        """Record the outcome of one lookup (match is None on a miss)"""
+        with self.lock:
+            self.lookups += 1
+            if match is None:
+                return
+
+            if local:
+                self.local_hits += 1
+
+            recent = self.locations.setdefault(template_path, deque(maxlen=self.history))
+            if match in recent:
+                recent.remove(match)
+            recent.append(match)
+
+    def invalidate(self, template_path=None):
+        """Forget the tracked locations of one template, or of all templates"""
+        with self.lock:
+            if template_path is None:
+                self.locations.clear()
+            else:
+                self.locations.pop(template_path, None)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'lookups': self.lookups,
+                'local_hits': self.local_hits,
+                'local_hit_rate': self.local_hits / self.lookups if self.lookups else 0.0,
+                'tracked_templates': len(self.locations)
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.lookups = 0
+            self.local_hits = 0
+
+    def take_counts(self):
+        """Return the counters since the last call and reset them, e.g. to report them from a worker"""
+        with self.lock:
+            counts = {'lookups': self.lookups, 'local_hits': self.local_hits}
+            self.lookups = 0
+            self.local_hits = 0
+        return counts
+
+    def add_counts(self, counts):
+        """Add counters taken from another tracker with take_counts()"""
+        with self.lock:
+            self.lookups += counts.get('lookups', 0)
+            self.local_hits += counts.get('local_hits', 0)
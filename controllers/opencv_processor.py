@@ -2,7 +2,63 @@ import cv2
 import numpy as np
 import time
 import os
+import threading
+import zlib
+from concurrent.futures import Future
 from PyQt5.QtCore import QObject, pyqtSignal
+from controllers.match_tracker import MatchTracker
+from controllers.screen_index import ScreenIndex
+from controllers.resolution import TemplateScaler
+from controllers.feature_matcher import FeatureMatcher
+from controllers.glyph_ocr import GlyphAtlas, binarize_text
+from controllers.template_prefilter import TemplatePrefilter
+from controllers.vision_pool import VisionPool
+from controllers.condition_checker import ConditionChecker, sample_signature_points
+from utils.metrics import registry as metrics
+
+
+def frame_signature(frame, step=16):
+    """Cheap content hash of a frame, computed on a strided subsample"""
+    if frame is None:
+        return None
+    sample = np.ascontiguousarray(frame[::step, ::step])
+    return zlib.crc32(sample.tobytes()) ^ hash(frame.shape)
+
+
+# Template scales tried, relative to the stored template, when matching is scale tolerant
+SCALE_SWEEP = (0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.25, 1.4, 1.6, 1.8, 2.0)
+# Seconds between scale sweeps for a template that keeps missing. The wait
+# doubles after each sweep that finds nothing, up to MAX_SWEEP_INTERVAL, which
+# is also used once a scale is remembered for the template
+SWEEP_INTERVAL = 1.0
+MAX_SWEEP_INTERVAL = 10.0
+
+
+def non_max_suppression(xs, ys, w, h, scores, overlap=0.3, max_count=None):
+    """Greedy NMS over equally sized boxes, vectorized per kept box.
+    
+    Returns the indices of the kept boxes in descending score order.
+    """
+    order = np.argsort(-scores, kind='stable')
+    xs = xs[order].astype(np.int64)
+    ys = ys[order].astype(np.int64)
+    area = w * h
+    
+    keep = []
+    remaining = np.arange(len(order))
+    while remaining.size and (max_count is None or len(keep) < max_count):
+        best = remaining[0]
+        keep.append(order[best])
+        
+        rest = remaining[1:]
+        inter_w = np.clip(w - np.abs(xs[rest] - xs[best]), 0, None)
+        inter_h = np.clip(h - np.abs(ys[rest] - ys[best]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (2 * area - inter)
+        remaining = rest[iou <= overlap]
+    
+    return keep
+
 
 class OpenCVProcessor(QObject):
     """Handles OpenCV image processing operations"""
@@ -14,22 +70,159 @@ class OpenCVProcessor(QObject):
         self.adb_controller = adb_controller
         self.last_frame = None
         self.template_cache = {}  # Cache for loaded templates
+        self.match_tracker = MatchTracker()
+        self.screen_index = ScreenIndex()
+        
+        # Templates are rescaled when playing a recording made on another resolution
+        self.template_scaler = TemplateScaler()
+        self.template_scale = 1.0
+        self.scale_memory = {}  # (device_id, template_path) -> scale that last matched
+        self.device_id = None  # Device scales are remembered for when there is no adb controller
+        self.template_versions = {}  # template_path -> mtime when re-captured, sent to vision workers
+        self.sweep_backoff = {}  # (device_id, template_path) -> (time of the last sweep, wait before the next)
+        self.feature_matcher = FeatureMatcher()
+        self.glyph_atlas = GlyphAtlas()
+        self.prefilter = TemplatePrefilter()
+        
+        # Live frame stream state, used by waiters to block until a new frame arrives
+        self.frame_condition = threading.Condition()
+        self.frame_seq = 0
+        self.frame_time = 0
+        self.last_wait_stats = {}
+        self.last_stable_stats = {}
+        self.last_condition_stats = {}
+        self.last_match_score = None
+        
+        # Optional pool of worker processes for vision requests, see submit()
+        self.vision_pool = None
+        self.condition_checker = None
+    
+    def start_vision_pool(self, workers=None):
+        """Run vision requests made through submit() in worker processes"""
+        self.stop_vision_pool()
+        try:
+            self.vision_pool = VisionPool(workers)
+            return True
+        except Exception as e:
+            print(f"Error starting vision pool: {e}")
+            self.vision_pool = None
+            return False
+    
+    def stop_vision_pool(self):
+        if self.vision_pool is not None:
+            pool, self.vision_pool = self.vision_pool, None
+            pool.shutdown()
     
+    def submit(self, operation, frame=None, **kwargs):
+        """Run a vision operation on a frame and return a Future with its result.
+        
+        operation is one of find_template, find_all_templates, find_colors,
+        read_text, classify_screen, sample_pixel_signature or check_condition
+        (with a condition keyword argument). With a vision pool running, the
+        work happens in a worker process; otherwise it runs right away in the
+        calling thread and the returned future is already done.
+        """
+        if frame is None:
+            frame = self.last_frame
+        
+        pool = self.vision_pool
+        if pool is not None and frame is not None:
+            start = time.perf_counter()
+            device_id = self._device_id()
+            context = {
+                'template_scale': self.template_scale,
+                'device_id': device_id,
+                'scales': {path: scale for (device, path), scale in list(self.scale_memory.items())
+                           if device == device_id},
+                'templates': dict(self.template_versions)
+            }
+            request = pool.submit(operation, frame, context, **kwargs)
+            request_time = metrics.histogram('vision_request_seconds', "Round trip of vision pool requests",
+                                             operation=operation)
+            request.add_done_callback(lambda f: request_time.observe(time.perf_counter() - start))
+            future = Future()
+            request.add_done_callback(lambda f: self._finish_request(f, future))
+            return future
+        
+        future = Future()
+        try:
+            if operation == 'check_condition':
+                if self.condition_checker is None:
+                    self.condition_checker = ConditionChecker(self)
+                future.set_result(self.condition_checker.check_condition(kwargs['condition'], frame))
+            else:
+                future.set_result(getattr(self, operation)(frame=frame, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def _finish_request(self, request, future):
+        """Apply what a vision worker learned during a request, then hand its result to the caller"""
+        if request.cancelled():
+            future.cancel()
+            return
+        if request.exception() is not None:
+            future.set_exception(request.exception())
+            return
+        
+        result, state = request.result()
+        try:
+            self._apply_worker_state(state)
+        except Exception as e:
+            print(f"Error applying vision worker state: {e}")
+        future.set_result(result)
+    
+    def _apply_worker_state(self, state):
+        if 'match_score' in state:
+            self.last_match_score = state['match_score']
+        self.scale_memory.update(state['scales'])
+        self.match_tracker.add_counts(state['tracker'])
+        self.prefilter.add_counts(state['prefilter'])
+        # Workers cannot reach our signal connections, so report their matches from here
+        for template_path, match in state['found']:
+            self.template_found.emit(template_path, match)
+    
+    def _device_id(self):
+        return getattr(self.adb_controller, 'device_id', self.device_id)
+    
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='process_frame')
     def process_frame(self, frame):
         """Process a frame with OpenCV operations"""
         if frame is None:
             return None
         
-        # Store the last processed frame
-        self.last_frame = frame.copy()
+        # Keep a read-only view rather than a copy; code that needs to draw on
+        # a frame copies it first (see highlight_match)
+        shared = frame.view()
+        shared.flags.writeable = False
+        
+        # Store the last processed frame and wake up anyone waiting on the stream
+        with self.frame_condition:
+            self.last_frame = shared
+            self.frame_seq += 1
+            self.frame_time = time.time()
+            self.frame_condition.notify_all()
         
         # Apply any general processing here
         return frame
     
-    def load_template(self, template_path):
-        """Load a template image with caching"""
-        if template_path in self.template_cache:
-            return self.template_cache[template_path]
+    def wait_for_frame(self, last_seq, timeout):
+        """Block until a frame newer than last_seq arrives.
+        
+        Returns (seq, frame, arrival_time), or (last_seq, None, None) on timeout.
+        """
+        with self.frame_condition:
+            self.frame_condition.wait_for(lambda: self.frame_seq != last_seq, timeout)
+            if self.frame_seq == last_seq or self.last_frame is None:
+                return last_seq, None, None
+            return self.frame_seq, self.last_frame, self.frame_time
+    
+    def load_template(self, template_path, extra_scale=1.0):
+        """Load a template image with caching, rescaled by template_scale (and extra_scale)"""
+        scale = round(self.template_scale * extra_scale, 3)
+        cache_key = template_path if scale == 1.0 else (template_path, scale)
+        if cache_key in self.template_cache:
+            return self.template_cache[cache_key]
         
         if not os.path.exists(template_path):
             print(f"Template not found: {template_path}")
@@ -37,73 +230,427 @@ class OpenCVProcessor(QObject):
         
         try:
             template = cv2.imread(template_path)
+            if template is not None and scale != 1.0:
+                template = self.template_scaler.get_scaled(template_path, template, scale)
             if template is not None:
-                self.template_cache[template_path] = template
+                self.template_cache[cache_key] = template
             return template
         except Exception as e:
             print(f"Error loading template: {e}")
             return None
     
-    def find_template(self, template_path, threshold=0.8, method=cv2.TM_CCOEFF_NORMED):
-        """Find a template in the current frame"""
-        if self.last_frame is None:
+    def invalidate_template(self, template_path):
+        """Forget everything cached for a template, e.g. after it was captured again"""
+        for key in [key for key in self.template_cache
+                    if key == template_path or (isinstance(key, tuple) and key[0] == template_path)]:
+            self.template_cache.pop(key, None)
+        self.template_scaler.invalidate(template_path)
+        self.match_tracker.invalidate(template_path)
+        self.prefilter.invalidate(template_path)
+        try:
+            self.template_versions[template_path] = os.stat(template_path).st_mtime_ns
+        except OSError:
+            self.template_versions.pop(template_path, None)
+    
+    def set_template_scale(self, scale):
+        """Set the scale applied to templates, e.g. for a recording from another resolution"""
+        if scale != self.template_scale:
+            self.template_scale = scale
+            self.match_tracker.invalidate()
+    
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='find_template')
+    def find_template(self, template_path, threshold=0.8, method=cv2.TM_CCOEFF_NORMED, frame=None,
+                      scale_tolerant=False, match_mode='template'):
+        """Find a template in the current frame (or in the given frame).
+        
+        With scale_tolerant, the template is searched at the scale that last
+        matched on this device, and a coarse scale sweep runs on a miss. Sweeps
+        are spaced out with a growing interval (see SWEEP_INTERVAL) so waiting
+        for an absent template does not sweep every frame.
+        With match_mode 'features', ORB feature matching is used instead of
+        matchTemplate, for templates that may be rotated or partly occluded.
+        """
+        # Score of this call's correlation, left None when it is skipped
+        self.last_match_score = None
+        if frame is None:
+            frame = self.last_frame
+        if frame is None:
             return None
         
-        template = self.load_template(template_path)
+        if match_mode == 'features':
+            match = self.feature_matcher.find(template_path, frame, frame_signature(frame))
+            if match is not None:
+                self.template_found.emit(template_path, match)
+            return match
+        
+        scale_key = (self._device_id(), template_path)
+        scale = self.scale_memory.get(scale_key, 1.0) if scale_tolerant else 1.0
+        
+        template = self.load_template(template_path, scale)
         if template is None:
             return None
         
-        # Ensure both images are the same format
-        if len(self.last_frame.shape) != len(template.shape):
-            if len(self.last_frame.shape) == 3:
+        frame, template = self._same_format(frame, template)
+        self.match_tracker.update_frame_shape(frame.shape)
+        
+        # Skip the correlation entirely when the template's colors are not on screen
+        if self.prefilter.could_match(frame, template, template_path, frame_signature(frame)):
+            match = self._tracked_match(template_path, template, frame, threshold, method)
+        else:
+            self.match_tracker.record(template_path, None)
+            match = None
+        
+        if match is None and scale_tolerant and self._sweep_due(scale_key):
+            scale = self._sweep_scale(template_path, frame, threshold, method)
+            if scale is not None:
+                template = self.load_template(template_path, scale)
+                frame, template = self._same_format(frame, template)
+                match = self._tracked_match(template_path, template, frame, threshold, method)
+                if match is not None:
+                    self.scale_memory[scale_key] = scale
+                    self.sweep_backoff.pop(scale_key, None)
+        
+        if match is not None:
+            self.template_found.emit(template_path, match)
+        return match
+    
+    def _same_format(self, frame, template):
+        """Ensure both images are the same format"""
+        if len(frame.shape) != len(template.shape):
+            if len(frame.shape) == 3:
                 template = cv2.cvtColor(template, cv2.COLOR_GRAY2BGR)
             else:
-                self.last_frame = cv2.cvtColor(self.last_frame, cv2.COLOR_BGR2GRAY)
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame, template
+    
+    def _tracked_match(self, template_path, template, frame, threshold, method):
+        h, w = template.shape[:2]
+        
+        # Search near the locations where this template was last seen first
+        for x1, y1, x2, y2 in self.match_tracker.search_windows(template_path, template.shape):
+            loc = self._match_location(frame[y1:y2, x1:x2], template, threshold, method)
+            if loc is not None:
+                match = (x1 + loc[0], y1 + loc[1], w, h)
+                self.match_tracker.record(template_path, match, local=True)
+                return match
         
-        # Run template matching
-        result = cv2.matchTemplate(self.last_frame, template, method)
+        # Fall back to a search over the whole frame
+        if frame.shape[0] < h or frame.shape[1] < w:
+            self.match_tracker.record(template_path, None)
+            return None
+        
+        start = time.perf_counter()
+        loc = self._match_location(frame, template, threshold, method)
+        self.prefilter.record_match_time(time.perf_counter() - start)
+        if loc is None:
+            self.match_tracker.record(template_path, None)
+            return None
+        
+        match = (loc[0], loc[1], w, h)
+        self.match_tracker.record(template_path, match)
+        return match
+    
+    def _sweep_due(self, scale_key):
+        """Whether a scale sweep may run now for a missed template; spaces out repeated sweeps"""
+        now = time.monotonic()
+        last, interval = self.sweep_backoff.get(scale_key, (None, None))
+        if last is not None and now - last < interval:
+            return False
+        if interval is None:
+            interval = MAX_SWEEP_INTERVAL if scale_key in self.scale_memory else SWEEP_INTERVAL
+        else:
+            interval = min(interval * 2, MAX_SWEEP_INTERVAL)
+        self.sweep_backoff[scale_key] = (now, interval)
+        return True
+    
+    def _sweep_scale(self, template_path, frame, threshold, method):
+        """Find the most likely template scale on a half resolution pyramid level"""
+        template = self.load_template(template_path)
+        if template is None:
+            return None
+        
+        coarse_frame = cv2.pyrDown(frame)
+        best_scale, best_score = None, -1.0
+        
+        for scale in SCALE_SWEEP:
+            h, w = template.shape[:2]
+            size = (int(round(w * scale * 0.5)), int(round(h * scale * 0.5)))
+            if min(size) < 8 or size[0] > coarse_frame.shape[1] or size[1] > coarse_frame.shape[0]:
+                continue
+            
+            coarse_template = cv2.resize(template, size, interpolation=cv2.INTER_AREA)
+            _, coarse_template = self._same_format(coarse_frame, coarse_template)
+            score, _ = self._match_score(coarse_frame, coarse_template, method)
+            if score > best_score:
+                best_scale, best_score = scale, score
+        
+        # Scores on the coarse level run a little lower than at full resolution
+        if best_score < threshold - 0.1:
+            return None
+        return best_scale
+    
+    def _match_score(self, image, template, method):
+        """Run template matching and return (score, location) of the best match"""
+        result = cv2.matchTemplate(image, template, method)
         min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
         
         # For TM_CCOEFF_NORMED, we want max value
         if method in [cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED]:
-            if max_val < threshold:
-                return None
-            h, w = template.shape[:2]
-            match = (max_loc[0], max_loc[1], w, h)
-            self.template_found.emit(template_path, match)
-            return match
+            return max_val, max_loc
         # For TM_SQDIFF_NORMED, we want min value
         else:
-            if 1.0 - min_val < threshold:
-                return None
-            h, w = template.shape[:2]
-            match = (min_loc[0], min_loc[1], w, h)
-            self.template_found.emit(template_path, match)
-            return match
+            return 1.0 - min_val, min_loc
+    
+    def _match_location(self, image, template, threshold, method):
+        """Run template matching and return the best location, or None if below threshold"""
+        score, loc = self._match_score(image, template, method)
+        self.last_match_score = float(score)
+        return loc if score >= threshold else None
+    
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='find_all_templates')
+    def find_all_templates(self, template_path, threshold=0.8, max_matches=20, overlap=0.3,
+                           method=cv2.TM_CCOEFF_NORMED, frame=None, scale_tolerant=False):
+        """Find every occurrence of a template in the current frame.
+        
+        Returns a list of (x, y, w, h, score) matches sorted by descending score,
+        with overlapping matches removed by non-maximum suppression. With
+        scale_tolerant, the template is searched at the scale that last matched
+        on this device, and a miss runs a scale sweep as in find_template.
+        """
+        if frame is None:
+            frame = self.last_frame
+        if frame is None:
+            return []
+        
+        scale_key = (self._device_id(), template_path)
+        scale = self.scale_memory.get(scale_key, 1.0) if scale_tolerant else 1.0
+        matches = self._find_all_at_scale(template_path, frame, scale, threshold, max_matches, overlap, method)
+        
+        if not matches and scale_tolerant and self._sweep_due(scale_key):
+            scale = self._sweep_scale(template_path, frame, threshold, method)
+            if scale is not None:
+                matches = self._find_all_at_scale(template_path, frame, scale, threshold, max_matches,
+                                                  overlap, method)
+                if matches:
+                    self.scale_memory[scale_key] = scale
+                    self.sweep_backoff.pop(scale_key, None)
+        
+        for match in matches:
+            self.template_found.emit(template_path, match[:4])
+        return matches
+    
+    def _find_all_at_scale(self, template_path, frame, scale, threshold, max_matches, overlap, method):
+        template = self.load_template(template_path, scale)
+        if template is None:
+            return []
+        
+        frame, template = self._same_format(frame, template)
+        
+        if not self.prefilter.could_match(frame, template, template_path, frame_signature(frame)):
+            return []
+        
+        start = time.perf_counter()
+        result = cv2.matchTemplate(frame, template, method)
+        self.prefilter.record_match_time(time.perf_counter() - start)
+        if method not in [cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED]:
+            result = 1.0 - result
+        
+        h, w = template.shape[:2]
+        
+        above = result >= threshold
+        if not above.any():
+            return []
+        
+        # Keep only local peaks above the threshold so flat high-score areas
+        # do not flood the candidate list
+        kernel = np.ones((max(1, h // 2) | 1, max(1, w // 2) | 1), np.uint8)
+        peaks = above & (result == cv2.dilate(result, kernel))
+        ys, xs = np.nonzero(peaks)
+        if len(xs) == 0:
+            return []
+        
+        scores = result[ys, xs]
+        
+        # Bound the NMS work on pathological maps
+        max_candidates = max_matches * 50
+        if len(scores) > max_candidates:
+            top = np.argpartition(-scores, max_candidates)[:max_candidates]
+            xs, ys, scores = xs[top], ys[top], scores[top]
+        
+        keep = non_max_suppression(xs, ys, w, h, scores, overlap, max_matches)
+        
+        return [(int(xs[i]), int(ys[i]), w, h, float(scores[i])) for i in keep]
     
-    def wait_for_template(self, template_path, timeout=10, check_interval=0.5, threshold=0.8):
-        """Wait for a template to appear on screen"""
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='wait_for_template')
+    def wait_for_template(self, template_path, timeout=10, check_interval=0.5, threshold=0.8, stop_event=None,
+                          scale_tolerant=False, match_mode='template'):
+        """Wait for a template to appear on screen.
+        
+        Each new frame from the live stream is checked as soon as it arrives, and
+        frames whose content did not change are skipped. If no frame arrives
+        within check_interval (e.g. the capture thread is not running), a
+        screenshot is taken directly. Wait statistics are kept in last_wait_stats.
+        """
         start_time = time.time()
+        stats = {
+            'template_path': template_path,
+            'status': 'timeout',
+            'elapsed': 0.0,
+            'detection_latency': None,
+            'frames_checked': 0,
+            'frames_skipped': 0
+        }
         
-        while time.time() - start_time < timeout:
-            # Take a new screenshot
-            frame = self.adb_controller.take_screenshot()
+        last_signature = None
+        match = None
+        
+        for frame, arrival_time in self._frame_stream(start_time, timeout, check_interval, stop_event, stats):
+            signature = frame_signature(frame)
+            if signature == last_signature:
+                stats['frames_skipped'] += 1
+                continue
+            last_signature = signature
+            stats['frames_checked'] += 1
+            
+            match = self.submit('find_template', frame, template_path=template_path,
+                                threshold=threshold, scale_tolerant=scale_tolerant,
+                                match_mode=match_mode).result()
+            if match:
+                stats['status'] = 'found'
+                stats['detection_latency'] = time.time() - max(arrival_time, start_time)
+                break
+        
+        stats['elapsed'] = time.time() - start_time
+        self.last_wait_stats = stats
+        return match if stats['status'] == 'found' else None
+    
+    def _stability_sample(self, frame, region):
+        """Small grayscale thumbnail of a frame (or region) used to compare frames cheaply"""
+        if region:
+            x, y, w, h = region
+            frame = frame[max(0, y):y + h, max(0, x):x + w]
+            if frame.size == 0:
+                return None
+        
+        # Subsample first so the cost does not depend on the resolution
+        step = max(1, min(frame.shape[:2]) // 96)
+        sample = frame[::step, ::step]
+        if len(sample.shape) == 3:
+            sample = cv2.cvtColor(sample, cv2.COLOR_BGR2GRAY)
+        height, width = sample.shape
+        scale = 48.0 / max(1, min(height, width))
+        if scale < 1.0:
+            sample = cv2.resize(sample, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                interpolation=cv2.INTER_AREA)
+        return sample
+    
+    def _frame_stream(self, start_time, timeout, check_interval, stop_event, stats):
+        """Yield (frame, arrival_time) for the current frame and every new one until timeout.
+        
+        If no frame arrives within check_interval (e.g. the capture thread is not
+        running), a screenshot is taken directly. Sets stats['status'] to
+        'cancelled' when stop_event is set.
+        """
+        with self.frame_condition:
+            seen_seq = self.frame_seq
+            frame = self.last_frame
+            arrival_time = self.frame_time or start_time
+        last_arrival = time.time()
+        
+        while True:
             if frame is not None:
-                self.last_frame = frame
-                
-                # Try to find the template
-                match = self.find_template(template_path, threshold)
-                if match:
-                    return match
+                yield frame, arrival_time
             
-            # Wait before next check
-            time.sleep(check_interval)
+            if stop_event is not None and stop_event.is_set():
+                stats['status'] = 'cancelled'
+                return
+            
+            remaining = timeout - (time.time() - start_time)
+            if remaining <= 0:
+                return
+            
+            # Wait in short slices so that a stop request is noticed promptly
+            seen_seq, frame, arrival_time = self.wait_for_frame(seen_seq, min(remaining, 0.1))
+            if frame is not None:
+                last_arrival = time.time()
+            elif time.time() - last_arrival >= check_interval:
+                # No live stream is feeding us, so take a screenshot ourselves
+                last_arrival = time.time()
+                screenshot = self.adb_controller.take_screenshot()
+                if screenshot is not None:
+                    self.process_frame(screenshot)
+    
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='wait_for_stable')
+    def wait_for_stable(self, stable_frames=3, stable_ms=0, region=None, timeout=10, threshold=2.0,
+                        check_interval=0.5, stop_event=None):
+        """Wait until the screen (or a region of it) stops changing.
         
-        # Timeout reached
-        return None
+        Returns True once stable_frames consecutive frames showed no change, or
+        once nothing changed for stable_ms milliseconds (when stable_ms > 0).
+        Frames are compared on small grayscale thumbnails, and a change is a
+        mean absolute difference above threshold gray levels. Returns False on
+        timeout or when stop_event is set. Statistics are kept in last_stable_stats.
+        """
+        start_time = time.time()
+        stats = {'status': 'timeout', 'elapsed': 0.0, 'frames': 0, 'changes': 0}
+        previous = None
+        unchanged = 0
+        changed_at = start_time
+        
+        for frame, arrival_time in self._frame_stream(start_time, timeout, check_interval, stop_event, stats):
+            sample = self._stability_sample(frame, region)
+            if sample is None:
+                # Region outside the frame, watch the whole screen instead
+                sample = self._stability_sample(frame, None)
+            stats['frames'] += 1
+            
+            if previous is None or previous.shape != sample.shape or \
+                    cv2.absdiff(sample, previous).mean() > threshold:
+                if previous is not None:
+                    stats['changes'] += 1
+                unchanged = 0
+                changed_at = max(arrival_time, start_time)
+            else:
+                unchanged += 1
+            previous = sample
+            
+            if unchanged >= stable_frames or \
+                    (stable_ms > 0 and unchanged > 0 and (arrival_time - changed_at) * 1000 >= stable_ms):
+                stats['status'] = 'stable'
+                break
+        
+        stats['elapsed'] = time.time() - start_time
+        self.last_stable_stats = stats
+        return stats['status'] == 'stable'
+    
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='wait_for_condition')
+    def wait_for_condition(self, condition, timeout=10, check_interval=0.5, stop_event=None):
+        """Wait until a condition holds on the live frame stream.
+        
+        Unchanged frames are skipped. Returns False on timeout or when
+        stop_event is set. Statistics are kept in last_condition_stats.
+        """
+        start_time = time.time()
+        stats = {'status': 'timeout', 'elapsed': 0.0, 'frames': 0}
+        last_signature = None
+        
+        for frame, _ in self._frame_stream(start_time, timeout, check_interval, stop_event, stats):
+            signature = frame_signature(frame)
+            if signature == last_signature:
+                continue
+            last_signature = signature
+            stats['frames'] += 1
+            
+            if self.submit('check_condition', frame, condition=condition).result():
+                stats['status'] = 'met'
+                break
+        
+        stats['elapsed'] = time.time() - start_time
+        self.last_condition_stats = stats
+        return stats['status'] == 'met'
     
     def highlight_match(self, frame, match, color=(0, 255, 0), thickness=2):
-        """Draw a rectangle around a match"""
+        """Draw a rectangle around a match on a copy of the frame (frames are shared read-only)"""
         if frame is None or match is None:
             return frame
         
@@ -114,30 +661,65 @@ class OpenCVProcessor(QObject):
     
     def find_color(self, color_range, min_area=10):
         """Find regions of a specific color in the current frame"""
-        if self.last_frame is None:
+        regions = self.find_colors({'color': color_range}, min_area=min_area)
+        if not regions or not regions['color']:
             return None
         
-        # Convert to HSV color space
-        hsv = cv2.cvtColor(self.last_frame, cv2.COLOR_BGR2HSV)
+        # Return the largest region
+        return regions['color'][0][:4]
+    
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='find_colors')
+    def find_colors(self, color_ranges, min_area=10, downsample=1, frame=None):
+        """Find regions of several HSV color ranges in one pass over the frame.
         
-        # Create a mask for the color range
-        lower_bound = np.array(color_range[0])
-        upper_bound = np.array(color_range[1])
-        mask = cv2.inRange(hsv, lower_bound, upper_bound)
+        color_ranges maps a name to a [lower, upper] HSV range; a lower hue
+        above the upper hue wraps around (useful for reds). The frame is
+        converted to HSV once, optionally after shrinking it by downsample.
+        Returns a dict mapping each name to a list of (x, y, w, h, area)
+        regions in frame coordinates, largest first.
+        """
+        if frame is None:
+            frame = self.last_frame
+        if frame is None:
+            return None
         
-        # Find contours in the mask
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        downsample = max(1, int(downsample))
+        if downsample > 1:
+            small = cv2.resize(frame, (frame.shape[1] // downsample, frame.shape[0] // downsample),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            small = frame
         
-        # Filter contours by area
-        valid_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > min_area]
+        # Convert to HSV color space once for all ranges
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        scaled_min_area = min_area / (downsample * downsample)
         
-        if not valid_contours:
-            return None
+        results = {}
+        for name, (lower, upper) in color_ranges.items():
+            lower = np.array(lower, dtype=np.uint8)
+            upper = np.array(upper, dtype=np.uint8)
+            
+            if lower[0] > upper[0]:
+                # Hue range wraps around the end of the hue circle
+                mask = cv2.inRange(hsv, lower, np.array([179, upper[1], upper[2]], np.uint8))
+                mask |= cv2.inRange(hsv, np.array([0, lower[1], lower[2]], np.uint8), upper)
+            else:
+                mask = cv2.inRange(hsv, lower, upper)
+            
+            count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            
+            # Row 0 is the background component
+            stats = stats[1:count]
+            stats = stats[stats[:, cv2.CC_STAT_AREA] > scaled_min_area]
+            stats = stats[np.argsort(-stats[:, cv2.CC_STAT_AREA], kind='stable')]
+            
+            results[name] = [
+                (int(x) * downsample, int(y) * downsample, int(w) * downsample, int(h) * downsample,
+                 int(area) * downsample * downsample)
+                for x, y, w, h, area in stats
+            ]
         
-        # Return the largest contour
-        largest_contour = max(valid_contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(largest_contour)
-        return (x, y, w, h)
+        return results
     
     def detect_text_area(self, min_area=500):
         """Detect areas that may contain text"""
@@ -148,7 +730,7 @@ class OpenCVProcessor(QObject):
         gray = cv2.cvtColor(self.last_frame, cv2.COLOR_BGR2GRAY)
         
         # Apply thresholding
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        binary = binarize_text(gray)
         
         # Find contours
         contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -167,6 +749,61 @@ class OpenCVProcessor(QObject):
         
         return text_areas
     
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='classify_screen')
+    def classify_screen(self, max_distance=48, frame=None):
+        """Identify the current screen using the labeled screen index"""
+        if frame is None:
+            frame = self.last_frame
+        return self.screen_index.classify(frame, max_distance)
+    
+    def add_screen_label(self, label, frame=None):
+        """Add the current frame to the screen index under the given label"""
+        if frame is None:
+            frame = self.last_frame
+        if not self.screen_index.add(label, frame):
+            return False
+        return self.screen_index.save()
+    
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='sample_pixel_signature')
+    def sample_pixel_signature(self, region=None, count=16, tolerance=10, frame=None):
+        """Sample a grid of pixels from the current frame as signature points.
+        
+        Returns a list of [x, y, b, g, r, tolerance] points inside region
+        (x, y, w, h), or inside the whole frame when no region is given.
+        """
+        if frame is None:
+            frame = self.last_frame
+        return sample_signature_points(frame, region, count, tolerance)
+    
+    def _crop(self, region, frame=None):
+        if frame is None:
+            frame = self.last_frame
+        if frame is None or not region:
+            return None
+        
+        x, y, w, h = region
+        crop = frame[max(0, y):y + h, max(0, x):x + w]
+        return crop if crop.size else None
+    
+    @metrics.timer('vision_seconds', "Duration of vision operations", operation='read_text')
+    def read_text(self, region, frame=None):
+        """Read a short string (counter, timer, currency) from a region using the glyph atlas"""
+        crop = self._crop(region, frame)
+        if crop is None:
+            return None
+        return self.glyph_atlas.read(crop)
+    
+    def add_glyphs(self, region, text, frame=None):
+        """Teach the glyph atlas the characters shown in a region of the current frame"""
+        crop = self._crop(region, frame)
+        if crop is None:
+            return -1
+        
+        added = self.glyph_atlas.add_crop(crop, text)
+        if added > 0:
+            self.glyph_atlas.save()
+        return added
+    
     def create_template(self, region, filename):
         """Create a template from a region of the current frame"""
         if self.last_frame is None:
@@ -177,8 +814,9 @@ class OpenCVProcessor(QObject):
         
         try:
             cv2.imwrite(filename, template)
-            # Add to template cache
-            self.template_cache[filename] = template
+            self.invalidate_template(filename)
+            # Add to template cache, as a copy so it does not pin the frame buffer
+            self.template_cache[filename] = template.copy()
             return True
         except Exception as e:
             print(f"Error saving template: {e}")
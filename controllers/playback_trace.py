@@ -0,0 +1,117 @@
+import csv
+import json
+import os
+import threading
+import time
+import uuid
+
+
+# Columns of the CSV export, one row per played action
+TRACE_FIELDS = (
+    'run_id', 'index', 'type', 'scheduled', 'start', 'end', 'duration', 'drift',
+    'wait', 'adb_latency', 'adb_commands', 'frames', 'match_score', 'condition', 'success'
+)
+
+# Playbacks on several devices may finish together and share the CSV
+_csv_lock = threading.Lock()
+
+
+class PlaybackTrace:
+    """Timing of every action in one playback, kept in memory until written.
+
+    Times are seconds since the playback started. 'scheduled' is when the
+    recording says the action should start at the playback speed, so drift
+    (start - scheduled) shows how far playback has fallen behind or run ahead.
+    """
+
+    def __init__(self, speed_factor=1.0, info=None):
+        self.started_at = time.time()
+        # The random part keeps runs started at the same moment, e.g. on several devices, apart
+        self.run_id = time.strftime("%Y%m%d_%H%M%S", time.localtime(self.started_at)) + \
+            f"_{uuid.uuid4().hex[:8]}"
+        self.origin = time.perf_counter()
+        self.speed_factor = speed_factor
+        self.info = info or {}
+        self.records = []
+
+    def now(self):
+        """Seconds since the playback started"""
+        return time.perf_counter() - self.origin
+
+    def add(self, index, action_type, scheduled, wait_start, start, end, success, **details):
+        record = {
+            'run_id': self.run_id,
+            'index': index,
+            'type': action_type,
+            'scheduled': scheduled,
+            'start': start,
+            'end': end,
+            'duration': end - start,
+            'drift': start - scheduled if scheduled is not None else None,
+            'wait': start - wait_start,
+            'success': success
+        }
+        record.update(details)
+        self.records.append(record)
+        return record
+
+    def to_chrome_trace(self):
+        """Trace-event JSON for chrome://tracing or Perfetto; waits and actions are separate slices"""
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': f"Playback {self.run_id}"}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': "Actions"}}
+        ]
+        for record in self.records:
+            wait = record['wait']
+            if wait > 0:
+                events.append({
+                    'name': "wait", 'cat': "wait", 'ph': 'X', 'pid': 1, 'tid': 1,
+                    'ts': (record['start'] - wait) * 1e6, 'dur': wait * 1e6,
+                    'args': {'index': record['index'], 'frames': record.get('frames')}
+                })
+            events.append({
+                'name': record['type'], 'cat': "action", 'ph': 'X', 'pid': 1, 'tid': 1,
+                'ts': record['start'] * 1e6, 'dur': record['duration'] * 1e6,
+                'args': {key: value for key, value in record.items() if key not in ('run_id', 'type')}
+            })
+            if record.get('scheduled') is not None:
+                events.append({
+                    'name': "drift", 'ph': 'C', 'pid': 1, 'ts': record['start'] * 1e6,
+                    'args': {'drift_ms': record['drift'] * 1000}
+                })
+
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': dict(self.info, run_id=self.run_id, started_at=self.started_at,
+                              speed_factor=self.speed_factor)
+        }
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    def write_csv(self, path, append=False):
+        """Write one row per action; with append, rows from many runs collect in one file"""
+        write_header = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, 'a' if append else 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=TRACE_FIELDS, extrasaction='ignore')
+            if write_header:
+                writer.writeheader()
+            for record in self.records:
+                writer.writerow({key: _format(record.get(key)) for key in TRACE_FIELDS})
+
+    def save(self, trace_dir):
+        """Write this run's trace JSON and append its rows to the shared CSV; returns the JSON path"""
+        os.makedirs(trace_dir, exist_ok=True)
+        path = os.path.join(trace_dir, f"trace_{self.run_id}.json")
+        self.write_chrome_trace(path)
+        with _csv_lock:
+            self.write_csv(os.path.join(trace_dir, "playback_traces.csv"), append=True)
+        return path
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return "" if value is None else value
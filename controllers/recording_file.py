@@ -0,0 +1,250 @@
+import json
+import os
+import struct
+import time
+import zlib
+from array import array
+
+
+RECORDING_EXTENSION = ".aarec"
+RECORDING_MAGIC = b'AAREC001'
+RECORDING_VERSION = '1.1'
+
+# Every record is a (payload length, kind) header followed by the payload
+RECORD_HEADER = struct.Struct('<IB')
+RECORD_META = 1    # JSON object updating the recording's metadata
+RECORD_ACTION = 2  # One encoded action
+RECORD_INDEX = 3   # Metadata and action record offsets, written when the file is closed
+# Closed files end with the offset of their index record and the magic again
+TRAILER = struct.Struct('<Q8s')
+
+# Action payloads are compact JSON, optionally zlib compressed
+ENCODINGS = ('json', 'zjson')
+
+
+def is_recording_file(filename):
+    return filename.lower().endswith(RECORDING_EXTENSION)
+
+
+def _encode(action, encoding):
+    payload = json.dumps(action, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(payload) if encoding == 'zjson' else payload
+
+
+def _decode(payload, encoding):
+    if encoding == 'zjson':
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+class RecordingReader:
+    """Reads a recording file with random access to its actions.
+
+    A closed file is opened by reading its trailer and offset index only. A
+    file that was not closed, e.g. after a crash while recording, is scanned
+    once to rebuild the index; a torn last record is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.meta = {}
+        self.offsets = array('Q')
+        self.end = 0  # where the next record would go
+        self.closed_cleanly = False
+        try:
+            if self.file.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+                raise ValueError(f"Not a recording file: {path}")
+            if not self._read_index():
+                self._scan()
+        except Exception:
+            self.file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def encoding(self):
+        return self.meta.get('encoding', 'json')
+
+    def _read_record(self, offset):
+        """Return (kind, payload, next offset), or None at a missing or torn record"""
+        self.file.seek(offset)
+        header = self.file.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return None
+        length, kind = RECORD_HEADER.unpack(header)
+        payload = self.file.read(length)
+        if len(payload) < length:
+            return None
+        return kind, payload, offset + RECORD_HEADER.size + length
+
+    def _read_index(self):
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(RECORDING_MAGIC) + TRAILER.size:
+            return False
+
+        self.file.seek(size - TRAILER.size)
+        index_offset, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+        if magic != RECORDING_MAGIC:
+            return False
+
+        record = self._read_record(index_offset)
+        if record is None or record[0] != RECORD_INDEX:
+            return False
+
+        payload = record[1]
+        (info_length,) = struct.unpack_from('<I', payload)
+        info = json.loads(payload[4:4 + info_length])
+        self.meta = info['meta']
+        self.offsets = array('Q')
+        self.offsets.frombytes(payload[4 + info_length:4 + info_length + 8 * info['count']])
+        self.end = index_offset
+        self.closed_cleanly = True
+        return True
+
+    def _scan(self):
+        offset = len(RECORDING_MAGIC)
+        while True:
+            record = self._read_record(offset)
+            if record is None:
+                break
+            kind, payload, next_offset = record
+            if kind == RECORD_META:
+                self.meta.update(json.loads(payload))
+            elif kind == RECORD_ACTION:
+                self.offsets.append(offset)
+            elif kind == RECORD_INDEX:
+                break
+            offset = next_offset
+        self.end = offset
+
+    def get_action(self, index):
+        """Read action number index"""
+        record = self._read_record(self.offsets[index])
+        if record is None or record[0] != RECORD_ACTION:
+            raise ValueError(f"Corrupt action record {index} in {self.path}")
+        return _decode(record[1], self.encoding)
+
+    def iter_actions(self, start=0, batch_size=512):
+        """Yield the actions in order, reading the file sequentially.
+
+        Action payloads are decoded a batch at a time, which is much cheaper
+        than one json.loads per action.
+        """
+        if start >= len(self.offsets):
+            return
+        self.file.seek(self.offsets[start])
+        remaining = len(self.offsets) - start
+        batch = []
+
+        while remaining > 0:
+            header = self.file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                raise ValueError(f"Truncated recording file: {self.path}")
+            length, kind = RECORD_HEADER.unpack(header)
+            payload = self.file.read(length)
+            if kind != RECORD_ACTION:
+                continue
+
+            batch.append(zlib.decompress(payload) if self.encoding == 'zjson' else payload)
+            remaining -= 1
+            if len(batch) >= batch_size or remaining == 0:
+                yield from json.loads(b'[' + b','.join(batch) + b']')
+                batch = []
+
+    def close(self):
+        self.file.close()
+
+
+class RecordingWriter:
+    """Append-only writer for recording files.
+
+    Actions are written one record at a time as they are added, so saving
+    costs the same per action however long the recording is. close() appends
+    the offset index; reopening a file with append=True continues it from
+    where its actions end.
+    """
+
+    def __init__(self, path, resolution=None, encoding='json', append=False):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown recording encoding: {encoding}")
+        self.path = path
+        self.offsets = array('Q')
+        self.meta = {}
+
+        if append and os.path.exists(path):
+            with RecordingReader(path) as reader:
+                self.offsets = reader.offsets
+                self.meta = reader.meta
+                end = reader.end
+            self.file = open(path, 'r+b')
+            self.file.seek(end)
+            self.file.truncate()
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(RECORDING_MAGIC)
+            self.set_meta(version=RECORDING_VERSION, timestamp=time.time(),
+                          encoding=encoding, resolution=resolution)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _write_record(self, kind, payload):
+        offset = self.file.tell()
+        self.file.write(RECORD_HEADER.pack(len(payload), kind))
+        self.file.write(payload)
+        return offset
+
+    def set_meta(self, **fields):
+        """Record metadata such as the resolution; later values replace earlier ones"""
+        self.meta.update(fields)
+        self._write_record(RECORD_META, json.dumps(fields).encode('utf-8'))
+
+    def append_action(self, action):
+        self.offsets.append(self._write_record(RECORD_ACTION, _encode(action, self.meta.get('encoding', 'json'))))
+
+    def append_actions(self, actions):
+        for action in actions:
+            self.append_action(action)
+
+    def flush(self, sync=False):
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file.closed:
+            return
+        info = json.dumps({'count': len(self.offsets), 'meta': self.meta}).encode('utf-8')
+        index = struct.pack('<I', len(info)) + info + self.offsets.tobytes()
+        index_offset = self._write_record(RECORD_INDEX, index)
+        self.file.write(TRAILER.pack(index_offset, RECORDING_MAGIC))
+        self.file.close()
+
+
+def save_recording(path, actions, resolution=None, encoding='json'):
+    """Write a complete recording file"""
+    temp_path = path + ".tmp"
+    with RecordingWriter(temp_path, resolution, encoding) as writer:
+        writer.append_actions(actions)
+    os.replace(temp_path, path)
+
+
+def load_recording(path):
+    """Return (actions, meta) of a recording file"""
+    with RecordingReader(path) as reader:
+        return list(reader.iter_actions()), reader.meta
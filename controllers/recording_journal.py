@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+import time
+from controllers.recording_file import RecordingReader, RecordingWriter
+
+
+def replay_operations(operations):
+    """Rebuild an action list from journaled operations"""
+    actions = []
+    for operation in operations:
+        op = operation.get('op')
+        if op == 'append':
+            actions.append(operation['action'])
+        elif op == 'replace' and 0 <= operation['index'] < len(actions):
+            actions[operation['index']] = operation['action']
+        elif op == 'remove' and 0 <= operation['index'] < len(actions):
+            actions.pop(operation['index'])
+        elif op == 'move' and 0 <= operation['from'] < len(actions) and 0 <= operation['to'] < len(actions):
+            actions.insert(operation['to'], actions.pop(operation['from']))
+        elif op == 'reset':
+            actions = list(operation['actions'])
+    return actions
+
+
+class RecordingJournal:
+    """Append-only journal of the unsaved recording, for recovery after a crash.
+
+    Every change to the action list is queued as a small operation record and
+    written by a background thread into a recording file that is never
+    closed while in use, so a torn last record after a crash is simply
+    dropped on replay. fsync is batched to at most once per sync_interval.
+    The journal is discarded once the recording is saved.
+    """
+
+    def __init__(self, journal_file=None, sync_interval=0.5):
+        self.journal_file = journal_file or os.path.abspath(os.path.join(
+                os.path.dirname(os.path.dirname(__file__)),
+                "config",
+                "recording_journal.aarec"
+        ))
+        self.sync_interval = sync_interval
+        self.active = False
+        self.operations = 0
+        self.syncs = 0
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def begin(self, actions=None, resolution=None):
+        """Start journaling a new recording, replacing any previous journal"""
+        self.active = True
+        self.queue.put(('begin', resolution))
+        if actions:
+            self.record('reset', actions=list(actions))
+
+    def record(self, op, **fields):
+        """Queue an operation on the action list"""
+        if self.active:
+            fields['op'] = op
+            self.queue.put(('write', fields))
+
+    def set_resolution(self, resolution):
+        if self.active:
+            self.queue.put(('meta', resolution))
+
+    def sync(self, timeout=5):
+        """Wait until everything queued so far is on disk"""
+        done = threading.Event()
+        self.queue.put(('sync', done))
+        return done.wait(timeout)
+
+    def discard(self):
+        """Drop the journal, e.g. once its recording has been saved"""
+        self.active = False
+        self.queue.put(('discard', None))
+
+    def close(self):
+        """Flush and stop the writer thread, keeping the journal for recovery"""
+        self.queue.put(('stop', None))
+        self.thread.join(timeout=5)
+
+    def recover(self):
+        """Return (actions, resolution) of a journal left by a previous session, or None"""
+        if not os.path.exists(self.journal_file):
+            return None
+        try:
+            with RecordingReader(self.journal_file) as reader:
+                actions = replay_operations(reader.iter_actions())
+                return actions, reader.meta.get('resolution')
+        except Exception as e:
+            print(f"Error reading recording journal: {e}")
+            return None
+
+    def _run(self):
+        writer = None
+        last_sync = time.time()
+        dirty = False
+
+        while True:
+            try:
+                # Wake up in time to sync writes that have been waiting
+                command, value = self.queue.get(timeout=self.sync_interval if dirty else None)
+            except queue.Empty:
+                command, value = 'sync', None
+
+            try:
+                if command == 'begin':
+                    if writer is not None:
+                        writer.file.close()
+                    os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+                    writer = RecordingWriter(self.journal_file, value)
+                    dirty = True
+
+                elif command == 'write' and writer is not None:
+                    writer.append_action(value)
+                    self.operations += 1
+                    dirty = True
+
+                elif command == 'meta' and writer is not None:
+                    writer.set_meta(resolution=value)
+                    dirty = True
+
+                elif command == 'discard':
+                    if writer is not None:
+                        writer.file.close()
+                        writer = None
+                    if os.path.exists(self.journal_file):
+                        os.remove(self.journal_file)
+                    dirty = False
+
+                if dirty and writer is not None and \
+                        (command in ('sync', 'stop') or time.time() - last_sync >= self.sync_interval):
+                    writer.flush(sync=True)
+                    self.syncs += 1
+                    last_sync = time.time()
+                    dirty = False
+            except Exception as e:
+                print(f"Error writing recording journal: {e}")
+
+            if command == 'sync' and value is not None:
+                value.set()
+            elif command == 'stop':
+                if writer is not None:
+                    writer.close()
+                return
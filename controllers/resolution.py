@@ -0,0 +1,153 @@
+import copy
+import hashlib
+import os
+import threading
+import cv2
+from controllers.action_recorder import ActionType
+from controllers.condition_checker import ConditionType
+
+
+def get_scale_factors(source, target):
+    """Return (scale_x, scale_y, template_scale) to map a recording from the
+    source resolution onto the target resolution.
+
+    Coordinates follow the screen size, while on-screen elements (and thus
+    templates) follow the display density when both densities are known.
+    """
+    scale_x = target['width'] / source['width']
+    scale_y = target['height'] / source['height']
+
+    if source.get('density') and target.get('density'):
+        template_scale = target['density'] / source['density']
+    else:
+        template_scale = min(scale_x, scale_y)
+
+    return scale_x, scale_y, round(template_scale, 3)
+
+
+def same_resolution(source, target):
+    return (source.get('width') == target.get('width') and
+            source.get('height') == target.get('height') and
+            source.get('density') == target.get('density'))
+
+
+def scale_actions(actions, source, target):
+    """Return a copy of actions with coordinates mapped onto the target resolution,
+    together with the scale factor to apply to templates"""
+    scale_x, scale_y, template_scale = get_scale_factors(source, target)
+    scaled = copy.deepcopy(actions)
+    for action in scaled:
+        _scale_action(action, scale_x, scale_y)
+    return scaled, template_scale
+
+
+def _scale_action(action, scale_x, scale_y):
+    action_type = action.get('type', '')
+    data = action.get('data', {})
+
+    wait_until = action.get('wait_until')
+    if wait_until:
+        _scale_condition(wait_until.get('condition', {}), scale_x, scale_y)
+
+    if action_type in (ActionType.TAP.value, ActionType.LONG_PRESS.value):
+        _scale_point(data, 'x', 'y', scale_x, scale_y)
+
+    elif action_type == ActionType.SWIPE.value:
+        _scale_point(data, 'x1', 'y1', scale_x, scale_y)
+        _scale_point(data, 'x2', 'y2', scale_x, scale_y)
+
+    elif action_type == ActionType.WAIT_STABLE.value:
+        _scale_region(data, scale_x, scale_y)
+
+    elif action_type == ActionType.CONDITIONAL.value:
+        _scale_condition(data.get('condition', {}), scale_x, scale_y)
+        for sub_action in data.get('actions', []) + data.get('else_actions', []):
+            _scale_action(sub_action, scale_x, scale_y)
+
+
+def _scale_condition(condition, scale_x, scale_y):
+    condition_type = condition.get('type', '')
+    data = condition.get('data', {})
+
+    if condition_type == ConditionType.PIXEL_COLOR.value:
+        _scale_point(data, 'x', 'y', scale_x, scale_y)
+
+    elif condition_type in (ConditionType.TEXT_EQUALS.value, ConditionType.NUMBER_COMPARE.value):
+        _scale_region(data, scale_x, scale_y)
+
+    elif condition_type == ConditionType.PIXEL_SIGNATURE.value:
+        for point in data.get('points', []):
+            point[0] = int(round(point[0] * scale_x))
+            point[1] = int(round(point[1] * scale_y))
+
+
+def _scale_region(data, scale_x, scale_y):
+    region = data.get('region')
+    if region:
+        data['region'] = [int(round(region[0] * scale_x)), int(round(region[1] * scale_y)),
+                          int(round(region[2] * scale_x)), int(round(region[3] * scale_y))]
+
+
+def _scale_point(data, x_key, y_key, scale_x, scale_y):
+    if x_key in data:
+        data[x_key] = int(round(data[x_key] * scale_x))
+    if y_key in data:
+        data[y_key] = int(round(data[y_key] * scale_y))
+
+
+class TemplateScaler:
+    """Rescales templates for a target resolution, caching the results in
+    memory and on disk keyed by (template content hash, scale)"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.path.abspath(os.path.join(
+                os.path.dirname(os.path.dirname(__file__)),
+                "cache",
+                "scaled_templates"
+        ))
+        self.memory_cache = {}  # (template hash, scale) -> image
+        self.hash_cache = {}  # template_path -> (mtime, hash)
+        self.lock = threading.Lock()
+
+    def template_hash(self, template_path):
+        mtime = os.path.getmtime(template_path)
+        cached = self.hash_cache.get(template_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(template_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.hash_cache[template_path] = (mtime, digest)
+        return digest
+
+    def invalidate(self, template_path):
+        """Hash a template again on next use, so a replaced file does not reuse old scaled copies"""
+        self.hash_cache.pop(template_path, None)
+
+    def get_scaled(self, template_path, template, scale):
+        """Return template rescaled by scale, computing it at most once per (template, scale)"""
+        if scale == 1.0:
+            return template
+
+        key = (self.template_hash(template_path), round(scale, 3))
+        with self.lock:
+            if key in self.memory_cache:
+                return self.memory_cache[key]
+
+        cache_file = os.path.join(self.cache_dir, f"{key[0]}_{key[1]:.3f}.png")
+        scaled = cv2.imread(cache_file) if os.path.exists(cache_file) else None
+
+        if scaled is None:
+            h, w = template.shape[:2]
+            size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+            scaled = cv2.resize(template, size, interpolation=interpolation)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                cv2.imwrite(cache_file, scaled)
+            except Exception as e:
+                print(f"Error caching scaled template: {e}")
+
+        with self.lock:
+            self.memory_cache[key] = scaled
+        return scaled
@@ -4,6 +4,7 @@ import datetime
 import json
 import os
 from enum import Enum
+from utils.metrics import registry as metrics
 
 
 class ScheduleType(Enum):
@@ -56,10 +57,14 @@ class TaskScheduler:
     def _scheduler_loop(self):
         while not self.stop_event.is_set():
             now = datetime.datetime.now()
+            metrics.gauge('scheduled_tasks_enabled', "Enabled scheduled tasks").set(
+                sum(1 for task in self.tasks if task.get('enabled', False)))
 
             for task in self.tasks:
                 if self._should_run_task(task, now):
-                    self._run_task(task)
+                    with metrics.timer('scheduled_run_seconds', "Time to start scheduled tasks",
+                                       schedule=task.get('schedule_type', '')):
+                        self._run_task(task)
 
                     task['last_run'] = now.isoformat()
 
@@ -68,7 +73,7 @@ class TaskScheduler:
 
             self.save_tasks()
 
-            time.sleep(30)
+            self.stop_event.wait(30)
 
     def _should_run_task(self, task, now):
         if not task.get('enabled', False):
@@ -151,6 +156,7 @@ class TaskScheduler:
             actions = task.get('actions', [])
 
             if not actions:
+                metrics.counter('scheduled_runs_total', "Scheduled task runs", result='empty').inc()
                 self.logger.log(f"Task '{task.get('name', 'Unnamed')}' has no actions to run")
                 return
 
@@ -158,19 +164,22 @@ class TaskScheduler:
             self.logger.log(f"Running scheduled task: {task.get('name', 'Unnamed')}")
 
             # Load the actions into the action player
-            self.action_player.load_actions(actions)
+            self.action_player.load_actions(actions, task.get('resolution'))
 
             # Run the actions
             speed_factor = task.get('speed_factor', 1.0)
-            self.action_player.play(speed_factor)
+            started = self.action_player.play(speed_factor)
+            metrics.counter('scheduled_runs_total', result='started' if started else 'failed').inc()
 
         except Exception as e:
+            metrics.counter('scheduled_runs_total', result='error').inc()
             self.logger.log(f"Error running scheduled task: {str(e)}")
 
-    def add_task(self, name, actions, schedule_type, schedule_data, enabled=True, speed_factor=1.0):
+    def add_task(self, name, actions, schedule_type, schedule_data, enabled=True, speed_factor=1.0, resolution=None):
         task = {
                 'name':          name,
                 'actions':       actions,
+                'resolution':    resolution,
                 'schedule_type': schedule_type.value if isinstance(schedule_type, ScheduleType) else schedule_type,
                 'schedule_data': schedule_data,
                 'enabled':       enabled,
@@ -0,0 +1,146 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+
+def _pack_bits(bits):
+    """Pack a flat boolean array into uint64 words"""
+    packed = np.packbits(bits.astype(np.uint8))
+    padding = (-len(packed)) % 8
+    if padding:
+        packed = np.concatenate([packed, np.zeros(padding, np.uint8)])
+    return packed.view(np.uint64)
+
+
+def screen_signature(frame):
+    """Compute a compact perceptual signature of a screen.
+
+    The signature is a 16x16 regional difference hash (256 bits) followed by
+    a 64 bit DCT perceptual hash of the whole screen, packed into 5 uint64 words.
+    """
+    # Subsample and shrink before converting so the cost does not depend on
+    # the device resolution
+    step = max(1, min(frame.shape[:2]) // 128)
+    small = cv2.resize(frame[::step, ::step], (64, 64), interpolation=cv2.INTER_AREA)
+    if len(small.shape) == 3:
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = small
+
+    # dHash: compare horizontally adjacent cells of a 17x16 thumbnail
+    cells = cv2.resize(gray, (17, 16), interpolation=cv2.INTER_AREA)
+    dhash = cells[:, 1:] > cells[:, :-1]
+
+    # pHash: low frequency DCT coefficients compared against their median
+    thumb = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    dct = cv2.dct(thumb)[:8, :8]
+    phash = dct > np.median(dct)
+
+    return _pack_bits(np.concatenate([dhash.ravel(), phash.ravel()]))
+
+
+SIGNATURE_WORDS = 5
+SIGNATURE_BITS = SIGNATURE_WORDS * 64
+
+
+class ScreenIndex:
+    """Labeled index of screen signatures, classified by nearest Hamming distance"""
+
+    def __init__(self, index_file=None):
+        self.index_file = index_file or os.path.abspath(os.path.join(
+                os.path.dirname(os.path.dirname(__file__)),
+                "config",
+                "screen_index.npz"
+        ))
+        self.labels = np.zeros(0, dtype=object)
+        self.signatures = np.zeros((0, SIGNATURE_WORDS), np.uint64)
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def load(self):
+        self.loaded = True
+        if not os.path.exists(self.index_file):
+            return True
+
+        try:
+            with np.load(self.index_file, allow_pickle=False) as data:
+                signatures = data['signatures'].astype(np.uint64)
+                labels = data['labels'].astype(str).astype(object)
+            with self.lock:
+                self.signatures = signatures.reshape(-1, SIGNATURE_WORDS)
+                self.labels = labels
+            return True
+        except Exception as e:
+            print(f"Error loading screen index: {e}")
+            return False
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            with self.lock:
+                labels = self.labels.astype(str)
+                signatures = self.signatures
+            with open(self.index_file, 'wb') as f:
+                np.savez_compressed(f, labels=labels, signatures=signatures)
+            return True
+        except Exception as e:
+            print(f"Error saving screen index: {e}")
+            return False
+
+    def add(self, label, frame):
+        """Add a labeled reference screen to the index"""
+        if frame is None or not label:
+            return False
+
+        self._ensure_loaded()
+        signature = screen_signature(frame)
+        with self.lock:
+            self.signatures = np.vstack([self.signatures, signature[np.newaxis, :]])
+            self.labels = np.append(self.labels, label).astype(object)
+        return True
+
+    def remove_label(self, label):
+        """Remove every reference screen with the given label"""
+        self._ensure_loaded()
+        with self.lock:
+            keep = self.labels != label
+            removed = int(len(keep) - keep.sum())
+            self.signatures = self.signatures[keep]
+            self.labels = self.labels[keep]
+        return removed
+
+    def get_labels(self):
+        self._ensure_loaded()
+        with self.lock:
+            return sorted(set(self.labels.tolist()))
+
+    def classify(self, frame, max_distance=48):
+        """Return (label, distance) of the nearest reference screen.
+
+        label is None when the index is empty or the nearest screen is further
+        than max_distance bits away.
+        """
+        if frame is None:
+            return None, None
+
+        self._ensure_loaded()
+        signature = screen_signature(frame)
+        with self.lock:
+            signatures = self.signatures
+            labels = self.labels
+
+        if len(labels) == 0:
+            return None, None
+
+        distances = np.bitwise_count(signatures ^ signature).sum(axis=1, dtype=np.int32)
+        nearest = int(np.argmin(distances))
+        distance = int(distances[nearest])
+
+        if max_distance is not None and distance > max_distance:
+            return None, distance
+        return labels[nearest], distance
@@ -0,0 +1,209 @@
+import hashlib
+import mmap
+import os
+import struct
+import cv2
+import numpy as np
+
+
+ARCHIVE_MAGIC = b'AASNAP01'
+# Footer: index offset, entry count, magic
+FOOTER = struct.Struct('<QI8s')
+# Index entries are sorted by key so a lookup is a binary search over the mapped index
+INDEX_DTYPE = np.dtype([('key', 'S20'), ('offset', '<u8'), ('length', '<u4')])
+
+
+def archive_path(recording_path):
+    """Return the snapshot archive stored next to a recording file"""
+    return os.path.splitext(recording_path)[0] + ".snapshots"
+
+
+class SnapshotArchive:
+    """Read-only view of a snapshot archive file.
+
+    The file holds encoded images back to back, followed by a sorted index of
+    (content hash, offset, length) entries and a fixed size footer. The file is
+    memory mapped, so opening it reads only the footer and an image is decoded
+    when it is asked for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"Empty snapshot archive: {path}")
+
+        if len(self.map) < len(ARCHIVE_MAGIC) + FOOTER.size or self.map[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+            self.close()
+            raise ValueError(f"Not a snapshot archive: {path}")
+
+        index_offset, count, magic = FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)
+        if magic != ARCHIVE_MAGIC:
+            self.close()
+            raise ValueError(f"Truncated snapshot archive: {path}")
+        self.index = np.frombuffer(self.map, dtype=INDEX_DTYPE, count=count, offset=index_offset)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, snapshot_id):
+        return self._find(snapshot_id) is not None
+
+    def _find(self, snapshot_id):
+        key = bytes.fromhex(snapshot_id)
+        position = np.searchsorted(self.index['key'], key)
+        if position < len(self.index) and self.index['key'][position] == key:
+            return self.index[position]
+        return None
+
+    def get_blob(self, snapshot_id):
+        """Return the encoded image bytes, or None if the archive does not hold it"""
+        entry = self._find(snapshot_id)
+        if entry is None:
+            return None
+        offset, length = int(entry['offset']), int(entry['length'])
+        return self.map[offset:offset + length]
+
+    def keys(self):
+        return [key.hex() for key in self.index['key']]
+
+    def close(self):
+        self.index = None
+        if getattr(self, 'map', None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    @staticmethod
+    def write(path, blobs):
+        """Write {snapshot id: encoded bytes} to a new archive at path"""
+        entries = sorted((bytes.fromhex(snapshot_id), blob) for snapshot_id, blob in blobs.items())
+        index = np.zeros(len(entries), dtype=INDEX_DTYPE)
+
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(ARCHIVE_MAGIC)
+            for i, (key, blob) in enumerate(entries):
+                index[i] = (key, f.tell(), len(blob))
+                f.write(blob)
+            index_offset = f.tell()
+            f.write(index.tobytes())
+            f.write(FOOTER.pack(index_offset, len(entries), ARCHIVE_MAGIC))
+        os.replace(temp_path, path)
+
+
+class SnapshotStore:
+    """Screen snapshots taken while recording, deduplicated by content hash.
+
+    Actions with a touch point get a full resolution crop around it, other
+    actions a downscaled copy of the whole frame. New snapshots are kept
+    encoded in memory until the recording is saved; snapshots of a loaded
+    recording stay in its archive and are only read when requested.
+    """
+
+    def __init__(self, crop_radius=160, frame_scale=0.5, quality=80, encoding='.jpg'):
+        self.crop_radius = crop_radius
+        self.frame_scale = frame_scale
+        self.quality = quality
+        self.encoding = encoding
+        self.pending = {}  # snapshot id -> encoded bytes not yet in an archive
+        self.archive = None
+        self.added = 0
+        self.deduplicated = 0
+
+    def add(self, frame, target=None):
+        """Store a snapshot of frame and return its reference for the action, or None"""
+        if frame is None:
+            return None
+
+        frame_h, frame_w = frame.shape[:2]
+        if target is not None:
+            r = self.crop_radius
+            x1, y1 = max(0, int(target[0]) - r), max(0, int(target[1]) - r)
+            x2, y2 = min(frame_w, int(target[0]) + r), min(frame_h, int(target[1]) + r)
+            if x2 <= x1 or y2 <= y1:
+                return None
+            image = np.ascontiguousarray(frame[y1:y2, x1:x2])
+            region, scale = [x1, y1, x2 - x1, y2 - y1], 1.0
+        else:
+            size = (max(1, int(frame_w * self.frame_scale)), max(1, int(frame_h * self.frame_scale)))
+            image = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            region, scale = [0, 0, frame_w, frame_h], self.frame_scale
+
+        digest = hashlib.sha1(str(image.shape).encode())
+        digest.update(image.data)
+        snapshot_id = digest.hexdigest()
+
+        self.added += 1
+        if snapshot_id in self.pending or (self.archive is not None and snapshot_id in self.archive):
+            self.deduplicated += 1
+        else:
+            params = [cv2.IMWRITE_WEBP_QUALITY if self.encoding == '.webp' else cv2.IMWRITE_JPEG_QUALITY,
+                      self.quality]
+            ok, encoded = cv2.imencode(self.encoding, image, params)
+            if not ok:
+                return None
+            self.pending[snapshot_id] = encoded.tobytes()
+
+        return {'id': snapshot_id, 'region': region, 'scale': scale}
+
+    def get_image(self, snapshot):
+        """Decode the image of a snapshot reference (or id), or return None"""
+        if not snapshot:
+            return None
+        snapshot_id = snapshot['id'] if isinstance(snapshot, dict) else snapshot
+
+        blob = self.pending.get(snapshot_id)
+        if blob is None and self.archive is not None:
+            blob = self.archive.get_blob(snapshot_id)
+        if blob is None:
+            return None
+        return cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR)
+
+    def open(self, path):
+        """Use the archive at path for lookups, dropping unsaved snapshots"""
+        self.clear()
+        if os.path.exists(path):
+            try:
+                self.archive = SnapshotArchive(path)
+            except Exception as e:
+                print(f"Error opening snapshot archive: {e}")
+
+    def save(self, path, snapshot_ids):
+        """Write the snapshots in snapshot_ids to an archive at path"""
+        blobs = {}
+        for snapshot_id in snapshot_ids:
+            blob = self.pending.get(snapshot_id)
+            if blob is None and self.archive is not None:
+                blob = self.archive.get_blob(snapshot_id)
+            if blob is not None:
+                blobs[snapshot_id] = bytes(blob)
+
+        if not blobs:
+            return False
+
+        # The old archive may be the file being replaced, so it is closed first
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        SnapshotArchive.write(path, blobs)
+        self.open(path)
+        return True
+
+    def clear(self):
+        self.pending = {}
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def get_stats(self):
+        return {
+            'added': self.added,
+            'deduplicated': self.deduplicated,
+            'pending': len(self.pending),
+            'pending_bytes': sum(len(blob) for blob in self.pending.values()),
+            'archived': len(self.archive) if self.archive is not None else 0
+        }
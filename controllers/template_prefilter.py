@@ -0,0 +1,188 @@
+import threading
+import time
+import numpy as np
+
+
+# Colors are compared by hue, which dimming or a translucent overlay over the
+# screen (I' = a * I + b) leaves unchanged, just as TM_CCOEFF_NORMED ignores it
+HUE_BINS = 12
+# Gray pixels have no reliable hue and are left out (the extra bin is dropped)
+COLOR_BINS = HUE_BINS + 1
+# Only clearly colored template pixels are counted, while frame pixels count
+# down to a low chroma, so a template dimmed to 1/6 still finds its colors
+TEMPLATE_MIN_CHROMA = 48
+FRAME_MIN_CHROMA = 8
+
+
+def hue_bins(image, step, min_chroma):
+    """Hue bin of each pixel of a subsampled BGR image, and the nearest other bin.
+
+    Pixels below min_chroma get the dropped bin HUE_BINS. Returns None for
+    grayscale images.
+    """
+    sample = image[::step, ::step]
+    if sample.ndim == 2:
+        return None
+    b, g, r = (sample[:, :, i].astype(np.float32) for i in range(3))
+    high = np.maximum(np.maximum(b, g), r)
+    chroma = high - np.minimum(np.minimum(b, g), r)
+    safe = np.maximum(chroma, 1)
+    hue = np.where(high == r, ((g - b) / safe) % 6,
+                   np.where(high == g, (b - r) / safe + 2, (r - g) / safe + 4))
+    position = hue * (HUE_BINS / 6.0)
+    bins = position.astype(np.int32) % HUE_BINS
+    neighbours = np.where(position - np.floor(position) >= 0.5, bins + 1, bins - 1) % HUE_BINS
+    gray = chroma < min_chroma
+    bins[gray] = HUE_BINS
+    neighbours[gray] = HUE_BINS
+    return bins, neighbours
+
+
+class TemplatePrefilter:
+    """Cheap rejection of templates that cannot be on screen.
+
+    The frame is split into small tiles and an integral histogram of hues is
+    built over them once per frame. A template spanning k tiles must lie
+    inside some window of k + 1 tiles, so if no such window holds enough
+    pixels of each of the template's hues, the expensive correlation can be
+    skipped. Frame pixels also count towards the neighbouring hue bin, so
+    rounding near a bin edge cannot cause a reject, and templates with too
+    few colored pixels to judge are never rejected.
+    """
+
+    def __init__(self, tile_size=32, step=4, min_coverage=0.5, min_colored=16):
+        self.tile_size = tile_size  # in frame pixels, a multiple of step
+        self.step = step
+        self.min_coverage = min_coverage
+        self.min_colored = min_colored  # sampled template pixels with a hue needed to judge
+        self.frame_key = None
+        self.integral = None
+        self.template_hists = {}  # template key -> histogram
+        self.checks = 0
+        self.rejects = 0
+        self.filter_time = 0.0
+        self.match_time = 0.0
+        self.matches_timed = 0
+        self.lock = threading.Lock()
+
+    def _frame_integral(self, frame, frame_key):
+        """Integral color histogram over the tile grid, computed once per frame"""
+        if frame_key is not None and frame_key == self.frame_key:
+            return self.integral
+
+        bins, neighbours = hue_bins(frame, self.step, FRAME_MIN_CHROMA)
+        cells = self.tile_size // self.step
+        rows, cols = bins.shape
+        tiles_y, tiles_x = -(-rows // cells), -(-cols // cells)
+
+        tile_index = ((np.arange(rows) // cells)[:, np.newaxis] * tiles_x +
+                      (np.arange(cols) // cells)[np.newaxis, :])
+        size = tiles_x * tiles_y * COLOR_BINS
+        tile_hists = (
+            np.bincount((tile_index * COLOR_BINS + bins).ravel(), minlength=size) +
+            np.bincount((tile_index * COLOR_BINS + neighbours).ravel(), minlength=size)
+        ).reshape(tiles_y, tiles_x, COLOR_BINS)[:, :, :HUE_BINS]
+
+        integral = np.zeros((tiles_y + 1, tiles_x + 1, HUE_BINS), np.int32)
+        integral[1:, 1:] = tile_hists.cumsum(axis=0).cumsum(axis=1)
+
+        self.frame_key = frame_key
+        self.integral = integral
+        return integral
+
+    def _template_hist(self, template, key):
+        hist = self.template_hists.get(key)
+        if hist is None:
+            bins, _ = hue_bins(template, self.step, TEMPLATE_MIN_CHROMA)
+            hist = np.bincount(bins.ravel(), minlength=COLOR_BINS)[:HUE_BINS]
+            self.template_hists[key] = hist
+        return hist
+
+    def invalidate(self, template_key):
+        """Forget the histograms of a template, e.g. after its image was replaced"""
+        with self.lock:
+            for key in [key for key in self.template_hists if key[0] == template_key]:
+                del self.template_hists[key]
+
+    def could_match(self, frame, template, template_key, frame_key=None):
+        """Return False only when the template cannot be present in the frame"""
+        start = time.perf_counter()
+        if frame.ndim == 2 or template.ndim == 2:
+            return True
+
+        with self.lock:
+            self.checks += 1
+
+            integral = self._frame_integral(frame, frame_key)
+            template_hist = self._template_hist(template, (template_key, template.shape))
+            total = template_hist.sum()
+
+            # Number of tiles any placement of the template can touch
+            template_h, template_w = template.shape[:2]
+            span_y = min(integral.shape[0] - 1, -(-template_h // self.tile_size) + 1)
+            span_x = min(integral.shape[1] - 1, -(-template_w // self.tile_size) + 1)
+
+            windows = (integral[span_y:, span_x:] - integral[:-span_y, span_x:] -
+                       integral[span_y:, :-span_x] + integral[:-span_y, :-span_x])
+
+            if total < self.min_colored:
+                coverage = 1.0
+            else:
+                coverage = np.minimum(windows, template_hist).sum(axis=2).max() / total
+            possible = coverage >= self.min_coverage
+            if not possible:
+                self.rejects += 1
+
+            self.filter_time += time.perf_counter() - start
+            return possible
+
+    def record_match_time(self, seconds):
+        """Record the cost of a full correlation, used to estimate the time saved"""
+        with self.lock:
+            self.match_time += seconds
+            self.matches_timed += 1
+
+    def get_stats(self):
+        with self.lock:
+            average_match = self.match_time / self.matches_timed if self.matches_timed else 0.0
+            return {
+                'checks': self.checks,
+                'rejects': self.rejects,
+                'reject_rate': self.rejects / self.checks if self.checks else 0.0,
+                'filter_time': self.filter_time,
+                'time_saved': max(0.0, self.rejects * average_match - self.filter_time)
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.checks = 0
+            self.rejects = 0
+            self.filter_time = 0.0
+            self.match_time = 0.0
+            self.matches_timed = 0
+
+    def take_counts(self):
+        """Return the counters since the last call and reset them, e.g. to report them from a worker"""
+        with self.lock:
+            counts = {
+                'checks': self.checks,
+                'rejects': self.rejects,
+                'filter_time': self.filter_time,
+                'match_time': self.match_time,
+                'matches_timed': self.matches_timed
+            }
+            self.checks = 0
+            self.rejects = 0
+            self.filter_time = 0.0
+            self.match_time = 0.0
+            self.matches_timed = 0
+        return counts
+
+    def add_counts(self, counts):
+        """Add counters taken from another pre-filter with take_counts()"""
+        with self.lock:
+            self.checks += counts.get('checks', 0)
+            self.rejects += counts.get('rejects', 0)
+            self.filter_time += counts.get('filter_time', 0.0)
+            self.match_time += counts.get('match_time', 0.0)
+            self.matches_timed += counts.get('matches_timed', 0)
@@ -0,0 +1,157 @@
+import copy
+import time
+from collections import deque
+import cv2
+import numpy as np
+from controllers.action_recorder import action_target
+from controllers.condition_checker import ConditionType, sample_signature_points
+
+
+class GapObserver:
+    """Watches the frames shown between recorded actions.
+
+    This runs online, as frames arrive during recording, rather than as a
+    pass over saved frames afterwards. When an action is recorded, the frames
+    since the previous action are scanned backwards for the last one in which
+    the area around the action's target matched the frame before it, so touch
+    feedback or a transition still running at the tap is skipped. From there
+    the scan goes on to find when that area last changed, i.e. when the target
+    became visible. The target's pixel signature is sampled from that settled
+    frame. The result is attached to the action as 'observed' and is what
+    optimize_timeline works from.
+
+    Frames are kept as strided grayscale thumbnails (about 70 KB each on a
+    1440x3200 screen) and only for the current gap. Only the last
+    recent_frames frames are kept at full size, for sampling the signature.
+    """
+
+    def __init__(self, patch_radius=48, thumb_step=8, max_frames=300, change_threshold=12.0, recent_frames=4):
+        self.patch_radius = patch_radius
+        self.thumb_step = thumb_step
+        self.change_threshold = change_threshold
+        self.frames = deque(maxlen=max_frames)  # (timestamp, thumbnail)
+        self.recent = deque(maxlen=recent_frames)  # (timestamp, frame) at full size
+        self.last_action_time = None
+
+    def reset(self, start_time=None):
+        self.frames.clear()
+        self.recent.clear()
+        self.last_action_time = start_time
+
+    def observe_frame(self, frame, timestamp=None):
+        if frame is None:
+            return
+        timestamp = timestamp or time.time()
+        thumb = np.ascontiguousarray(frame[::self.thumb_step, ::self.thumb_step])
+        if thumb.ndim == 3:
+            thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        self.frames.append((timestamp, thumb))
+        self.recent.append((timestamp, frame))
+
+    def observe_action(self, action):
+        """Return what was seen before the action, or None if there is nothing to go on"""
+        timestamp = action.get('timestamp', time.time())
+        previous_time = self.last_action_time
+        self.last_action_time = timestamp
+
+        target = action_target(action)
+        frames = [(t, thumb) for t, thumb in self.frames if t <= timestamp]
+        observed = None
+
+        if target is not None and len(frames) > 1 and previous_time is not None:
+            x, y = target
+            r = self.patch_radius
+            region = (x - r, y - r, 2 * r, 2 * r)
+
+            # A settled frame older than the full size frames kept gives nothing to sample
+            settled = self._settled_index(frames, region)
+            source = dict(self.recent).get(frames[settled][0]) if settled is not None else None
+            if source is not None:
+                visible_since = self._visible_since(frames[:settled + 1], region, previous_time)
+                signature = sample_signature_points(source, region, count=16, tolerance=24)
+                if visible_since is not None and signature:
+                    observed = {
+                        'visible_after': round(max(0.0, visible_since - previous_time), 3),
+                        'signature': signature
+                    }
+
+        # The screen at this action is where the next gap starts
+        if frames:
+            self.frames.clear()
+            self.frames.append(frames[-1])
+        return observed
+
+    def _patch(self, thumb, region):
+        step = self.thumb_step
+        x, y, w, h = region
+        return thumb[max(0, y // step):(y + h) // step, max(0, x // step):(x + w) // step].astype(np.int16)
+
+    def _same_patch(self, patch, reference):
+        return patch.shape == reference.shape and np.abs(patch - reference).mean() <= self.change_threshold
+
+    def _settled_index(self, frames, region):
+        """Index of the last frame whose region matched the frame before it, or None"""
+        for i in range(len(frames) - 1, 0, -1):
+            patch = self._patch(frames[i][1], region)
+            if patch.size and self._same_patch(self._patch(frames[i - 1][1], region), patch):
+                return i
+        return None
+
+    def _visible_since(self, frames, region, previous_time):
+        """Arrival time of the earliest frame after which the region no longer changed"""
+        reference = self._patch(frames[-1][1], region)
+        if reference.size == 0:
+            return None
+
+        visible_since = frames[-1][0]
+        for timestamp, thumb in reversed(frames[:-1]):
+            if not self._same_patch(self._patch(thumb, region), reference):
+                break
+            visible_since = timestamp
+            if timestamp <= previous_time:
+                break
+        return max(visible_since, previous_time)
+
+
+def optimize_timeline(actions, margin=1.5, poll_latency=0.2, min_saving=0.25, min_match=0.8):
+    """Replace recorded pauses with bounded waits for the next action's target.
+
+    For each action recorded with an 'observed' target, the fixed pause before
+    it becomes a wait_until pixel signature condition with a timeout of
+    margin times the recorded pause (at least one second more), so playback
+    goes on as soon as the target is on screen. Returns the optimized copy of
+    the actions and a report with the recorded and projected pause totals.
+    """
+    optimized = copy.deepcopy(actions)
+    report = {'gaps': 0, 'converted': 0, 'recorded': 0.0, 'projected': 0.0, 'saved': 0.0}
+    previous_offset = None
+
+    for action in optimized:
+        offset = action.get('time_offset', 0)
+        gap = max(0.0, offset - previous_offset) if previous_offset is not None else 0.0
+        previous_offset = offset
+        if gap <= 0:
+            continue
+
+        report['gaps'] += 1
+        report['recorded'] += gap
+
+        observed = action.get('observed') or {}
+        visible_after = observed.get('visible_after')
+        expected = visible_after + poll_latency if visible_after is not None else gap
+        if not observed.get('signature') or gap - expected < min_saving:
+            report['projected'] += gap
+            continue
+
+        action['wait_until'] = {
+            'condition': {
+                'type': ConditionType.PIXEL_SIGNATURE.value,
+                'data': {'points': observed['signature'], 'min_match': min_match}
+            },
+            'timeout': round(max(gap * margin, gap + 1.0), 2)
+        }
+        report['converted'] += 1
+        report['projected'] += expected
+
+    report['saved'] = report['recorded'] - report['projected']
+    return optimized, report
@@ -0,0 +1,258 @@
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+
+# Operations a worker may run; each maps to an OpenCVProcessor method except
+# check_condition, which runs a ConditionChecker against the shared frame
+OPERATIONS = (
+    'find_template',
+    'find_all_templates',
+    'find_colors',
+    'read_text',
+    'classify_screen',
+    'sample_pixel_signature',
+    'check_condition'
+)
+
+# Shared memory segments a worker keeps mapped at once
+WORKER_ATTACH_LIMIT = 8
+
+
+class FrameSlot:
+    """A shared memory block holding one published frame"""
+
+    def __init__(self, size):
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.source = None  # weak reference to the frame last copied in
+        self.shape = None
+        self.dtype = None
+        self.in_flight = 0
+
+    def holds(self, frame):
+        return self.source is not None and self.source() is frame
+
+    def write(self, frame):
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf)
+        view[...] = frame
+        self.source = weakref.ref(frame)
+        self.shape = frame.shape
+        self.dtype = frame.dtype.str
+
+    def ref(self):
+        return (self.shm.name, self.shape, self.dtype)
+
+    def release(self):
+        self.source = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class VisionPool:
+    """Pool of worker processes running vision requests on frames in shared memory.
+
+    A frame is copied once into a shared memory slot and every worker maps the
+    same block, so requests carry only the slot name and parameters. A slot is
+    reused for the same frame object and is not overwritten while requests on it
+    are still running. Requests return concurrent.futures.Future objects.
+
+    Each worker has its own OpenCVProcessor. A request carries the caller's
+    context (template scale, device, remembered scales and re-captured
+    templates) and its future resolves to (result, state), where state holds
+    what the worker learned for the caller to apply (see _run).
+    """
+
+    def __init__(self, workers=None, max_slots=None):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_slots = max_slots or self.workers * 2
+        # Forking a process that runs Qt threads is unsafe, so workers are always spawned
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        self.slots = []
+        self.slot_condition = threading.Condition()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.frames_published = 0
+        self.bytes_published = 0
+        self.closed = False
+
+    def _acquire_slot(self, frame):
+        """Return a slot holding frame, copying it into a free slot when needed"""
+        with self.slot_condition:
+            while True:
+                for slot in self.slots:
+                    if slot.holds(frame):
+                        slot.in_flight += 1
+                        return slot
+
+                free = [slot for slot in self.slots if slot.in_flight == 0]
+                slot = next((s for s in free if s.shm.size >= frame.nbytes), None)
+
+                if slot is None and free and len(self.slots) >= self.max_slots:
+                    # Every free slot is too small, e.g. after a resolution change
+                    self.slots.remove(free[0])
+                    free[0].release()
+
+                if slot is None and len(self.slots) < self.max_slots:
+                    slot = FrameSlot(frame.nbytes)
+                    self.slots.append(slot)
+
+                if slot is not None:
+                    slot.write(frame)
+                    slot.in_flight += 1
+                    self.frames_published += 1
+                    self.bytes_published += frame.nbytes
+                    return slot
+
+                # Every slot is in use by running requests
+                self.slot_condition.wait()
+
+    def _release_slot(self, slot, future):
+        with self.slot_condition:
+            slot.in_flight -= 1
+            self.completed += 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            self.slot_condition.notify_all()
+
+    def submit(self, operation, frame, context=None, **kwargs):
+        """Run an operation on frame in a worker process and return a future of (result, state)"""
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown vision operation: {operation}")
+        if self.closed:
+            raise RuntimeError("Vision pool is shut down")
+
+        slot = self._acquire_slot(np.ascontiguousarray(frame))
+        try:
+            future = self.executor.submit(_run, operation, slot.ref(), context or {}, kwargs)
+        except Exception:
+            with self.slot_condition:
+                slot.in_flight -= 1
+                self.slot_condition.notify_all()
+            raise
+
+        with self.slot_condition:
+            self.submitted += 1
+        future.add_done_callback(lambda f: self._release_slot(slot, f))
+        return future
+
+    def get_stats(self):
+        with self.slot_condition:
+            return {
+                'workers': self.workers,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'pending': self.submitted - self.completed,
+                'frames_published': self.frames_published,
+                'bytes_published': self.bytes_published,
+                'slots': len(self.slots)
+            }
+
+    def shutdown(self, wait=True):
+        """Stop the workers and free the shared memory"""
+        self.closed = True
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        with self.slot_condition:
+            for slot in self.slots:
+                try:
+                    slot.release()
+                except Exception as e:
+                    print(f"Error releasing frame slot: {e}")
+            self.slots = []
+
+
+# Worker process state
+_processor = None
+_checker = None
+_attached = {}  # shared memory name -> SharedMemory
+_data_mtimes = {}  # data file -> mtime when last loaded
+_template_versions = {}  # template_path -> version last applied, see OpenCVProcessor.template_versions
+_found = []  # (template_path, match) emitted by the processor during the current request
+
+
+def _init_worker():
+    global _processor, _checker
+    from controllers.opencv_processor import OpenCVProcessor
+    from controllers.condition_checker import ConditionChecker
+
+    _processor = OpenCVProcessor(None)
+    _processor.template_found.connect(lambda template_path, match: _found.append((template_path, match)))
+    _checker = ConditionChecker(_processor)
+
+
+def _attach(ref):
+    """Map a published frame as a read-only array"""
+    name, shape, dtype = ref
+    shm = _attached.get(name)
+    if shm is None:
+        if len(_attached) >= WORKER_ATTACH_LIMIT:
+            try:
+                _attached.pop(next(iter(_attached))).close()
+            except BufferError:
+                pass  # still referenced; unmapped when garbage collected
+
+        # Workers share the parent's resource tracker, so the block stays owned
+        # by the parent and is only unlinked when the parent releases the slot
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+
+    frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    frame.flags.writeable = False
+    return frame
+
+
+def _reload_changed_data():
+    """Pick up screen labels and glyphs added in the main process since the last request"""
+    for store, path in ((_processor.screen_index, _processor.screen_index.index_file),
+                        (_processor.glyph_atlas, _processor.glyph_atlas.atlas_file)):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        if _data_mtimes.get(path) != mtime:
+            _data_mtimes[path] = mtime
+            store.load()
+
+
+def _apply_context(context):
+    """Bring the worker's processor in line with the caller's before a request"""
+    for template_path, version in context.get('templates', {}).items():
+        if _template_versions.get(template_path) != version:
+            _template_versions[template_path] = version
+            _processor.invalidate_template(template_path)
+
+    _processor.set_template_scale(context.get('template_scale', 1.0))
+    _processor.device_id = context.get('device_id')
+    for template_path, scale in context.get('scales', {}).items():
+        _processor.scale_memory[(_processor.device_id, template_path)] = scale
+
+
+def _run(operation, ref, context, kwargs):
+    frame = _attach(ref)
+    _reload_changed_data()
+    _apply_context(context)
+    scales = dict(_processor.scale_memory)
+    _processor.last_match_score = None
+    del _found[:]
+
+    if operation == 'check_condition':
+        result = _checker.check_condition(kwargs['condition'], frame)
+    else:
+        result = getattr(_processor, operation)(frame=frame, **kwargs)
+
+    state = {
+        'scales': {key: scale for key, scale in _processor.scale_memory.items() if scales.get(key) != scale},
+        'tracker': _processor.match_tracker.take_counts(),
+        'prefilter': _processor.prefilter.take_counts(),
+        'found': list(_found)
+    }
+    # find_template clears the score when it skips the correlation, other operations only set it
+    if operation == 'find_template' or _processor.last_match_score is not None:
+        state['match_score'] = _processor.last_match_score
+    return result, state
@@ -0,0 +1,85 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QColor
+
+
+PLAYING_ROW_COLOR = QColor(255, 200, 0, 90)
+
+
+class ActionListModel(QAbstractListModel):
+    """List model over an ActionRecorder's actions.
+
+    Rows are the recorder's own action dicts, so nothing is copied and a
+    description is only built when a view asks for a visible row. The model
+    listens to the recorder and turns each change into an incremental row
+    notification instead of rebuilding the list: the recorder notifies
+    'before_<op>' ahead of a change, where the model begins it, and '<op>'
+    once the list has changed, where the model ends it.
+    """
+
+    def __init__(self, recorder, parent=None):
+        super().__init__(parent)
+        self.recorder = recorder
+        self.playing_row = -1
+        self.moving = False  # beginMoveRows accepted the pending move
+        recorder.listeners.append(self.on_actions_changed)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.recorder.actions)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.recorder.actions):
+            return None
+
+        action = self.recorder.actions[index.row()]
+        if role == Qt.DisplayRole:
+            return self.recorder.get_action_description(action)
+        if role == Qt.UserRole:
+            return action
+        if role == Qt.BackgroundRole and index.row() == self.playing_row:
+            return PLAYING_ROW_COLOR
+        return None
+
+    def on_actions_changed(self, op, fields):
+        """Map a recorder change onto row notifications, begun before the list changes"""
+        if op == 'before_append':
+            row = fields['index']
+            self.beginInsertRows(QModelIndex(), row, row)
+        elif op == 'append':
+            self.endInsertRows()
+
+        elif op == 'before_remove':
+            row = fields['index']
+            self.beginRemoveRows(QModelIndex(), row, row)
+        elif op == 'remove':
+            self.endRemoveRows()
+            row = fields['index']
+            if self.playing_row == row:
+                self.playing_row = -1
+
+        elif op == 'replace':
+            index = self.index(fields['index'])
+            self.dataChanged.emit(index, index)
+
+        elif op == 'before_move':
+            source, target = fields['from'], fields['to']
+            # beginMoveRows takes the row the item is inserted before
+            self.moving = source != target and self.beginMoveRows(
+                QModelIndex(), source, source, QModelIndex(), target + 1 if target > source else target)
+        elif op == 'move':
+            if self.moving:
+                self.moving = False
+                self.endMoveRows()
+
+        elif op == 'before_reset':
+            self.beginResetModel()
+        elif op == 'reset':
+            self.playing_row = -1
+            self.endResetModel()
+
+    def set_playing_row(self, row):
+        """Highlight the action being played, or none for -1"""
+        previous, self.playing_row = self.playing_row, row
+        for changed in (previous, row):
+            if 0 <= changed < self.rowCount():
+                index = self.index(changed)
+                self.dataChanged.emit(index, index, [Qt.BackgroundRole])
@@ -0,0 +1,90 @@
+import threading
+from collections import deque
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QTimer, pyqtSignal
+
+
+# Pending lines are pushed to the view at most this often (about one frame)
+FLUSH_INTERVAL_MS = 16
+
+
+class LogListModel(QAbstractListModel):
+    """Bounded list model of log lines.
+
+    Lines are kept in a ring buffer of max_lines, the oldest dropping off as
+    new ones arrive. append() may be called from any thread and only queues
+    the line; queued lines are added to the model together once per frame, so
+    a burst of messages costs one insert notification instead of one each.
+    """
+
+    flush_requested = pyqtSignal()
+
+    def __init__(self, max_lines=5000, parent=None):
+        super().__init__(parent)
+        self.max_lines = max_lines
+        self.lines = deque()
+        self.pending = []
+        self.flush_scheduled = False
+        self.lock = threading.Lock()
+        self.flush_requested.connect(self.schedule_flush, Qt.QueuedConnection)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid() and index.row() < len(self.lines):
+            return self.lines[index.row()]
+        return None
+
+    def append(self, line):
+        with self.lock:
+            self.pending.append(line)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.flush_requested.emit()
+
+    def schedule_flush(self):
+        QTimer.singleShot(FLUSH_INTERVAL_MS, self.flush)
+
+    def flush(self):
+        """Add the queued lines to the model, dropping the oldest beyond max_lines"""
+        with self.lock:
+            new_lines = self.pending[-self.max_lines:]
+            self.pending = []
+            self.flush_scheduled = False
+        if not new_lines:
+            return
+
+        overflow = len(self.lines) + len(new_lines) - self.max_lines
+        if overflow >= len(self.lines) and self.lines:
+            self.beginResetModel()
+            self.lines = deque(new_lines)
+            self.endResetModel()
+            return
+
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self.lines.popleft()
+            self.endRemoveRows()
+
+        first = len(self.lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_lines) - 1)
+        self.lines.extend(new_lines)
+        self.endInsertRows()
+
+    def set_max_lines(self, max_lines):
+        self.max_lines = max(1, max_lines)
+        overflow = len(self.lines) - self.max_lines
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self.lines.popleft()
+            self.endRemoveRows()
+
+    def clear(self):
+        with self.lock:
+            self.pending = []
+        self.beginResetModel()
+        self.lines.clear()
+        self.endResetModel()
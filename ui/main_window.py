@@ -1,6 +1,7 @@
 import os
 import time
 import threading
+import cv2
 from PyQt5.QtCore import Qt, QTimer, pyqtSlot, QSize, QEvent, QDateTime, QTime
 from PyQt5.QtGui import QImage, QPixmap, QIcon, QCursor, QColor
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
@@ -8,17 +9,28 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPu
                             QLineEdit, QSpinBox, QCheckBox, QFileDialog, QMessageBox,
                             QListWidgetItem, QMenu, QAction, QSplitter, QDialog,
                             QFormLayout, QDialogButtonBox, QRadioButton, QButtonGroup,
-                            QDateTimeEdit, QTimeEdit, QDoubleSpinBox)
+                            QDateTimeEdit, QTimeEdit, QDoubleSpinBox, QInputDialog, QListView,
+                            QTableWidget, QTableWidgetItem, QHeaderView)
 from controllers.adb_controller import AdbController, ScreenCaptureThread, DeviceManager
 from controllers.action_recorder import ActionRecorder, ActionType
 from controllers.action_player import ActionPlayer
 from controllers.opencv_processor import OpenCVProcessor
+from controllers.timeline_optimizer import GapObserver, optimize_timeline
+from controllers.recording_file import is_recording_file
+from controllers.recording_journal import RecordingJournal
+from controllers.feature_matcher import FeatureMatcher
 from controllers.scheduler import TaskScheduler, ScheduleType
 from controllers.condition_checker import ConditionChecker, ConditionType
-from ui.screen_widget import ScreenWidget
+from ui.action_list_model import ActionListModel
+from ui.log_model import LogListModel
+from ui.screen_widget import ScreenWidget, OVERLAY_BOX, OVERLAY_ROI, OVERLAY_TAP
 from ui.themes import ThemeManager
 from utils.config_manager import ConfigManager
 from utils.logger import Logger
+from utils.metrics import registry as metrics, MetricsServer
+from utils.profiler import profiler, MODE_SAMPLE, MODE_CPROFILE, PER_THREAD_CPROFILE
+
+RECORDING_FILE_FILTER = "Recordings (*.json *.aarec);;JSON Files (*.json);;Compact Recordings (*.aarec)"
 
 class AddActionDialog(QDialog):
 
@@ -100,6 +112,8 @@ class AddActionDialog(QDialog):
             self.setup_long_press_params()
         elif self.action_type == ActionType.TEMPLATE_MATCH:
             self.setup_template_match_params()
+        elif self.action_type == ActionType.WAIT_STABLE:
+            self.setup_wait_stable_params()
     
     def setup_tap_params(self):
         self.x_spin = QSpinBox()
@@ -138,6 +152,45 @@ class AddActionDialog(QDialog):
         
         self.params_layout.addRow("Duration:", self.wait_spin)
     
+    def setup_wait_stable_params(self):
+        self.stable_frames_spin = QSpinBox()
+        self.stable_frames_spin.setRange(1, 50)
+        self.stable_frames_spin.setValue(3)
+        self.stable_frames_spin.setSuffix(" frames")
+        
+        self.stable_ms_spin = QSpinBox()
+        self.stable_ms_spin.setRange(0, 30000)
+        self.stable_ms_spin.setSingleStep(100)
+        self.stable_ms_spin.setValue(0)
+        self.stable_ms_spin.setSuffix(" ms")
+        self.stable_ms_spin.setSpecialValueText("Off")
+        
+        self.stable_max_wait_spin = QSpinBox()
+        self.stable_max_wait_spin.setRange(1, 300)
+        self.stable_max_wait_spin.setValue(10)
+        self.stable_max_wait_spin.setSuffix(" sec")
+        
+        self.stable_threshold_spin = QDoubleSpinBox()
+        self.stable_threshold_spin.setRange(0.1, 50.0)
+        self.stable_threshold_spin.setSingleStep(0.5)
+        self.stable_threshold_spin.setValue(2.0)
+        
+        # Region to watch; a zero width or height watches the whole screen
+        self.stable_region_spins = []
+        region_layout = QHBoxLayout()
+        for label in ("X", "Y", "W", "H"):
+            spin = QSpinBox()
+            spin.setRange(0, 9999)
+            spin.setPrefix(f"{label}: ")
+            self.stable_region_spins.append(spin)
+            region_layout.addWidget(spin)
+        
+        self.params_layout.addRow("Unchanged for:", self.stable_frames_spin)
+        self.params_layout.addRow("Or unchanged for:", self.stable_ms_spin)
+        self.params_layout.addRow("Max wait:", self.stable_max_wait_spin)
+        self.params_layout.addRow("Change threshold:", self.stable_threshold_spin)
+        self.params_layout.addRow("Region:", region_layout)
+    
     def setup_key_params(self):
         self.key_edit = QLineEdit()
         self.key_edit.setPlaceholderText("Enter keycode (e.g., 4 for BACK)")
@@ -186,10 +239,32 @@ class AddActionDialog(QDialog):
         self.tap_check = QCheckBox("Tap when found")
         self.tap_check.setChecked(True)
         
+        self.match_all_check = QCheckBox("Match all occurrences")
+        self.match_all_check.setChecked(False)
+        
+        self.max_matches_spin = QSpinBox()
+        self.max_matches_spin.setRange(1, 500)
+        self.max_matches_spin.setValue(20)
+        
+        self.scale_tolerant_check = QCheckBox("Scale tolerant")
+        self.scale_tolerant_check.setChecked(False)
+        
+        self.match_mode_combo = QComboBox()
+        self.match_mode_combo.addItem("Template matching", "template")
+        self.match_mode_combo.addItem("Feature matching (rotation/occlusion)", "features")
+        # Feature matching locates a single occurrence, so it cannot match all of them
+        self.match_mode_combo.currentIndexChanged.connect(
+            lambda: self.match_all_check.setEnabled(self.match_mode_combo.currentData() != 'features')
+        )
+        
         self.params_layout.addRow("Template:", path_layout)
         self.params_layout.addRow("", self.wait_check)
         self.params_layout.addRow("Max wait:", self.max_wait_spin)
         self.params_layout.addRow("", self.tap_check)
+        self.params_layout.addRow("", self.match_all_check)
+        self.params_layout.addRow("Max matches:", self.max_matches_spin)
+        self.params_layout.addRow("Match mode:", self.match_mode_combo)
+        self.params_layout.addRow("", self.scale_tolerant_check)
     
     def browse_template(self):
         filename, _ = QFileDialog.getOpenFileName(
@@ -219,6 +294,16 @@ class AddActionDialog(QDialog):
                 'duration': self.wait_spin.value()
             }
         
+        elif self.action_type == ActionType.WAIT_STABLE:
+            region = [spin.value() for spin in self.stable_region_spins]
+            return ActionType.WAIT_STABLE, {
+                'stable_frames': self.stable_frames_spin.value(),
+                'stable_ms': self.stable_ms_spin.value(),
+                'max_wait': self.stable_max_wait_spin.value(),
+                'threshold': self.stable_threshold_spin.value(),
+                'region': region if region[2] > 0 and region[3] > 0 else None
+            }
+        
         elif self.action_type == ActionType.KEY:
             try:
                 keycode = int(self.key_edit.text())
@@ -247,7 +332,11 @@ class AddActionDialog(QDialog):
                 'template_path': template_path,
                 'wait': self.wait_check.isChecked(),
                 'max_wait': self.max_wait_spin.value(),
-                'tap': self.tap_check.isChecked()
+                'tap': self.tap_check.isChecked(),
+                'match_all': self.match_all_check.isEnabled() and self.match_all_check.isChecked(),
+                'max_matches': self.max_matches_spin.value(),
+                'scale_tolerant': self.scale_tolerant_check.isChecked(),
+                'match_mode': self.match_mode_combo.currentData()
             }
         
         return None, None
@@ -281,6 +370,8 @@ class MainWindow(QMainWindow):
         self.device_manager = DeviceManager(self.driver_manager)
         self.opencv_processor = OpenCVProcessor(self.adb_controller)
         self.action_recorder = ActionRecorder()
+        self.action_recorder.observer = GapObserver()
+        self.action_recorder.journal = RecordingJournal()
         self.action_player = ActionPlayer(self.adb_controller, self.opencv_processor)
         
         # Initialize theme manager
@@ -291,6 +382,7 @@ class MainWindow(QMainWindow):
         
         # Initialize logger
         self.logger = Logger()
+        self.metrics_server = None
         
         # State variables
         self.capture_thread = None
@@ -298,8 +390,16 @@ class MainWindow(QMainWindow):
         self.is_playing = False
         self.is_connected = False
         self.last_coord = None
+        self.device_resolution = None
         self.templates_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "templates")
         os.makedirs(self.templates_dir, exist_ok=True)
+        self.screens_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "screens")
+        self.traces_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "traces")
+        self.profiles_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "profiles")
+        
+        # Profile the GUI thread along with the capture and player threads; SIGUSR1 toggles profiling
+        profiler.register("GUI")
+        profiler.install_signal_handler(self.profiles_dir)
         
         # Initialize UI
         self.init_ui()
@@ -326,6 +426,9 @@ class MainWindow(QMainWindow):
         self.refresh_devices()
         self.update_scheduled_tasks_list()
 
+        # Offer to restore a recording that was not saved before the last exit
+        self.recover_recording()
+
     def init_ui(self):
         # Central widget with layout
         self.central_widget = QWidget()
@@ -423,6 +526,11 @@ class MainWindow(QMainWindow):
         buttons_layout.addWidget(self.load_recording_btn)
         recording_layout.addLayout(buttons_layout)
         
+        # Turn recorded pauses into waits for each action's target
+        self.optimize_timeline_btn = QPushButton("Optimize Timeline")
+        self.optimize_timeline_btn.setToolTip("Replace recorded pauses with waits for the next target to appear")
+        recording_layout.addWidget(self.optimize_timeline_btn)
+        
         recording_group.setLayout(recording_layout)
         self.control_layout.addWidget(recording_group)
     
@@ -458,10 +566,19 @@ class MainWindow(QMainWindow):
         # Loop playback
         self.loop_check = QCheckBox("Loop playback")
         
+        # Recorded pauses only bound the wait for the screen to settle
+        self.settle_gaps_check = QCheckBox("Wait for screen to settle instead of recorded pauses")
+        
+        # Timeline of every playback, scheduled ones included
+        self.save_traces_check = QCheckBox("Save playback traces")
+        self.save_traces_check.setToolTip("Write a Chrome trace (JSON) and CSV rows for each playback to the traces folder")
+        
         playback_layout.addLayout(speed_layout)
         playback_layout.addLayout(delay_layout)
         playback_layout.addLayout(buttons_layout)
         playback_layout.addWidget(self.loop_check)
+        playback_layout.addWidget(self.settle_gaps_check)
+        playback_layout.addWidget(self.save_traces_check)
 
         playback_group.setLayout(playback_layout)
         self.control_layout.addWidget(playback_group)
@@ -490,9 +607,42 @@ class MainWindow(QMainWindow):
         self.interval_spin.setSuffix(" ms")
         interval_layout.addWidget(self.interval_spin)
         
+        # Worker processes for template, color and text checks during playback
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Vision Workers:"))
+        self.vision_workers_spin = QSpinBox()
+        self.vision_workers_spin.setRange(0, os.cpu_count() or 1)
+        self.vision_workers_spin.setValue(0)
+        self.vision_workers_spin.setSpecialValueText("Off")
+        self.vision_workers_spin.setToolTip("Run vision checks in separate processes (Off runs them in the player thread)")
+        workers_layout.addWidget(self.vision_workers_spin)
+        
+        # Local HTTP port serving /metrics (Prometheus) and /metrics.json
+        metrics_port_layout = QHBoxLayout()
+        metrics_port_layout.addWidget(QLabel("Metrics Port:"))
+        self.metrics_port_spin = QSpinBox()
+        self.metrics_port_spin.setRange(0, 65535)
+        self.metrics_port_spin.setValue(0)
+        self.metrics_port_spin.setSpecialValueText("Off")
+        self.metrics_port_spin.setKeyboardTracking(False)
+        self.metrics_port_spin.setToolTip("Serve metrics on localhost for Prometheus or as JSON")
+        metrics_port_layout.addWidget(self.metrics_port_spin)
+        
+        # Lines kept in the log view; older lines remain in the log file
+        log_lines_layout = QHBoxLayout()
+        log_lines_layout.addWidget(QLabel("Log Lines:"))
+        self.log_lines_spin = QSpinBox()
+        self.log_lines_spin.setRange(100, 100000)
+        self.log_lines_spin.setSingleStep(1000)
+        self.log_lines_spin.setValue(5000)
+        log_lines_layout.addWidget(self.log_lines_spin)
+        
         settings_layout.addLayout(theme_layout)
         settings_layout.addWidget(self.opencv_check)
         settings_layout.addLayout(interval_layout)
+        settings_layout.addLayout(workers_layout)
+        settings_layout.addLayout(log_lines_layout)
+        settings_layout.addLayout(metrics_port_layout)
         
         settings_group.setLayout(settings_layout)
         self.control_layout.addWidget(settings_group)
@@ -515,7 +665,11 @@ class MainWindow(QMainWindow):
         self.actions_tab = QWidget()
         actions_layout = QVBoxLayout()
         
-        self.actions_list = QListWidget()
+        # Backed by the recorder's actions; rows update as the recorder changes
+        self.actions_model = ActionListModel(self.action_recorder, self)
+        self.actions_list = QListView()
+        self.actions_list.setModel(self.actions_model)
+        self.actions_list.setUniformItemSizes(True)
         self.actions_list.setContextMenuPolicy(Qt.CustomContextMenu)
         
         actions_layout.addWidget(QLabel("Recorded Actions:"))
@@ -544,8 +698,12 @@ class MainWindow(QMainWindow):
         template_buttons_layout = QHBoxLayout()
         self.create_template_btn = QPushButton("Create New")
         self.remove_template_btn = QPushButton("Remove")
+        self.label_screen_btn = QPushButton("Label Screen")
+        self.teach_glyphs_btn = QPushButton("Teach Glyphs")
         template_buttons_layout.addWidget(self.create_template_btn)
         template_buttons_layout.addWidget(self.remove_template_btn)
+        template_buttons_layout.addWidget(self.label_screen_btn)
+        template_buttons_layout.addWidget(self.teach_glyphs_btn)
         
         templates_layout.addLayout(template_buttons_layout)
         self.templates_tab.setLayout(templates_layout)
@@ -553,7 +711,12 @@ class MainWindow(QMainWindow):
         self.logs_tab = QWidget()
         logs_layout = QVBoxLayout()
         
-        self.logs_list = QListWidget()
+        self.log_model = LogListModel(parent=self)
+        self.logs_list = QListView()
+        self.logs_list.setModel(self.log_model)
+        self.logs_list.setUniformItemSizes(True)
+        # Queued lines arrive together, so this scrolls at most once per frame
+        self.log_model.rowsInserted.connect(self.logs_list.scrollToBottom)
         
         logs_layout.addWidget(QLabel("Application Logs:"))
         logs_layout.addWidget(self.logs_list)
@@ -565,6 +728,38 @@ class MainWindow(QMainWindow):
         logs_layout.addLayout(logs_buttons_layout)
         self.logs_tab.setLayout(logs_layout)
 
+        self.stats_tab = QWidget()
+        stats_layout = QVBoxLayout()
+        
+        self.stats_table = QTableWidget(0, 7)
+        self.stats_table.setHorizontalHeaderLabels(["Metric", "Labels", "Count", "Value / p50", "p90", "p99", "Max"])
+        self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.stats_table.verticalHeader().setVisible(False)
+        self.stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        
+        stats_layout.addWidget(QLabel("Timings are in milliseconds"))
+        stats_layout.addWidget(self.stats_table)
+        
+        stats_buttons_layout = QHBoxLayout()
+        self.reset_stats_btn = QPushButton("Reset")
+        stats_buttons_layout.addWidget(self.reset_stats_btn)
+        stats_buttons_layout.addStretch()
+        
+        # Runtime profiler of the GUI, capture and player threads
+        self.profile_mode_combo = QComboBox()
+        self.profile_mode_combo.addItem("Sampling (flamegraph)", MODE_SAMPLE)
+        if PER_THREAD_CPROFILE:
+            self.profile_mode_combo.addItem("cProfile (.prof)", MODE_CPROFILE)
+        self.profile_btn = QPushButton("Start Profiling")
+        self.dump_profile_btn = QPushButton("Dump Profile")
+        stats_buttons_layout.addWidget(QLabel("Profiler:"))
+        stats_buttons_layout.addWidget(self.profile_mode_combo)
+        stats_buttons_layout.addWidget(self.profile_btn)
+        stats_buttons_layout.addWidget(self.dump_profile_btn)
+        
+        stats_layout.addLayout(stats_buttons_layout)
+        self.stats_tab.setLayout(stats_layout)
+
         self.scheduler_tab = QWidget()
         scheduler_layout = QVBoxLayout()
 
@@ -590,6 +785,7 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.actions_tab, "Actions")
         self.tabs.addTab(self.templates_tab, "Templates")
         self.tabs.addTab(self.logs_tab, "Logs")
+        self.tabs.addTab(self.stats_tab, "Stats")
         
         self.right_splitter.addWidget(self.tabs)
     
@@ -598,6 +794,25 @@ class MainWindow(QMainWindow):
         self.ui_timer = QTimer()
         self.ui_timer.timeout.connect(self.update_ui_state)
         self.ui_timer.start(500)  # Update every 500ms
+        
+        # Timer for refreshing the stats tab while it is shown
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_stats_table)
+        self.stats_timer.start(1000)
+        
+        # Restarting the vision pool is expensive, so apply the worker count
+        # once the spin box has stopped changing
+        self.vision_workers_timer = QTimer()
+        self.vision_workers_timer.setSingleShot(True)
+        self.vision_workers_timer.setInterval(600)
+        self.vision_workers_timer.timeout.connect(
+            lambda: self.set_vision_workers(self.vision_workers_spin.value()))
+        
+        # Likewise bind the metrics server only once the port has been chosen
+        self.metrics_port_timer = QTimer()
+        self.metrics_port_timer.setSingleShot(True)
+        self.metrics_port_timer.setInterval(600)
+        self.metrics_port_timer.timeout.connect(lambda: self.set_metrics_port(self.metrics_port_spin.value()))
     
     def connect_signals(self):
         # Device connection
@@ -610,6 +825,7 @@ class MainWindow(QMainWindow):
         self.add_action_btn.clicked.connect(self.add_action)
         self.save_recording_btn.clicked.connect(self.save_recording)
         self.load_recording_btn.clicked.connect(self.load_recording)
+        self.optimize_timeline_btn.clicked.connect(self.optimize_timeline)
         
         # Playback
         self.play_btn.clicked.connect(self.play_actions)
@@ -625,6 +841,8 @@ class MainWindow(QMainWindow):
         self.templates_list.customContextMenuRequested.connect(self.show_templates_context_menu)
         self.create_template_btn.clicked.connect(self.create_template)
         self.remove_template_btn.clicked.connect(self.remove_template)
+        self.label_screen_btn.clicked.connect(self.label_screen)
+        self.teach_glyphs_btn.clicked.connect(self.teach_glyphs)
         
         # Logs
         self.clear_logs_btn.clicked.connect(self.clear_logs)
@@ -632,6 +850,13 @@ class MainWindow(QMainWindow):
         # Settings
         self.theme_combo.currentTextChanged.connect(self.apply_theme)
         self.opencv_check.stateChanged.connect(self.toggle_opencv)
+        self.vision_workers_spin.valueChanged.connect(lambda: self.vision_workers_timer.start())
+        self.log_lines_spin.valueChanged.connect(self.log_model.set_max_lines)
+        self.metrics_port_spin.valueChanged.connect(lambda: self.metrics_port_timer.start())
+        self.reset_stats_btn.clicked.connect(self.reset_stats)
+        self.profile_btn.clicked.connect(self.toggle_profiling)
+        self.dump_profile_btn.clicked.connect(self.dump_profile)
+        self.save_traces_check.toggled.connect(self.set_save_traces)
         
         # Screen widget
         self.screen_widget.tap_event.connect(self.on_screen_tap)
@@ -641,9 +866,12 @@ class MainWindow(QMainWindow):
         # Action player
         self.action_player.playback_started.connect(lambda: self.log("Playback started"))
         self.action_player.playback_completed.connect(lambda: self.log("Playback completed"))
+        self.action_player.playback_completed.connect(lambda: self.actions_model.set_playing_row(-1))
         self.action_player.playback_error.connect(self.log)
+        self.action_player.playback_info.connect(self.log)
         self.action_player.action_started.connect(self.on_action_started)
         self.action_player.action_completed.connect(self.on_action_completed)
+        self.opencv_processor.template_found.connect(self.on_template_found)
 
         # Conditional action
         self.add_conditional_btn.clicked.connect(self.add_conditional_action)
@@ -694,14 +922,36 @@ class MainWindow(QMainWindow):
             self.log(f"Connected to device: {device_id}")
             
             # Get device dimensions
-            width, height = self.adb_controller.get_device_dimensions()
-            if width and height:
+            resolution = self.adb_controller.get_device_resolution()
+            if resolution:
+                width, height = resolution['width'], resolution['height']
                 self.log(f"Device screen size: {width}x{height}")
                 self.screen_widget.set_device_dimensions(width, height)
+                self.device_resolution = resolution
         
         except Exception as e:
             self.log(f"Error connecting to device: {str(e)}")
 
+    def recover_recording(self):
+        recovered = self.action_recorder.journal.recover()
+        if not recovered or not recovered[0]:
+            self.action_recorder.discard_journal()
+            return
+
+        reply = QMessageBox.question(
+                self, "Recover Recording",
+                f"A recording with {len(recovered[0])} unsaved actions was found from the last session. "
+                "Would you like to restore it?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.Yes
+        )
+
+        if reply == QMessageBox.Yes:
+            count = self.action_recorder.recover_journal()
+            self.log(f"Recovered {count} unsaved actions")
+        else:
+            self.action_recorder.discard_journal()
+
     def check_drivers(self):
         driver_status = self.driver_manager.check_drivers()
 
@@ -741,16 +991,30 @@ class MainWindow(QMainWindow):
             self.capture_thread.stop()
             self.capture_thread.wait()
         
+        stats = self.adb_controller.get_capture_stats()
+        if stats['frames'] > 0:
+            self.log(
+                f"Captured {stats['frames']} frame(s): {stats['allocated_per_frame'] / 1e6:.1f} MB allocated per frame "
+                f"with buffer reuse ({stats['without_reuse_per_frame'] / 1e6:.1f} MB without)"
+            )
+        
         self.adb_controller.device_id = None
+        self.device_resolution = None
         self.is_connected = False
         self.screen_widget.clear()
         self.log("Disconnected from device")
     
     def on_frame_update(self, frame):
+        if self.capture_thread is not None and self.capture_thread.emitted_at is not None:
+            metrics.histogram('capture_stage_seconds', "Duration of screen capture stages",
+                              stage='deliver').observe(time.perf_counter() - self.capture_thread.emitted_at)
+        
         # Process with OpenCV if enabled
         if self.opencv_check.isChecked():
             frame = self.opencv_processor.process_frame(frame)
         
+        self.action_recorder.record_frame(frame)
+        
         # Update screen display
         self.screen_widget.update_frame(frame)
     
@@ -760,6 +1024,8 @@ class MainWindow(QMainWindow):
             return
         
         self.action_recorder.start_recording()
+        if self.device_resolution:
+            self.action_recorder.set_resolution(**self.device_resolution)
         self.is_recording = True
         self.log("Recording started")
     
@@ -770,9 +1036,6 @@ class MainWindow(QMainWindow):
         self.action_recorder.stop_recording()
         self.is_recording = False
         self.log("Recording stopped")
-        
-        # Update actions list
-        self.update_actions_list()
     
     def add_action(self):
         dialog = AddActionDialog(self)
@@ -784,30 +1047,51 @@ class MainWindow(QMainWindow):
             action_index = self.action_recorder.add_action(action_type, action_data)
             if action_index >= 0:
                 self.log(f"Added action: {action_type.value}")
-                self.update_actions_list()
+
+    def optimize_timeline(self):
+        actions, report = optimize_timeline(self.action_recorder.actions)
+        if report['converted'] == 0:
+            self.log("Timeline: no recorded pause could be replaced by a wait for its target")
+            return
+        
+        self.action_recorder.set_actions(actions)
+        self.log(
+            f"Timeline: {report['converted']} of {report['gaps']} pauses now wait for their target; "
+            f"pauses should take about {report['projected']:.1f}s instead of {report['recorded']:.1f}s "
+            f"({report['saved']:.1f}s saved)"
+        )
     
     def save_recording(self):
-        if not self.action_recorder.actions:
+        if not self.action_recorder.actions and not self.is_recording:
             self.log("No actions to save")
             return
         
         filename, _ = QFileDialog.getSaveFileName(
-            self, "Save Actions", "", "JSON Files (*.json)"
+            self, "Save Actions", "", RECORDING_FILE_FILTER
         )
-        if filename:
-            if self.action_recorder.save_actions(filename):
-                self.log(f"Saved {len(self.action_recorder.actions)} actions to {filename}")
+        if not filename:
+            return
+        
+        # While recording, a recording file keeps growing with every new action
+        if self.is_recording and is_recording_file(filename):
+            if self.action_recorder.record_to(filename):
+                self.log(f"Saving actions to {filename} as they are recorded")
             else:
                 self.log(f"Failed to save actions to {filename}")
+            return
+        
+        if self.action_recorder.save_actions(filename):
+            self.log(f"Saved {len(self.action_recorder.actions)} actions to {filename}")
+        else:
+            self.log(f"Failed to save actions to {filename}")
     
     def load_recording(self):
         filename, _ = QFileDialog.getOpenFileName(
-            self, "Load Actions", "", "JSON Files (*.json)"
+            self, "Load Actions", "", RECORDING_FILE_FILTER
         )
         if filename:
             if self.action_recorder.load_actions(filename):
-                self.action_player.load_actions(self.action_recorder.actions)
-                self.update_actions_list()
+                self.action_player.load_actions(self.action_recorder.actions, self.action_recorder.resolution)
                 self.log(f"Loaded {len(self.action_recorder.actions)} actions from {filename}")
             else:
                 self.log(f"Failed to load actions from {filename}")
@@ -821,11 +1105,11 @@ class MainWindow(QMainWindow):
             self.log("Cannot play actions: No device connected")
             return
         
-        self.action_player.load_actions(self.action_recorder.actions)
+        self.action_player.load_actions(self.action_recorder.actions, self.action_recorder.resolution)
         speed_factor = self.speed_spin.value() / 100.0
 
         # Start playback in action player
-        if self.action_player.play(speed_factor):
+        if self.action_player.play(speed_factor, settle_gaps=self.settle_gaps_check.isChecked()):
             self.is_playing = True
             self.log(f"Playing {len(self.action_recorder.actions)} actions at {speed_factor}x speed")
         else:
@@ -834,6 +1118,7 @@ class MainWindow(QMainWindow):
     def stop_playback(self):
         if self.action_player.stop():
             self.is_playing = False
+            self.actions_model.set_playing_row(-1)
             self.log("Playback stopped")
     
     def on_screen_tap(self, x, y, device_x, device_y):
@@ -867,22 +1152,50 @@ class MainWindow(QMainWindow):
             self.adb_controller.long_press(device_x, device_y, duration)
     
     def on_action_started(self, index, action):
-        if 0 <= index < self.actions_list.count():
-            self.actions_list.setCurrentRow(index)
+        if 0 <= index < self.actions_model.rowCount():
+            self.actions_model.set_playing_row(index)
+            self.actions_list.scrollTo(self.actions_model.index(index))
             
             # Log the action
             action_type = action.get('type', '')
             self.log(f"Executing: {self.action_recorder.get_action_description(action)}")
+        
+        self.show_action_overlay(action)
+    
+    def show_action_overlay(self, action):
+        """Mark where an action taps or looks on the live screen"""
+        action_type = action.get('type', '')
+        data = action.get('data', {})
+        
+        if action_type in (ActionType.TAP.value, ActionType.LONG_PRESS.value):
+            self.screen_widget.add_overlay(OVERLAY_TAP, (data.get('x', 0), data.get('y', 0)))
+        
+        elif action_type == ActionType.SWIPE.value:
+            self.screen_widget.add_overlay(OVERLAY_TAP, (data.get('x1', 0), data.get('y1', 0)))
+            self.screen_widget.add_overlay(OVERLAY_TAP, (data.get('x2', 0), data.get('y2', 0)), label="end")
+        
+        elif action_type == ActionType.WAIT_STABLE.value and data.get('region'):
+            self.screen_widget.add_overlay(OVERLAY_ROI, data['region'], label="stable?")
+        
+        elif action_type == ActionType.CONDITIONAL.value:
+            condition = data.get('condition', {})
+            condition_data = condition.get('data', {})
+            if condition_data.get('region'):
+                self.screen_widget.add_overlay(OVERLAY_ROI, condition_data['region'], label=condition.get('type'))
+            elif condition.get('type') == ConditionType.PIXEL_COLOR.value:
+                self.screen_widget.add_overlay(OVERLAY_TAP, (condition_data.get('x', 0), condition_data.get('y', 0)),
+                                               label="pixel", color=(255, 200, 0))
+    
+    def on_template_found(self, template_path, match):
+        self.screen_widget.add_overlay(OVERLAY_BOX, match[:4], label=os.path.basename(template_path))
     
     def on_action_completed(self, index):
         pass
     
-    def update_actions_list(self):
-        self.actions_list.clear()
-        
-        for action in self.action_recorder.actions:
-            description = self.action_recorder.get_action_description(action)
-            self.actions_list.addItem(description)
+    def selected_action_index(self):
+        """Row of the selected action, or -1"""
+        selected = self.actions_list.selectionModel().selectedIndexes()
+        return selected[0].row() if selected else -1
     
     def clear_actions(self):
         if not self.action_recorder.actions:
@@ -897,16 +1210,14 @@ class MainWindow(QMainWindow):
         
         if reply == QMessageBox.Yes:
             self.action_recorder.clear_actions()
-            self.actions_list.clear()
             self.log("All actions cleared")
     
     def edit_selected_action(self):
-        selected_items = self.actions_list.selectedItems()
-        if not selected_items:
+        selected_index = self.selected_action_index()
+        if selected_index < 0:
             self.log("No action selected")
             return
         
-        selected_index = self.actions_list.row(selected_items[0])
         if selected_index < 0 or selected_index >= len(self.action_recorder.actions):
             return
         
@@ -951,6 +1262,14 @@ class MainWindow(QMainWindow):
         elif action_type == ActionType.WAIT:
             dialog.wait_spin.setValue(action_data.get('duration', 1000))
         
+        elif action_type == ActionType.WAIT_STABLE:
+            dialog.stable_frames_spin.setValue(action_data.get('stable_frames', 3))
+            dialog.stable_ms_spin.setValue(action_data.get('stable_ms', 0))
+            dialog.stable_max_wait_spin.setValue(action_data.get('max_wait', 10))
+            dialog.stable_threshold_spin.setValue(action_data.get('threshold', 2.0))
+            for spin, value in zip(dialog.stable_region_spins, action_data.get('region') or []):
+                spin.setValue(value)
+        
         elif action_type == ActionType.KEY:
             dialog.key_edit.setText(str(action_data.get('keycode', '')))
         
@@ -967,6 +1286,12 @@ class MainWindow(QMainWindow):
             dialog.wait_check.setChecked(action_data.get('wait', True))
             dialog.max_wait_spin.setValue(action_data.get('max_wait', 10))
             dialog.tap_check.setChecked(action_data.get('tap', True))
+            dialog.match_all_check.setChecked(action_data.get('match_all', False))
+            dialog.max_matches_spin.setValue(action_data.get('max_matches', 20))
+            dialog.scale_tolerant_check.setChecked(action_data.get('scale_tolerant', False))
+            dialog.match_mode_combo.setCurrentIndex(
+                max(0, dialog.match_mode_combo.findData(action_data.get('match_mode', 'template')))
+            )
         
         # Show the dialog
         if dialog.exec_() == QDialog.Accepted:
@@ -974,25 +1299,34 @@ class MainWindow(QMainWindow):
             new_action_data = dialog.action_data
             
             # Update the action
-            self.action_recorder.actions[selected_index] = {
+            updated = {
                 'type': new_action_type.value,
                 'data': new_action_data,
                 'timestamp': action.get('timestamp', time.time()),
                 'time_offset': action.get('time_offset', 0)
             }
             
-            self.update_actions_list()
+            # What was observed at record time only holds while the target is unchanged
+            if new_action_type.value == action.get('type') and new_action_data == action.get('data'):
+                for key in ('observed', 'wait_until'):
+                    if key in action:
+                        updated[key] = action[key]
+            
+            # The screen it was recorded on stays the same whatever the edit
+            if 'snapshot' in action:
+                updated['snapshot'] = action['snapshot']
+            
+            self.action_recorder.replace_action(selected_index, updated)
+            
             self.log(f"Action {selected_index} updated")
     
     def remove_selected_action(self):
-        selected_items = self.actions_list.selectedItems()
-        if not selected_items:
+        selected_index = self.selected_action_index()
+        if selected_index < 0:
             self.log("No action selected")
             return
         
-        selected_index = self.actions_list.row(selected_items[0])
         if self.action_recorder.remove_action(selected_index):
-            self.update_actions_list()
             self.log(f"Removed action at index {selected_index}")
     
     def show_actions_context_menu(self, position):
@@ -1007,9 +1341,45 @@ class MainWindow(QMainWindow):
         menu.addAction(edit_action)
         menu.addAction(remove_action)
         
-        if self.actions_list.count() > 0:
+        index = self.actions_list.indexAt(position).row()
+        if 0 <= index < len(self.action_recorder.actions) and \
+                self.action_recorder.actions[index].get('snapshot'):
+            snapshot_action = QAction("View Snapshot", self)
+            snapshot_action.triggered.connect(lambda: self.view_action_snapshot(index))
+            menu.addAction(snapshot_action)
+        
+        if self.actions_model.rowCount() > 0:
             menu.exec_(self.actions_list.mapToGlobal(position))
     
+    def view_action_snapshot(self, index):
+        """Show the screen as it was when the action was recorded"""
+        action = self.action_recorder.actions[index]
+        image = self.action_recorder.get_snapshot(action)
+        if image is None:
+            self.log(f"No snapshot available for action {index}")
+            return
+        
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        h, w = image.shape[:2]
+        pixmap = QPixmap.fromImage(QImage(image.data, w, h, 3 * w, QImage.Format_RGB888))
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"Action {index}: {self.action_recorder.get_action_description(action)}")
+        layout = QVBoxLayout(dialog)
+        label = QLabel()
+        label.setPixmap(pixmap.scaled(QSize(720, 720), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                        if w > 720 or h > 720 else pixmap)
+        layout.addWidget(label)
+        
+        region = action['snapshot'].get('region')
+        if region:
+            layout.addWidget(QLabel(f"Region: {region[0]}, {region[1]}  {region[2]}x{region[3]}"))
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(buttons)
+        dialog.exec_()
+    
     def create_template(self):
         if not self.is_connected or self.screen_widget.selected_region is None:
             self.log("Select a region on the screen first")
@@ -1029,6 +1399,50 @@ class MainWindow(QMainWindow):
             else:
                 self.log("Failed to create template")
     
+    def label_screen(self):
+        frame = self.opencv_processor.last_frame
+        if not self.is_connected or frame is None:
+            self.log("Connect to a device to label the current screen")
+            return
+
+        labels = self.opencv_processor.screen_index.get_labels()
+        label, ok = QInputDialog.getItem(
+            self, "Label Screen", "Screen label:", labels, 0, True
+        )
+        label = label.strip()
+        if not ok or not label:
+            return
+
+        # Keep the reference screenshot so the index can be rebuilt later. The label is
+        # free text, so only the index keeps it as typed and the directory gets a safe name
+        dir_name = "".join(c if c.isalnum() or c in '-_' else '_' for c in label)
+        label_dir = os.path.join(self.screens_dir, dir_name)
+        os.makedirs(label_dir, exist_ok=True)
+        cv2.imwrite(os.path.join(label_dir, f"{time.strftime('%Y%m%d_%H%M%S')}.png"), frame)
+
+        if self.opencv_processor.add_screen_label(label, frame):
+            self.log(f"Labeled current screen as '{label}'")
+        else:
+            self.log("Failed to update screen index")
+
+    def teach_glyphs(self):
+        if not self.is_connected or self.screen_widget.selected_region is None:
+            self.log("Select a region with text on the screen first")
+            return
+
+        region = self.screen_widget.get_device_coordinates_rect(self.screen_widget.selected_region)
+        text, ok = QInputDialog.getText(
+            self, "Teach Glyphs", "Characters shown in the selected region (left to right):"
+        )
+        if not ok or not text.strip():
+            return
+
+        added = self.opencv_processor.add_glyphs(region, text.strip())
+        if added > 0:
+            self.log(f"Added {added} glyph(s) to the glyph atlas")
+        else:
+            self.log("Could not split the region into one glyph per character; try a tighter selection")
+
     def remove_template(self):
         selected_items = self.templates_list.selectedItems()
         if not selected_items:
@@ -1041,6 +1455,9 @@ class MainWindow(QMainWindow):
         try:
             if os.path.exists(template_path):
                 os.remove(template_path)
+                features_path = FeatureMatcher.features_path(template_path)
+                if os.path.exists(features_path):
+                    os.remove(features_path)
                 self.refresh_templates()
                 self.log(f"Template removed: {template_name}")
             else:
@@ -1098,16 +1515,14 @@ class MainWindow(QMainWindow):
                 action_index = self.action_recorder.add_action(action_type, action_data)
                 if action_index >= 0:
                     self.log(f"Added template action: {template_name}")
-                    self.update_actions_list()
-    
+
     def clear_logs(self):
-        self.logs_list.clear()
+        self.log_model.clear()
     
     def log(self, message):
         if isinstance(message, str):
             timestamp = time.strftime("%H:%M:%S")
-            self.logs_list.addItem(f"[{timestamp}] {message}")
-            self.logs_list.scrollToBottom()
+            self.log_model.append(f"[{timestamp}] {message}")
             
             self.logger.log(message)
     
@@ -1118,6 +1533,73 @@ class MainWindow(QMainWindow):
         enabled = state == Qt.Checked
         self.screen_widget.set_opencv_enabled(enabled)
     
+    def set_metrics_port(self, port):
+        if self.metrics_server is not None and self.metrics_server.port == port:
+            return
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if port == 0:
+            return
+        try:
+            self.metrics_server = MetricsServer(metrics, port)
+            self.log(f"Metrics available at http://127.0.0.1:{port}/metrics and /metrics.json")
+        except OSError as e:
+            self.log(f"Could not serve metrics on port {port}: {e}")
+    
+    def set_save_traces(self, enabled):
+        self.action_player.trace_dir = self.traces_dir if enabled else None
+    
+    def update_stats_table(self):
+        if self.tabs.currentWidget() is not self.stats_tab:
+            return
+        
+        # Timings that were never taken are left out
+        snapshot = [metric for metric in metrics.snapshot() if metric.get('count', 1)]
+        self.stats_table.setRowCount(len(snapshot))
+        for row, metric in enumerate(snapshot):
+            labels = ", ".join(f"{k}={v}" for k, v in metric['labels'].items())
+            if metric['type'] == 'histogram':
+                cells = [metric['count']] + [f"{metric[key] * 1000:.1f}" for key in ('p50', 'p90', 'p99', 'max')]
+            else:
+                cells = ["", metric['value'], "", "", ""]
+            for column, value in enumerate([metric['name'], labels] + cells):
+                self.stats_table.setItem(row, column, QTableWidgetItem(str(value)))
+    
+    def reset_stats(self):
+        metrics.reset()
+        self.stats_table.setRowCount(0)
+    
+    def toggle_profiling(self):
+        if profiler.toggle(self.profile_mode_combo.currentData()):
+            self.log(f"Profiling {', '.join(profiler.get_stats()['threads'])} ({profiler.mode})")
+        else:
+            self.log("Profiling stopped")
+        self.profile_btn.setText("Stop Profiling" if profiler.running else "Start Profiling")
+        self.profile_mode_combo.setEnabled(not profiler.running)
+    
+    def dump_profile(self):
+        paths = profiler.dump(self.profiles_dir)
+        pending = profiler.get_stats()['pending']
+        if paths:
+            self.log(f"Profile written to {', '.join(paths)}")
+        else:
+            self.log("Nothing profiled yet")
+        if pending:
+            # A cProfile can only be written once its thread has disabled it, on its next poll after stopping
+            self.log(f"{pending} thread profile(s) still running were left out, stop profiling and dump again")
+    
+    def set_vision_workers(self, workers):
+        pool = self.opencv_processor.vision_pool
+        if pool is not None and pool.get_stats()['workers'] == workers:
+            return
+        if workers == 0:
+            self.opencv_processor.stop_vision_pool()
+        elif self.opencv_processor.start_vision_pool(workers):
+            self.log(f"Vision checks will run in {workers} worker process(es)")
+        else:
+            self.log("Could not start vision worker processes")
+    
     def load_config(self):
         config = self.config_manager.load_config()
         
@@ -1131,6 +1613,20 @@ class MainWindow(QMainWindow):
             if 'opencv_enabled' in config:
                 self.opencv_check.setChecked(config['opencv_enabled'])
             
+            if config.get('metrics_port'):
+                self.metrics_port_spin.setValue(config['metrics_port'])
+                self.set_metrics_port(self.metrics_port_spin.value())
+            
+            if 'log_max_lines' in config:
+                self.log_lines_spin.setValue(config['log_max_lines'])
+            
+            if 'save_traces' in config:
+                self.save_traces_check.setChecked(config['save_traces'])
+            
+            if config.get('vision_workers'):
+                self.vision_workers_spin.setValue(config['vision_workers'])
+                self.set_vision_workers(self.vision_workers_spin.value())
+            
             if 'templates_dir' in config and os.path.exists(config['templates_dir']):
                 self.templates_dir = config['templates_dir']
             
@@ -1141,6 +1637,10 @@ class MainWindow(QMainWindow):
             'theme': self.theme_combo.currentText(),
             'capture_interval': self.interval_spin.value(),
             'opencv_enabled': self.opencv_check.isChecked(),
+            'vision_workers': self.vision_workers_spin.value(),
+            'log_max_lines': self.log_lines_spin.value(),
+            'metrics_port': self.metrics_port_spin.value(),
+            'save_traces': self.save_traces_check.isChecked(),
             'templates_dir': self.templates_dir
         }
         
@@ -1160,11 +1660,13 @@ class MainWindow(QMainWindow):
         self.stop_play_btn.setEnabled(connected and playing)
         
         has_actions = len(self.action_recorder.actions) > 0
-        self.save_recording_btn.setEnabled(has_actions and not recording and not playing)
+        # Saving while recording to a .aarec file keeps appending to it
+        self.save_recording_btn.setEnabled((has_actions or recording) and not playing)
         self.load_recording_btn.setEnabled(not recording and not playing)
+        self.optimize_timeline_btn.setEnabled(has_actions and not recording and not playing)
         self.clear_actions_btn.setEnabled(has_actions and not recording and not playing)
         
-        has_selection = len(self.actions_list.selectedItems()) > 0
+        has_selection = self.actions_list.selectionModel().hasSelection()
         self.edit_action_btn.setEnabled(has_selection and not recording and not playing)
         self.remove_action_btn.setEnabled(has_selection and not recording and not playing)
         
@@ -1173,6 +1675,8 @@ class MainWindow(QMainWindow):
         
         has_template = len(self.templates_list.selectedItems()) > 0
         self.remove_template_btn.setEnabled(has_template)
+        self.label_screen_btn.setEnabled(connected)
+        self.teach_glyphs_btn.setEnabled(connected and has_region)
     
     def closeEvent(self, event):
         if self.capture_thread and self.capture_thread.isRunning():
@@ -1183,6 +1687,10 @@ class MainWindow(QMainWindow):
             self.action_player.stop()
         
         self.save_config()
+        self.opencv_processor.stop_vision_pool()
+        self.set_metrics_port(0)
+        self.action_recorder.journal.close()
+        self.logger.close()
         
         event.accept()
 
@@ -1219,7 +1727,8 @@ class MainWindow(QMainWindow):
                     task_data['schedule_type'],
                     task_data['schedule_data'],
                     task_data['enabled'],
-                    task_data['speed_factor']
+                    task_data['speed_factor'],
+                    self.action_recorder.resolution
             )
 
             self.update_scheduled_tasks_list()
@@ -1260,14 +1769,17 @@ class MainWindow(QMainWindow):
             self.log("Cannot add conditional: No device connected")
             return
 
-        dialog = AddConditionalActionDialog(self, self.action_recorder, self.opencv_processor)
+        region = None
+        if self.screen_widget.selected_region is not None:
+            region = self.screen_widget.get_device_coordinates_rect(self.screen_widget.selected_region)
+
+        dialog = AddConditionalActionDialog(self, self.action_recorder, self.opencv_processor, region)
         if dialog.exec_() == QDialog.Accepted:
             condition = dialog.condition
             then_actions = dialog.then_actions
             else_actions = dialog.else_actions
 
             self.action_recorder.add_conditional_action(condition, then_actions, else_actions)
-            self.update_actions_list()
             self.log(f"Added conditional action with {len(then_actions)} 'then' actions and {len(else_actions)} 'else' actions")
 
 class ScheduleTaskDialog(QDialog):
@@ -1474,13 +1986,15 @@ class ScheduleTaskDialog(QDialog):
 
 class AddConditionalActionDialog(QDialog):
 
-    def __init__(self, parent=None, action_recorder=None, opencv_processor=None):
+    def __init__(self, parent=None, action_recorder=None, opencv_processor=None, region=None):
         super().__init__(parent)
         self.setWindowTitle("Add Conditional Action")
         self.resize(600, 500)
 
         self.action_recorder = action_recorder
         self.opencv_processor = opencv_processor
+        self.region = region
+        self.signature_points = []
 
         self.condition = {}
         self.then_actions = []
@@ -1570,6 +2084,19 @@ class AddConditionalActionDialog(QDialog):
         elif condition_type == ConditionType.PIXEL_COLOR.value:
             self.setup_pixel_condition_params()
 
+        elif condition_type == ConditionType.TEMPLATE_COUNT.value:
+            self.setup_template_condition_params()
+            self.setup_template_count_params()
+
+        elif condition_type == ConditionType.SCREEN_IS.value:
+            self.setup_screen_condition_params()
+
+        elif condition_type == ConditionType.PIXEL_SIGNATURE.value:
+            self.setup_pixel_signature_params()
+
+        elif condition_type == ConditionType.TEXT_EQUALS.value or condition_type == ConditionType.NUMBER_COMPARE.value:
+            self.setup_text_condition_params(condition_type)
+
     def clear_condition_params(self):
         while self.condition_params_layout.count():
             item = self.condition_params_layout.takeAt(0)
@@ -1606,10 +2133,160 @@ class AddConditionalActionDialog(QDialog):
 
         threshold_layout.addWidget(self.threshold_spin)
 
+        self.condition_scale_tolerant_check = QCheckBox("Scale tolerant")
+        threshold_layout.addWidget(self.condition_scale_tolerant_check)
+
         self.condition_params_layout.addWidget(QLabel("Template Image:"))
         self.condition_params_layout.addLayout(path_layout)
         self.condition_params_layout.addLayout(threshold_layout)
 
+    def setup_template_count_params(self):
+        count_layout = QHBoxLayout()
+        count_layout.addWidget(QLabel("Min count:"))
+
+        self.min_count_spin = QSpinBox()
+        self.min_count_spin.setRange(0, 500)
+        self.min_count_spin.setValue(1)
+
+        count_layout.addWidget(self.min_count_spin)
+        count_layout.addWidget(QLabel("Max count:"))
+
+        self.max_count_spin = QSpinBox()
+        self.max_count_spin.setRange(0, 500)
+        self.max_count_spin.setValue(0)
+        self.max_count_spin.setSpecialValueText("Any")
+
+        count_layout.addWidget(self.max_count_spin)
+
+        self.condition_params_layout.addLayout(count_layout)
+
+    def setup_screen_condition_params(self):
+        label_layout = QHBoxLayout()
+        label_layout.addWidget(QLabel("Screen:"))
+
+        self.screen_label_combo = QComboBox()
+        self.screen_label_combo.setEditable(True)
+        if self.opencv_processor:
+            self.screen_label_combo.addItems(self.opencv_processor.screen_index.get_labels())
+
+        label_layout.addWidget(self.screen_label_combo)
+
+        distance_layout = QHBoxLayout()
+        distance_layout.addWidget(QLabel("Max distance:"))
+
+        self.max_distance_spin = QSpinBox()
+        self.max_distance_spin.setRange(0, 320)
+        self.max_distance_spin.setValue(48)
+        self.max_distance_spin.setSuffix(" bits")
+
+        distance_layout.addWidget(self.max_distance_spin)
+
+        self.condition_params_layout.addLayout(label_layout)
+        self.condition_params_layout.addLayout(distance_layout)
+
+    def setup_pixel_signature_params(self):
+        self.signature_points = []
+
+        sample_layout = QHBoxLayout()
+        sample_layout.addWidget(QLabel("Points:"))
+
+        self.point_count_spin = QSpinBox()
+        self.point_count_spin.setRange(1, 400)
+        self.point_count_spin.setValue(25)
+
+        sample_layout.addWidget(self.point_count_spin)
+        sample_layout.addWidget(QLabel("Tolerance:"))
+
+        self.signature_tolerance_spin = QSpinBox()
+        self.signature_tolerance_spin.setRange(0, 128)
+        self.signature_tolerance_spin.setValue(10)
+
+        sample_layout.addWidget(self.signature_tolerance_spin)
+
+        self.sample_signature_btn = QPushButton("Sample from Screen")
+        self.sample_signature_btn.clicked.connect(self.sample_pixel_signature)
+        sample_layout.addWidget(self.sample_signature_btn)
+
+        match_layout = QHBoxLayout()
+        match_layout.addWidget(QLabel("Min match:"))
+
+        self.min_match_spin = QSpinBox()
+        self.min_match_spin.setRange(1, 100)
+        self.min_match_spin.setValue(100)
+        self.min_match_spin.setSuffix("%")
+
+        match_layout.addWidget(self.min_match_spin)
+
+        area = "selected region" if self.region else "whole screen"
+        self.signature_status_label = QLabel(f"No points sampled yet (will sample the {area})")
+
+        self.condition_params_layout.addLayout(sample_layout)
+        self.condition_params_layout.addLayout(match_layout)
+        self.condition_params_layout.addWidget(self.signature_status_label)
+
+    def sample_pixel_signature(self):
+        if self.opencv_processor is None or self.opencv_processor.last_frame is None:
+            QMessageBox.warning(self, "No Frame", "No screen frame is available to sample from.")
+            return
+
+        self.signature_points = self.opencv_processor.sample_pixel_signature(
+                self.region,
+                count=self.point_count_spin.value(),
+                tolerance=self.signature_tolerance_spin.value()
+        )
+        self.signature_status_label.setText(f"{len(self.signature_points)} points sampled")
+
+    def setup_text_condition_params(self, condition_type):
+        region_layout = QHBoxLayout()
+        region_layout.addWidget(QLabel("Region:"))
+
+        x, y, w, h = self.region or (0, 0, 100, 40)
+        self.text_region_spins = []
+        for name, value in (("X:", x), ("Y:", y), ("W:", w), ("H:", h)):
+            spin = QSpinBox()
+            spin.setRange(0, 9999)
+            spin.setValue(value)
+            region_layout.addWidget(QLabel(name))
+            region_layout.addWidget(spin)
+            self.text_region_spins.append(spin)
+
+        value_layout = QHBoxLayout()
+        if condition_type == ConditionType.TEXT_EQUALS.value:
+            value_layout.addWidget(QLabel("Text:"))
+            self.expected_text_edit = QLineEdit()
+            value_layout.addWidget(self.expected_text_edit)
+        else:
+            value_layout.addWidget(QLabel("Value is"))
+            self.number_operator_combo = QComboBox()
+            self.number_operator_combo.addItems(['<', '<=', '==', '!=', '>=', '>'])
+            self.number_operator_combo.setCurrentText('>=')
+            value_layout.addWidget(self.number_operator_combo)
+
+            self.number_value_spin = QDoubleSpinBox()
+            self.number_value_spin.setRange(-1e12, 1e12)
+            self.number_value_spin.setDecimals(2)
+            value_layout.addWidget(self.number_value_spin)
+
+        self.read_text_btn = QPushButton("Read Now")
+        self.read_text_btn.clicked.connect(self.read_region_text)
+        value_layout.addWidget(self.read_text_btn)
+
+        self.read_text_label = QLabel("")
+        value_layout.addWidget(self.read_text_label)
+
+        self.condition_params_layout.addLayout(region_layout)
+        self.condition_params_layout.addLayout(value_layout)
+
+    def text_condition_region(self):
+        return [spin.value() for spin in self.text_region_spins]
+
+    def read_region_text(self):
+        if self.opencv_processor is None:
+            return
+
+        text = self.opencv_processor.read_text(self.text_condition_region())
+        self.read_text_label.setText(f"Read: '{text}'" if text is not None else "No frame")
+
     def setup_color_condition_params(self):
         hsv_min_layout = QHBoxLayout()
         hsv_min_layout.addWidget(QLabel("Min HSV:"))
@@ -1656,10 +2333,56 @@ class AddConditionalActionDialog(QDialog):
         self.min_area_spin.setValue(100)
 
         area_layout.addWidget(self.min_area_spin)
+        area_layout.addWidget(QLabel("Downsample:"))
+
+        self.downsample_spin = QSpinBox()
+        self.downsample_spin.setRange(1, 8)
+        self.downsample_spin.setValue(1)
+        self.downsample_spin.setPrefix("1/")
+
+        area_layout.addWidget(self.downsample_spin)
+
+        # Several ranges can be checked together in a single pass over the frame
+        self.color_ranges = []
+        self.color_ranges_list = QListWidget()
+        self.color_ranges_list.setMaximumHeight(80)
+
+        ranges_layout = QHBoxLayout()
+        self.add_range_btn = QPushButton("Add Range")
+        self.add_range_btn.clicked.connect(self.add_color_range)
+        self.remove_range_btn = QPushButton("Remove Range")
+        self.remove_range_btn.clicked.connect(self.remove_color_range)
+
+        self.color_match_combo = QComboBox()
+        self.color_match_combo.addItem("Any range present", "any")
+        self.color_match_combo.addItem("All ranges present", "all")
+
+        ranges_layout.addWidget(self.add_range_btn)
+        ranges_layout.addWidget(self.remove_range_btn)
+        ranges_layout.addWidget(self.color_match_combo)
 
         self.condition_params_layout.addLayout(hsv_min_layout)
         self.condition_params_layout.addLayout(hsv_max_layout)
         self.condition_params_layout.addLayout(area_layout)
+        self.condition_params_layout.addWidget(self.color_ranges_list)
+        self.condition_params_layout.addLayout(ranges_layout)
+
+    def current_color_range(self):
+        return [
+                [self.h_min_spin.value(), self.s_min_spin.value(), self.v_min_spin.value()],
+                [self.h_max_spin.value(), self.s_max_spin.value(), self.v_max_spin.value()]
+        ]
+
+    def add_color_range(self):
+        color_range = self.current_color_range()
+        self.color_ranges.append(color_range)
+        self.color_ranges_list.addItem(f"HSV {color_range[0]} - {color_range[1]}")
+
+    def remove_color_range(self):
+        row = self.color_ranges_list.currentRow()
+        if 0 <= row < len(self.color_ranges):
+            self.color_ranges.pop(row)
+            self.color_ranges_list.takeItem(row)
 
     def setup_pixel_condition_params(self):
         coords_layout = QHBoxLayout()
@@ -1755,23 +2478,84 @@ class AddConditionalActionDialog(QDialog):
             if not template_path:
                 return None
 
+            return {
+                    'type': condition_type,
+                    'data': {
+                            'template_path':  template_path,
+                            'threshold':      self.threshold_spin.value(),
+                            'scale_tolerant': self.condition_scale_tolerant_check.isChecked()
+                    }
+            }
+
+        elif condition_type == ConditionType.TEMPLATE_COUNT.value:
+            template_path = self.template_path_edit.text()
+            if not template_path:
+                return None
+
             return {
                     'type': condition_type,
                     'data': {
                             'template_path': template_path,
-                            'threshold':     self.threshold_spin.value()
+                            'threshold':     self.threshold_spin.value(),
+                            'min_count':     self.min_count_spin.value(),
+                            'max_count':     self.max_count_spin.value(),
+                            'scale_tolerant': self.condition_scale_tolerant_check.isChecked()
+                    }
+            }
+
+        elif condition_type == ConditionType.SCREEN_IS.value:
+            label = self.screen_label_combo.currentText().strip()
+            if not label:
+                return None
+
+            return {
+                    'type': condition_type,
+                    'data': {
+                            'label':        label,
+                            'max_distance': self.max_distance_spin.value()
+                    }
+            }
+
+        elif condition_type == ConditionType.PIXEL_SIGNATURE.value:
+            if not self.signature_points:
+                return None
+
+            return {
+                    'type': condition_type,
+                    'data': {
+                            'points':    self.signature_points,
+                            'min_match': self.min_match_spin.value() / 100.0
+                    }
+            }
+
+        elif condition_type == ConditionType.TEXT_EQUALS.value:
+            return {
+                    'type': condition_type,
+                    'data': {
+                            'region': self.text_condition_region(),
+                            'text':   self.expected_text_edit.text()
+                    }
+            }
+
+        elif condition_type == ConditionType.NUMBER_COMPARE.value:
+            return {
+                    'type': condition_type,
+                    'data': {
+                            'region':   self.text_condition_region(),
+                            'operator': self.number_operator_combo.currentText(),
+                            'value':    self.number_value_spin.value()
                     }
             }
 
         elif condition_type == ConditionType.COLOR_PRESENT.value:
+            color_ranges = self.color_ranges or [self.current_color_range()]
             return {
                     'type': condition_type,
                     'data': {
-                            'color_range': [
-                                    [self.h_min_spin.value(), self.s_min_spin.value(), self.v_min_spin.value()],
-                                    [self.h_max_spin.value(), self.s_max_spin.value(), self.v_max_spin.value()]
-                            ],
-                            'min_area':    self.min_area_spin.value()
+                            'color_ranges': color_ranges,
+                            'match':        self.color_match_combo.currentData(),
+                            'min_area':     self.min_area_spin.value(),
+                            'downsample':   self.downsample_spin.value()
                     }
             }
 
@@ -1,6 +1,26 @@
+import time
+import numpy as np
 from PyQt5.QtWidgets import QLabel
-from PyQt5.QtCore import Qt, pyqtSignal, QRect, QPoint
+from PyQt5.QtCore import Qt, pyqtSignal, QRect, QPoint, QTimer
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QColor, QCursor, QMouseEvent
+from utils.metrics import registry as metrics
+
+# Overlay kinds drawn on top of the screen
+OVERLAY_BOX = 'box'      # match box, (x, y, w, h)
+OVERLAY_ROI = 'roi'      # region of interest, (x, y, w, h)
+OVERLAY_TAP = 'tap'      # tap marker, (x, y)
+OVERLAY_LABEL = 'label'  # text only, (x, y)
+
+OVERLAY_COLORS = {
+    OVERLAY_BOX: (0, 200, 0),
+    OVERLAY_ROI: (255, 200, 0),
+    OVERLAY_TAP: (255, 60, 60),
+    OVERLAY_LABEL: (255, 255, 255)
+}
+
+# Oldest overlays are dropped beyond this count
+MAX_OVERLAYS = 64
+
 
 class ScreenWidget(QLabel):
 
@@ -21,7 +41,8 @@ class ScreenWidget(QLabel):
         
         # State variables
         self.current_frame = None
-        self.scaled_pixmap = None
+        self.frame_image = None
+        self.scaled_pixmap = None  # frame_image scaled to the widget, painted under the overlays
         self.device_width = 0
         self.device_height = 0
         self.actual_width = 0
@@ -44,63 +65,147 @@ class ScreenWidget(QLabel):
         
         # OpenCV
         self.opencv_enabled = True
+        
+        # Overlays in device coordinates, painted over the frame until they expire
+        self.overlays = []
+        self.overlay_timer = QTimer(self)
+        self.overlay_timer.setSingleShot(True)
+        self.overlay_timer.timeout.connect(self.expire_overlays)
     
     def update_frame(self, frame):
         """Update the displayed frame"""
         if frame is None:
             return
         
-        self.current_frame = frame
-        height, width, channel = frame.shape
-        bytes_per_line = 3 * width
+        if not frame.flags.c_contiguous:
+            frame = np.ascontiguousarray(frame)
         
-        # Convert to QImage and QPixmap
-        q_img = QImage(frame.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-        pixmap = QPixmap.fromImage(q_img)
+        # Wrap the frame's own memory instead of converting it; only the copy
+        # scaled to the widget is made per frame
+        self.current_frame = frame
+        height, width = frame.shape[:2]
+        self.frame_image = QImage(frame.data, width, height, frame.strides[0], QImage.Format_BGR888)
         
         # Update widget size if needed
         if self.device_width == 0 or self.device_height == 0:
             self.device_width = width
             self.device_height = height
         
-        # Adjust pixmap to widget size
-        self.update_scaled_pixmap(pixmap)
+        # Fit the image to the widget size once per frame
+        self.update_display_rect()
         
         # Update display
         self.update()
     
-    def update_scaled_pixmap(self, pixmap=None):
-        """Scale the pixmap to fit the widget while maintaining aspect ratio"""
-        if pixmap is None and self.current_frame is not None:
-            # Recreate pixmap from current frame
-            height, width, channel = self.current_frame.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(self.current_frame.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-            pixmap = QPixmap.fromImage(q_img)
-        elif pixmap is None:
+    def update_display_rect(self):
+        """Fit the frame to the widget while maintaining aspect ratio and cache the scaled pixmap"""
+        if self.frame_image is None:
             return
         
-        # Calculate scaling to fit widget
+        start = time.perf_counter()
         widget_size = self.size()
-        scaled_pixmap = pixmap.scaled(widget_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        display_size = self.frame_image.size().scaled(widget_size, Qt.KeepAspectRatio)
+        self.scaled_pixmap = QPixmap.fromImage(
+            self.frame_image.scaled(display_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        )
+        metrics.histogram('capture_stage_seconds', "Duration of screen capture stages",
+                          stage='scale').observe(time.perf_counter() - start)
         
-        # Calculate offset for centered pixmap
-        self.offset_x = (widget_size.width() - scaled_pixmap.width()) // 2
-        self.offset_y = (widget_size.height() - scaled_pixmap.height()) // 2
+        # Calculate offset for centered image
+        self.offset_x = (widget_size.width() - display_size.width()) // 2
+        self.offset_y = (widget_size.height() - display_size.height()) // 2
         
         # Store actual displayed size
-        self.actual_width = scaled_pixmap.width()
-        self.actual_height = scaled_pixmap.height()
-        
-        self.scaled_pixmap = scaled_pixmap
+        self.actual_width = display_size.width()
+        self.actual_height = display_size.height()
     
     def clear(self):
         """Clear the display"""
         self.current_frame = None
+        self.frame_image = None
         self.scaled_pixmap = None
+        self.overlays = []
+        self.overlay_timer.stop()
         self.setText("No device connected")
         self.update()
     
+    def add_overlay(self, kind, geometry, label=None, color=None, duration=1500):
+        """Show a marker over the screen for duration ms.
+        
+        geometry is (x, y, w, h) for boxes and ROIs or (x, y) for taps and
+        labels, in device coordinates; color is an (r, g, b) tuple.
+        """
+        self.overlays.append({
+            'kind': kind,
+            'geometry': tuple(int(v) for v in geometry),
+            'label': label,
+            'color': color or OVERLAY_COLORS.get(kind, (0, 200, 0)),
+            'expires': time.monotonic() + duration / 1000.0
+        })
+        del self.overlays[:-MAX_OVERLAYS]
+        
+        self.schedule_overlay_expiry()
+        self.update()
+    
+    def clear_overlays(self):
+        self.overlays = []
+        self.overlay_timer.stop()
+        self.update()
+    
+    def expire_overlays(self):
+        now = time.monotonic()
+        self.overlays = [overlay for overlay in self.overlays if overlay['expires'] > now]
+        self.schedule_overlay_expiry()
+        self.update()
+    
+    def schedule_overlay_expiry(self):
+        """Repaint when the next overlay expires, even if no new frame arrives"""
+        if not self.overlays:
+            self.overlay_timer.stop()
+            return
+        
+        next_expiry = min(overlay['expires'] for overlay in self.overlays)
+        self.overlay_timer.start(max(0, int((next_expiry - time.monotonic()) * 1000)) + 1)
+    
+    def get_widget_coordinates(self, device_x, device_y):
+        """Convert device coordinates to widget coordinates"""
+        if self.device_width == 0 or self.device_height == 0:
+            return 0, 0
+        
+        x = self.offset_x + int(device_x * self.actual_width / self.device_width)
+        y = self.offset_y + int(device_y * self.actual_height / self.device_height)
+        return x, y
+    
+    def paint_overlays(self, painter):
+        now = time.monotonic()
+        
+        for overlay in self.overlays:
+            if overlay['expires'] <= now:
+                continue
+            
+            kind = overlay['kind']
+            geometry = overlay['geometry']
+            color = QColor(*overlay['color'])
+            x, y = self.get_widget_coordinates(geometry[0], geometry[1])
+            
+            if kind in (OVERLAY_BOX, OVERLAY_ROI) and len(geometry) == 4:
+                x2, y2 = self.get_widget_coordinates(geometry[0] + geometry[2], geometry[1] + geometry[3])
+                style = Qt.DashLine if kind == OVERLAY_ROI else Qt.SolidLine
+                painter.setPen(QPen(color, 2, style))
+                painter.setBrush(Qt.NoBrush)
+                painter.drawRect(QRect(QPoint(x, y), QPoint(x2, y2)))
+            
+            elif kind == OVERLAY_TAP:
+                painter.setPen(QPen(color, 2))
+                painter.setBrush(Qt.NoBrush)
+                painter.drawEllipse(QPoint(x, y), 10, 10)
+                painter.drawLine(x - 4, y, x + 4, y)
+                painter.drawLine(x, y - 4, x, y + 4)
+            
+            if overlay['label']:
+                painter.setPen(QPen(color))
+                painter.drawText(x + 2, y - 4, overlay['label'])
+    
     def set_device_dimensions(self, width, height):
         """Set the actual device screen dimensions"""
         self.device_width = width
@@ -146,11 +251,16 @@ class ScreenWidget(QLabel):
             super().paintEvent(event)
             return
         
+        start = time.perf_counter()
         painter = QPainter(self)
         
-        # Draw the screen image
+        # Draw the screen image scaled once per frame, then the overlays on top
         painter.drawPixmap(self.offset_x, self.offset_y, self.scaled_pixmap)
         
+        # Draw overlays in widget coordinates on top of the frame
+        if self.overlays:
+            self.paint_overlays(painter)
+        
         # Draw selection rectangle if selecting or a region is selected
         if self.selecting and self.selection_start is not None and self.last_pos is not None:
             rect = QRect(self.selection_start, self.last_pos).normalized()
@@ -160,16 +270,20 @@ class ScreenWidget(QLabel):
         elif self.selected_region is not None:
             painter.setPen(QPen(QColor(0, 255, 0), 2, Qt.SolidLine))
             painter.drawRect(self.selected_region)
+        
+        painter.end()
+        metrics.histogram('capture_stage_seconds', "Duration of screen capture stages",
+                          stage='render').observe(time.perf_counter() - start)
     
     def resizeEvent(self, event):
         """Handle resize events"""
         super().resizeEvent(event)
-        if self.scaled_pixmap is not None:
-            self.update_scaled_pixmap()
+        if self.frame_image is not None:
+            self.update_display_rect()
     
     def mousePressEvent(self, event):
         """Handle mouse press events"""
-        if self.scaled_pixmap is None or event.button() != Qt.LeftButton:
+        if self.frame_image is None or event.button() != Qt.LeftButton:
             return
         
         self.mouse_pressed = True
@@ -40,6 +40,8 @@ class ConfigManager:
             'theme': 'System',
             'capture_interval': 200,
             'opencv_enabled': True,
+            'vision_workers': 0,
+            'log_max_lines': 5000,
             'templates_dir': os.path.abspath(os.path.join(
                 os.path.dirname(os.path.dirname(__file__)), 
                 "resources", 
@@ -1,38 +1,127 @@
 import os
+import queue
+import threading
 import time
 import datetime
 
 class Logger:
-    """Simple logging utility"""
-    
-    def __init__(self):
+    """Simple logging utility.
+
+    Messages are queued and written by a background thread through a file
+    handle that stays open, flushing once per batch. The session's log file
+    is rotated once it grows past max_bytes or gets older than max_age
+    seconds, keeping backup_count older parts.
+    """
+
+    def __init__(self, max_bytes=5 * 1024 * 1024, max_age=24 * 3600, backup_count=5, flush_interval=0.5):
         self.logs_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs"))
         os.makedirs(self.logs_dir, exist_ok=True)
-        
+
         # Create a new log file for this session
         self.session_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         self.log_file = os.path.join(self.logs_dir, f"log_{self.session_id}.txt")
-    
+
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
     def log(self, message):
-        """Log a message to file"""
-        try:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                f.write(f"[{timestamp}] {message}\n")
-        except Exception as e:
-            print(f"Error writing to log: {e}")
-    
+        """Queue a message to be written to the log file"""
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.queue.put(f"[{timestamp}] {message}\n")
+
+    def flush(self, timeout=2):
+        """Wait until the queued messages are written"""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Write the queued messages and stop the writer thread"""
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+
+    def _open(self):
+        f = open(self.log_file, 'a', encoding='utf-8')
+        return f, time.time()
+
+    def _rotate(self, f):
+        """Move the current file to log_<session>.1.txt, shifting older parts up"""
+        f.close()
+        base = os.path.splitext(self.log_file)[0]
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{base}.{i}.txt"):
+                os.replace(f"{base}.{i}.txt", f"{base}.{i + 1}.txt")
+        if self.backup_count > 0:
+            os.replace(self.log_file, f"{base}.1.txt")
+        else:
+            os.remove(self.log_file)
+        return self._open()
+
+    def _run(self):
+        f, opened = None, 0
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            # Take whatever else is waiting so it is written with one flush
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            try:
+                for item in batch:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, str):
+                        if f is None:
+                            f, opened = self._open()
+                        f.write(item)
+
+                if f is not None:
+                    f.flush()
+                    if f.tell() >= self.max_bytes or time.time() - opened >= self.max_age:
+                        f, opened = self._rotate(f)
+            except Exception as e:
+                print(f"Error writing to log: {e}")
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+            if stop:
+                if f is not None:
+                    f.close()
+                return
+
+            # Let messages accumulate instead of flushing for every one
+            time.sleep(self.flush_interval)
+
     def get_logs(self, max_lines=100):
         """Read the most recent log entries"""
         if not os.path.exists(self.log_file):
             return []
-        
+
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # Return the last max_lines lines
+            # Read blocks backwards from the end until there are enough lines
+            with open(self.log_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                data = b''
+                while position > 0 and data.count(b'\n') <= max_lines:
+                    size = min(8192, position)
+                    position -= size
+                    f.seek(position)
+                    data = f.read(size) + data
+
+            lines = data.decode('utf-8', errors='replace').splitlines(keepends=True)
             return lines[-max_lines:]
         except Exception as e:
             print(f"Error reading logs: {e}")
-            return []
\ No newline at end of file
+            return []
@@ -0,0 +1,265 @@
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Histogram buckets are log-linear as in HDR histograms: exact below 32 units,
+# then 32 sub-buckets per power of two, i.e. about 3% relative precision
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Durations are stored in microseconds
+HISTOGRAM_UNIT = 1e-6
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def _bucket_value(index):
+    """Upper end of the values counted in a bucket"""
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return {'value': self.value}
+
+    def reset(self):
+        with self.lock:
+            self.value = 0
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return {'value': self.value}
+
+    def reset(self):
+        pass  # a gauge holds current state, not an accumulation
+
+
+class Histogram:
+    """Distribution of durations in seconds with constant relative error"""
+
+    kind = 'histogram'
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = _bucket_index(max(0, int(seconds / HISTOGRAM_UNIT)))
+        with self.lock:
+            if index >= len(self.counts):
+                self.counts.extend([0] * (index + 1 - len(self.counts)))
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        with self.lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    return min(self.max, _bucket_value(index) * HISTOGRAM_UNIT)
+            return self.max
+
+    def snapshot(self):
+        snapshot = {'count': self.count, 'sum': self.sum, 'max': self.max}
+        for q in QUANTILES:
+            snapshot[f"p{int(q * 100)}"] = self.quantile(q)
+        return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.counts = []
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+
+
+class Timer:
+    """Context manager and decorator recording elapsed time into a histogram"""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+    def __call__(self, function):
+        histogram = self.histogram
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms, each optionally split by labels"""
+
+    def __init__(self):
+        self.metrics = {}  # (name, labels) -> metric
+        self.help = {}  # name -> description
+        self.lock = threading.Lock()
+
+    def _get(self, metric_class, name, description, labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = metric_class()
+                    self.metrics[key] = metric
+                    if description:
+                        self.help.setdefault(name, description)
+        return metric
+
+    def counter(self, name, description='', **labels):
+        return self._get(Counter, name, description, labels)
+
+    def gauge(self, name, description='', **labels):
+        return self._get(Gauge, name, description, labels)
+
+    def histogram(self, name, description='', **labels):
+        return self._get(Histogram, name, description, labels)
+
+    def timer(self, name, description='', **labels):
+        """Time a block (with ...) or every call of a function (as a decorator)"""
+        return Timer(self.histogram(name, description, **labels))
+
+    def snapshot(self):
+        """All metrics as a list of dicts, sorted by name and labels"""
+        with self.lock:
+            items = sorted(self.metrics.items())
+        return [dict(name=name, labels=dict(labels), type=metric.kind, **metric.snapshot())
+                for (name, labels), metric in items]
+
+    def to_json(self):
+        return json.dumps({'timestamp': time.time(), 'metrics': self.snapshot()}, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format; histograms are exposed as summaries"""
+        lines = []
+        declared = set()
+        for metric in self.snapshot():
+            name = metric['name']
+            if name not in declared:
+                declared.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {'summary' if metric['type'] == 'histogram' else metric['type']}")
+
+            labels = metric['labels']
+            if metric['type'] == 'histogram':
+                for q in QUANTILES:
+                    quantile_labels = dict(labels, quantile=str(q))
+                    lines.append(f"{name}{_format_labels(quantile_labels)} {metric[f'p{int(q * 100)}']:.6g}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {metric['sum']:.6g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {metric['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {metric['value']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Zero the counters and histograms; metrics stay registered for code holding them"""
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.reset()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# Registry shared by the controllers and the UI
+registry = MetricsRegistry()
+
+
+class MetricsServer:
+    """Serves a registry on localhost: /metrics in Prometheus text format, /metrics.json as JSON"""
+
+    def __init__(self, metrics_registry=None, port=9464):
+        metrics_registry = metrics_registry or registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body, content_type = metrics_registry.to_json(), 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body, content_type = metrics_registry.to_prometheus(), 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
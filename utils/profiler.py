@@ -0,0 +1,232 @@
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# Modes a profiling session can run in
+MODE_SAMPLE = 'sample'  # periodic stack samples of the registered threads, cheap enough for a live session
+MODE_CPROFILE = 'cprofile'  # deterministic cProfile of each registered thread, exact call counts but slower
+
+# From Python 3.12 cProfile is built on sys.monitoring, which allows one active
+# profiler per process, so a profile per thread is no longer possible
+PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+
+
+class Profiler:
+    """Profiler for the capture, player and GUI threads that can be switched on at runtime.
+
+    Threads take part by calling register() once and poll() from their loop.
+    While profiling is off poll() is a single attribute check, so leaving the
+    hooks in costs next to nothing. In cProfile mode each thread enables its
+    own profile on its next poll(), since a profile can only be enabled from
+    the thread it measures. In sample mode a background thread records the
+    stacks of the registered threads every sample_interval seconds. Where
+    per-thread cProfile is not available (see PER_THREAD_CPROFILE), cProfile
+    mode falls back to sampling.
+
+    dump() writes the cProfile results as one .prof file per thread (for
+    pstats or snakeviz) and the samples as collapsed stacks, the input format
+    of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, sample_interval=0.005):
+        self.sample_interval = sample_interval
+        self.mode = None
+        self.started_at = None
+        self.lock = threading.Lock()
+        self.threads = {}  # thread ident -> name, threads that take part
+        self.active = {}  # thread ident -> profile enabled in that thread
+        self.failed = set()  # thread idents whose profile could not be enabled this session
+        self.profiles = {}  # thread name -> finished profiles
+        self.samples = Counter()  # collapsed stack -> number of samples
+        self.sample_count = 0
+        self.sampler = None
+        self.sampler_stop = threading.Event()
+
+    @property
+    def running(self):
+        return self.mode is not None
+
+    def register(self, name=None):
+        """Make the calling thread one of the profiled threads"""
+        thread = threading.current_thread()
+        with self.lock:
+            self.threads[thread.ident] = name or thread.name
+        self.poll()
+
+    def unregister(self):
+        """Called by a profiled thread before it exits; keeps what was measured so far"""
+        try:
+            self._disable(threading.get_ident())
+        except Exception as e:
+            print(f"Error stopping profiler: {e}")
+        with self.lock:
+            self.threads.pop(threading.get_ident(), None)
+
+    def poll(self):
+        """Start or stop the calling thread's cProfile to follow the current mode.
+
+        Never raises: a profiler failure must not take down the thread polling it.
+        """
+        if self.mode != MODE_CPROFILE and not self.active:
+            return
+
+        ident = threading.get_ident()
+        try:
+            if self.mode == MODE_CPROFILE:
+                if ident not in self.active and ident in self.threads and ident not in self.failed:
+                    profile = cProfile.Profile()
+                    profile.enable()
+                    self.active[ident] = profile
+            else:
+                self._disable(ident)
+        except Exception as e:
+            self.failed.add(ident)
+            print(f"Error in profiler: {e}")
+
+    def _disable(self, ident):
+        profile = self.active.pop(ident, None)
+        if profile is None:
+            return
+        profile.disable()
+        with self.lock:
+            self.profiles.setdefault(self.threads.get(ident, str(ident)), []).append(profile)
+
+    def start(self, mode=MODE_SAMPLE):
+        """Start a profiling session, discarding the results of the previous one"""
+        if mode not in (MODE_SAMPLE, MODE_CPROFILE):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        if mode == MODE_CPROFILE and not PER_THREAD_CPROFILE:
+            mode = MODE_SAMPLE
+        self.stop()
+        with self.lock:
+            self.profiles = {}
+            self.failed = set()
+            self.samples = Counter()
+            self.sample_count = 0
+        self.started_at = time.time()
+        self.mode = mode
+
+        if mode == MODE_SAMPLE:
+            self.sampler_stop.clear()
+            self.sampler = threading.Thread(target=self._sample, name="ProfilerSampler", daemon=True)
+            self.sampler.start()
+        self.poll()
+
+    def stop(self):
+        """Stop profiling; other threads hand over their cProfile results on their next poll()"""
+        if self.mode is None:
+            return
+        self.mode = None
+        if self.sampler is not None:
+            self.sampler_stop.set()
+            self.sampler.join(timeout=1)
+            self.sampler = None
+        self.poll()
+
+    def toggle(self, mode=MODE_SAMPLE):
+        if self.running:
+            self.stop()
+        else:
+            self.start(mode)
+        return self.running
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self.sampler_stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, name in self.threads.items():
+                    frame = frames.get(ident)
+                    if frame is None or ident == own:
+                        continue
+                    self.samples[_collapse(name, frame)] += 1
+                self.sample_count += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'mode': self.mode,
+                'threads': sorted(self.threads.values()),
+                'samples': self.sample_count,
+                'profiles': sum(len(p) for p in self.profiles.values()),
+                'pending': len(self.active)
+            }
+
+    def dump(self, directory):
+        """Write what has been measured so far; returns the written paths.
+
+        Profiles still enabled in a thread that has not polled since profiling
+        stopped are left out, as a profile can only be read once disabled.
+        """
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, "profile_" + time.strftime("%Y%m%d_%H%M%S"))
+        paths = []
+
+        with self.lock:
+            profiles = {name: list(found) for name, found in self.profiles.items()}
+            samples = self.samples.copy()
+
+        for name, found in profiles.items():
+            stats = pstats.Stats(found[0])
+            for profile in found[1:]:
+                stats.add(profile)
+            path = f"{prefix}_{_safe_name(name)}.prof"
+            stats.dump_stats(path)
+            paths.append(path)
+
+        if samples:
+            path = f"{prefix}.collapsed"
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            paths.append(path)
+
+        return paths
+
+    def install_signal_handler(self, directory, signum=None, mode=MODE_SAMPLE):
+        """Toggle profiling on a signal (SIGUSR1 by default), dumping when it stops.
+
+        Not available on Windows, where there is no SIGUSR1. Returns whether a
+        handler was installed.
+        """
+        signum = signum or getattr(signal, 'SIGUSR1', None)
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return False
+
+        def handle(signum, frame):
+            try:
+                if self.toggle(mode):
+                    print(f"Profiling started ({mode})")
+                else:
+                    print(f"Profile written to {', '.join(self.dump(directory)) or 'nothing'}")
+            except Exception as e:
+                print(f"Error toggling profiler: {e}")
+
+        signal.signal(signum, handle)
+        return True
+
+
+def _collapse(thread_name, frame):
+    """Stack of a frame as 'thread;outer;...;inner', the collapsed format of flamegraph.pl"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    # Only the last space on a line separates the count, so spaces in names are fine
+    return ";".join(name.replace(';', ':') for name in reversed(names))
+
+
+def _safe_name(name):
+    return "".join(c if c.isalnum() or c in '-_' else '_' for c in name)
+
+
+# Profiler shared by the controllers and the UI
+profiler = Profiler()